@@ -10,6 +10,7 @@ admin.site.register(models.Location)
 admin.site.register(models.Address)
 admin.site.register(models.Feedback)
 admin.site.register(models.FeedbackReply)
+admin.site.register(models.OutboxEmail)
 admin.site.register(models.ReviewModel)
 
 # Product related models
@@ -23,3 +24,4 @@ admin.site.register(models.Cart)
 admin.site.register(models.CartItem)
 admin.site.register(models.Order)
 admin.site.register(models.Payment)
+admin.site.register(models.ExchangeRate)
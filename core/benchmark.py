@@ -0,0 +1,397 @@
+import io
+import logging
+import platform
+import re
+import sqlite3
+import time
+import tracemalloc
+from contextlib import contextmanager
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.models import Address, Cart, CategoryModel, Order, ProductModel, User
+from core.payment import LatencyMetrics, get_gateway
+
+_NEXT_PAGE = re.compile(r'href="(\?[^"]*cursor=[^"]+)">&raquo; Next')
+
+# Settings every benchmark run uses: production-like debug off, offline
+# gateway and query headers.
+BENCHMARK_SETTINGS = {
+    "DEBUG": False,
+    "PAYMENT_GATEWAY": {"BACKEND": "core.payment.FakeGateway", "OPTIONS": {"seed": 0}},
+    "QUERY_COUNT_ENABLED": True,
+    "QUERY_COUNT_HEADERS": True,
+    "IMAGE_DERIVATIVE_WORKERS": 0,
+}
+
+
+class WSGIResponse:
+    def __init__(self, status, headers, content):
+        self.status_code = int(status.split(" ", 1)[0])
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", "replace")
+
+
+class WSGIClient:
+    """Drive a WSGI application in-process, keeping cookies between requests."""
+
+    def __init__(self, application, host="localhost"):
+        self.application = application
+        self.host = host
+        self.cookies = SimpleCookie()
+
+    def request(self, method, path, data=None, headers=None):
+        url = urlsplit(path)
+        body = urlencode(data or {}, doseq=True).encode()
+        environ = {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": url.path,
+            "QUERY_STRING": url.query,
+            "SERVER_NAME": self.host,
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_HOST": self.host,
+            "REMOTE_ADDR": "127.0.0.1",
+            "CONTENT_TYPE": "application/x-www-form-urlencoded",
+            "CONTENT_LENGTH": str(len(body)),
+            "HTTP_COOKIE": "; ".join(
+                f"{name}={morsel.value}" for name, morsel in self.cookies.items()
+            ),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": io.StringIO(),
+            "wsgi.multithread": False,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in (headers or {}).items():
+            environ["HTTP_" + name.upper().replace("-", "_")] = value
+
+        started = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            started["status"] = status
+            started["headers"] = response_headers
+
+        result = self.application(environ, start_response)
+        try:
+            content = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+        response_headers = {}
+        for name, value in started["headers"]:
+            if name.lower() == "set-cookie":
+                self.cookies.load(value)
+            else:
+                response_headers[name] = value
+        return WSGIResponse(started["status"], response_headers, content)
+
+    def get(self, path, **headers):
+        return self.request("GET", path, headers=headers)
+
+    def post(self, path, data, **headers):
+        headers.setdefault("X-CSRFToken", self.csrf_token)
+        headers.setdefault("Referer", f"http://{self.host}{path}")
+        return self.request("POST", path, data, headers)
+
+    @property
+    def csrf_token(self):
+        morsel = self.cookies.get(settings.CSRF_COOKIE_NAME)
+        return morsel.value if morsel else ""
+
+
+class StepResult:
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.queries = []
+        self.alloc_peaks = []
+        self.errors = 0
+
+    def as_dict(self):
+        samples = sorted(self.latencies)
+        result = {"requests": len(samples), "errors": self.errors}
+        for percent in (50, 95, 99):
+            value = LatencyMetrics.percentile(samples, percent)
+            result[f"p{percent}_ms"] = None if value is None else round(value * 1000, 3)
+        result["queries"] = max(self.queries) if self.queries else None
+        result["alloc_peak_kb"] = (
+            round(max(self.alloc_peaks) / 1024, 1) if self.alloc_peaks else None
+        )
+        return result
+
+
+class Benchmark:
+    """Time the browse, cart and checkout flows through the WSGI application.
+
+    Each step is a callable issuing one request; ``run`` calls every step
+    ``iterations`` times, recording latency and the ``X-Query-Count``
+    header, then once more under ``tracemalloc`` for the allocation peak.
+    The data set must already exist (see ``generate_sample_data``).
+    """
+
+    def __init__(self, application, iterations=50, warmup=3, pages=20):
+        self.application = application
+        self.iterations = iterations
+        self.warmup = warmup
+        self.pages = pages
+
+    def setup(self):
+        self.user = (
+            User.objects.filter(cart__order__isnull=False).order_by("pk").first()
+            or User.objects.order_by("pk").first()
+        )
+        self.client = WSGIClient(self.application, settings.ALLOWED_HOSTS[0])
+        session = Client()
+        session.force_login(self.user)
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.cookies[
+            settings.SESSION_COOKIE_NAME
+        ].value
+        self.client.get(reverse("core:contact"))
+
+        self.products = list(
+            ProductModel.objects.filter(status=True)
+            .order_by("-rating_count", "pk")
+            .values_list("pk", flat=True)[:50]
+        )
+        self.categories = list(
+            CategoryModel.objects.filter(parent__isnull=True)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        self.shop_pages = self.collect_shop_pages()
+        self.address = Address.objects.order_by("pk").first()
+
+    def collect_shop_pages(self):
+        """Walk the shop cursors once so page requests can be replayed."""
+        pages = [reverse("core:shop")]
+        while len(pages) < self.pages:
+            match = _NEXT_PAGE.search(self.client.get(pages[-1]).text)
+            if not match:
+                break
+            pages.append(reverse("core:shop") + match.group(1).replace("&amp;", "&"))
+        return pages
+
+    # ======================================================== #
+    # Steps                                                    #
+    # ======================================================== #
+    def step_home(self, index):
+        return self.client.get(reverse("core:home"))
+
+    def step_shop_page(self, index):
+        return self.client.get(self.shop_pages[index % len(self.shop_pages)])
+
+    def step_category_listing(self, index):
+        pk = self.categories[index % len(self.categories)]
+        return self.client.get(reverse("core:product_by_category", args=[pk]))
+
+    def step_product_detail(self, index):
+        pk = self.products[index % len(self.products)]
+        return self.client.get(reverse("core:product_detail", args=[pk]))
+
+    def step_add_to_cart(self, index):
+        pk = self.products[index % 10]
+        return self.client.post(
+            reverse("core:cart_add"),
+            {"product_id": pk, "quantity": 1},
+            Accept="application/json",
+        )
+
+    def step_cart_update(self, index):
+        cart = Cart.objects.get(user=self.user, status=True, checked_out=False)
+        items = list(cart.items())
+        data = {
+            "form-TOTAL_FORMS": len(items),
+            "form-INITIAL_FORMS": len(items),
+            "form-MIN_NUM_FORMS": 0,
+            "form-MAX_NUM_FORMS": 1000,
+            "currency": Order.CurrencyChoices.INR,
+        }
+        for number, item in enumerate(items):
+            data[f"form-{number}-id"] = item.pk
+            data[f"form-{number}-product"] = item.product_id
+            data[f"form-{number}-quantity"] = 1 + (item.quantity + index) % 5
+        return self.client.post(reverse("core:cart"), data)
+
+    def step_checkout(self, index):
+        fields = (
+            "building_name",
+            "place",
+            "street",
+            "city",
+            "district",
+            "state",
+            "country",
+            "post_office",
+            "post_code",
+        )
+        data = {f"billing-{field}": getattr(self.address, field) for field in fields}
+        data["same_as_billing_address"] = "on"
+        return self.client.post(reverse("core:cart_checkout"), data)
+
+    def step_payment(self, index):
+        order = Order.objects.filter(cart__user=self.user, completed=False).latest(
+            "created_on"
+        )
+        payment_id = f"pay_benchmark_{index}_{time.monotonic_ns()}"
+        return self.client.post(
+            reverse("core:cart_payment"),
+            {
+                "razorpay_order_id": order.id,
+                "razorpay_payment_id": payment_id,
+                "razorpay_signature": get_gateway().sign(order.id, payment_id),
+            },
+        )
+
+    def step_payment_page(self, index):
+        return self.client.get(reverse("core:cart_payment"))
+
+    def step_order_history(self, index):
+        return self.client.get(reverse("core:order_history"))
+
+    def step_payment_list(self, index):
+        return self.client.get(reverse("core:payment_list"))
+
+    STEPS = (
+        "home",
+        "shop_page",
+        "category_listing",
+        "product_detail",
+        "add_to_cart",
+        "cart_update",
+        "checkout",
+        "payment_page",
+        "payment",
+        "order_history",
+        "payment_list",
+    )
+
+    # ======================================================== #
+    # Running                                                  #
+    # ======================================================== #
+    def measure(self, result, step, index, trace=False):
+        if trace:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        response = step(index)
+        elapsed = time.perf_counter() - started
+        if trace:
+            result.alloc_peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+            return
+        if response.status_code >= 400:
+            result.errors += 1
+        result.latencies.append(elapsed)
+        if "X-Query-Count" in response.headers:
+            result.queries.append(int(response.headers["X-Query-Count"]))
+
+    def run(self, steps=None):
+        # Query counts are reported per step; silence the per-request warnings.
+        query_logger = logging.getLogger("core.middleware")
+        level = query_logger.level
+        query_logger.setLevel(logging.ERROR)
+        try:
+            return self._run(steps)
+        finally:
+            query_logger.setLevel(level)
+
+    def _run(self, steps):
+        with override_settings(**BENCHMARK_SETTINGS):
+            self.setup()
+            results = {}
+            for name in steps or self.STEPS:
+                step = getattr(self, f"step_{name}")
+                result = StepResult(name)
+                for index in range(self.warmup):
+                    step(index)
+                for index in range(self.iterations):
+                    self.measure(result, step, index)
+                tracemalloc.start()
+                try:
+                    self.measure(result, step, self.iterations, trace=True)
+                finally:
+                    tracemalloc.stop()
+                results[name] = result.as_dict()
+        return {"meta": self.meta(), "steps": results}
+
+    def meta(self):
+        return {
+            "iterations": self.iterations,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "products": ProductModel.objects.count(),
+            "users": User.objects.count(),
+        }
+
+
+@contextmanager
+def benchmark_database(name, keepdb=False, stdout=None, **data_options):
+    """Run on a separate database seeded by ``generate_sample_data``.
+
+    The real database is never touched; ``keepdb`` keeps the seeded
+    database for the next run. ``data_options`` go to the generator.
+    """
+    connection.settings_dict["TEST"] = dict(
+        connection.settings_dict.get("TEST") or {}, NAME=name
+    )
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        if not ProductModel.objects.exists():
+            call_command("generate_sample_data", stdout=stdout, **data_options)
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+def compare(results, baseline, tolerance=0.2, slack_ms=1.0):
+    """Return the regressions of ``results`` against a stored ``baseline``.
+
+    Latency and allocation may grow by ``tolerance`` (plus ``slack_ms``
+    for latency, to ignore timer noise on fast steps); query counts may
+    not grow at all.
+    """
+    regressions = []
+    for name, base in baseline.get("steps", {}).items():
+        current = results["steps"].get(name)
+        if current is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if base.get(metric) is None or current.get(metric) is None:
+                continue
+            limit = base[metric] * (1 + tolerance) + slack_ms
+            if current[metric] > limit:
+                regressions.append(
+                    f"{name}: {metric} {current[metric]:.2f} > {limit:.2f}"
+                )
+        if (
+            base.get("queries") is not None
+            and (current.get("queries") or 0) > base["queries"]
+        ):
+            regressions.append(
+                f"{name}: queries {current['queries']} > {base['queries']}"
+            )
+        if base.get("alloc_peak_kb") and current.get("alloc_peak_kb"):
+            limit = base["alloc_peak_kb"] * (1 + tolerance)
+            if current["alloc_peak_kb"] > limit:
+                regressions.append(
+                    f"{name}: alloc_peak_kb {current['alloc_peak_kb']:.1f} > {limit:.1f}"
+                )
+        if current.get("errors"):
+            regressions.append(f"{name}: {current['errors']} failed requests")
+    return regressions
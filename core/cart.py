@@ -0,0 +1,132 @@
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from core import fragments
+from core.models import Cart, CartItem
+
+REQUEST_CART_ATTR = "_request_cart"
+
+
+def open_cart_items(user):
+    """Items of the user's open (not checked out) cart, with their products."""
+    cart_items = CartItem.objects.filter(
+        cart__user=user,
+        cart__status=True,
+        cart__checked_out=False,
+        status=True,
+    ).select_related("product", "cart")
+    return cart_items
+
+
+class RequestCart:
+    """Read-only view of the user's open cart, evaluated at most once.
+
+    Nothing is queried until a template (or view) touches ``items``,
+    ``count`` or ``total``; the items, their products and the cart are then
+    loaded in a single query, and the counters come from the cart's stored
+    ``item_count`` and ``subtotal``. Unlike ``Cart.get_cart`` this never
+    creates a cart row.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def items(self):
+        return list(open_cart_items(self.user))
+
+    @cached_property
+    def cart(self):
+        if self.items:
+            return self.items[0].cart
+        return None
+
+    @cached_property
+    def count(self):
+        if self.cart is None:
+            return 0
+        return self.cart.item_count
+
+    @cached_property
+    def total(self):
+        if self.cart is None:
+            return 0
+        return self.cart.subtotal
+
+
+def get_request_cart(request):
+    """Return the ``RequestCart`` shared by everything rendering this request."""
+    cart = getattr(request, REQUEST_CART_ATTR, None)
+    if cart is None:
+        cart = RequestCart(request.user)
+        setattr(request, REQUEST_CART_ATTR, cart)
+    return cart
+
+
+def add_to_cart(user, product, quantity):
+    """Add ``quantity`` of ``product`` to the user's open cart and return the cart.
+
+    Safe under concurrent requests: the open cart is a get_or_create
+    backed by a partial unique constraint, and the item row is a single
+    INSERT ... ON CONFLICT DO UPDATE that increments the stored quantity
+    in the database. Both writes in the transaction come before any read,
+    so SQLite never has to upgrade a read lock. The user's cached mini-cart
+    is retired once the transaction commits.
+    """
+    cart, _ = Cart.objects.get_or_create(
+        user=user,
+        status=True,
+        checked_out=False,
+        defaults={"empty": False},
+    )
+
+    table = CartItem._meta.db_table
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} "
+                f"(status, created_on, updated_on, cart_id, product_id, quantity) "
+                f"VALUES (%s, %s, %s, %s, %s, %s) "
+                f"ON CONFLICT (cart_id, product_id, status) DO UPDATE SET "
+                f"quantity = {table}.quantity + excluded.quantity, "
+                f"updated_on = excluded.updated_on",
+                [True, now, now, cart.pk, product.pk, quantity],
+            )
+        Cart.refresh_totals(Cart.objects.filter(pk=cart.pk), empty=False)
+        # The raw upsert and the UPDATE send no signals.
+        transaction.on_commit(lambda: fragments.bump_cart_version(user.pk))
+    return cart
+
+
+def save_cart_items(user, formset):
+    """Save the edited ``formset`` of the user's open cart items.
+
+    The changed quantities go out in one bulk UPDATE and the removed items
+    in one DELETE, however many items the cart holds. Neither sends model
+    signals, so, as in ``add_to_cart``, the totals are refreshed once here
+    and the user's cached mini-cart is retired once the transaction commits.
+    """
+    items = formset.save(commit=False)
+    removed = [item.pk for item in formset.deleted_objects]
+    if not items and not removed:
+        return
+
+    now = timezone.now()
+    for item in items:
+        item.updated_on = now
+    with transaction.atomic():
+        CartItem.objects.bulk_update(items, ["quantity", "updated_on"])
+        if removed:
+            placeholders = ", ".join(["%s"] * len(removed))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {CartItem._meta.db_table} "
+                    f"WHERE id IN ({placeholders})",
+                    removed,
+                )
+        Cart.refresh_totals(
+            Cart.objects.filter(user=user, status=True, checked_out=False)
+        )
+        transaction.on_commit(lambda: fragments.bump_cart_version(user.pk))
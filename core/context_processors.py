@@ -2,23 +2,36 @@ from django.core.paginator import Paginator
 from django.contrib.auth import forms as auth_forms
 from core.forms import CustomUserCreationForm, FeedbackForm
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject
 
-from core.models import ProductModel, Cart
+from core import pagecache
+from core.currency import get_request_converter
+from core.cart import get_request_cart
+from core.models import ProductModel
 
 
 def common_data(request):
-    products = ProductModel.objects.filter(status=True)
+    """Context shared by every template.
+
+    The forms and the product queryset are only built when a template
+    touches them; most pages never render the login, signup or contact
+    modal.
+    """
     cart = None
     if request.user.is_authenticated:
-        cart = Cart.get_cart(request)
+        cart = get_request_cart(request)
     context = {
         "reCAPTCHA_site_key": settings.GOOGLE_RECAPTCHA_SITE_KEY,
         "project_name": "Emart",
         "page_name": "page name",
-        "products": products,
+        "products": SimpleLazyObject(lambda: ProductModel.objects.filter(status=True)),
         "cart": cart,
-        "login_form": auth_forms.AuthenticationForm(),
-        "signup_form": CustomUserCreationForm(),
-        "contact_form": FeedbackForm(),
+        "currency": SimpleLazyObject(lambda: get_request_converter(request)),
+        "login_form": SimpleLazyObject(auth_forms.AuthenticationForm),
+        "signup_form": SimpleLazyObject(CustomUserCreationForm),
+        "contact_form": SimpleLazyObject(FeedbackForm),
     }
+    if getattr(request, "page_cache_placeholder", False):
+        # Cached anonymous pages get each visitor's token filled in.
+        context["csrf_token"] = pagecache.CSRF_PLACEHOLDER
     return context
@@ -0,0 +1,174 @@
+import csv
+import hashlib
+import logging
+import threading
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, time as datetime_time
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from core import pagecache
+from core.models import ExchangeRate, Order
+
+logger = logging.getLogger(__name__)
+
+BASE_CURRENCY = Order.CurrencyChoices.INR
+# ISO 4217 codes, for display and the payment gateway.
+ISO_CODES = {Order.CurrencyChoices.INR: "INR", Order.CurrencyChoices.DOLLAR: "USD"}
+CURRENCIES_BY_ISO_CODE = {code: currency for currency, code in ISO_CODES.items()}
+ICONS = {
+    Order.CurrencyChoices.INR: "fa-inr",
+    Order.CurrencyChoices.DOLLAR: "fa-dollar-sign",
+}
+REQUEST_CONVERTER_ATTR = "_price_converter"
+
+
+class RateTable:
+    """Effective-dated exchange rates from the base currency, held in memory."""
+
+    def __init__(self, rates=()):
+        self._dates = defaultdict(list)
+        self._rates = defaultdict(list)
+        rates = sorted(rates)
+        for currency, effective_from, rate in rates:
+            self._dates[currency].append(effective_from)
+            self._rates[currency].append(rate)
+        # Changes whenever any rate does; part of the price cache keys.
+        self.version = hashlib.sha256(repr(rates).encode()).hexdigest()[:12]
+
+    def rate(self, currency, at=None):
+        """Rate in effect for ``currency`` at ``at`` (now by default)."""
+        if currency == BASE_CURRENCY:
+            return 1.0
+        index = bisect_right(self._dates[currency], at or timezone.now()) - 1
+        if index < 0:
+            raise LookupError(f"No exchange rate for {currency!r} in effect")
+        return self._rates[currency][index]
+
+
+_table = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+
+def get_rate_table():
+    """The process-wide ``RateTable``, reloaded with one query when stale.
+
+    Saving an ``ExchangeRate`` drops this process's copy (see
+    ``core.signals``); other processes reload after
+    ``EXCHANGE_RATE_CACHE_TIMEOUT`` seconds.
+    """
+    global _table, _loaded_at
+    timeout = getattr(settings, "EXCHANGE_RATE_CACHE_TIMEOUT", 300)
+    with _lock:
+        if _table is None or time.monotonic() - _loaded_at > timeout:
+            rates = ExchangeRate.objects.filter(status=True).values_list(
+                "currency", "effective_from", "rate"
+            )
+            _table = RateTable(rates)
+            _loaded_at = time.monotonic()
+        return _table
+
+
+def invalidate_rate_table():
+    global _table
+    with _lock:
+        _table = None
+
+
+class PriceConverter:
+    """Converts base-currency prices into one currency at a fixed rate."""
+
+    def __init__(self, currency=BASE_CURRENCY, rate=1.0, version=""):
+        self.currency = currency
+        self.rate = rate
+        self.code = ISO_CODES.get(currency, currency)
+        self.icon = ICONS.get(currency, "")
+        # Identifies the converted prices, for cache keys.
+        self.cache_key = f"{self.code}:{version}"
+
+    def convert(self, amount):
+        return round(amount * self.rate, 2)
+
+    def convert_many(self, amounts):
+        rate = self.rate
+        return [round(amount * rate, 2) for amount in amounts]
+
+    def format(self, amount):
+        return f"{self.code} {self.convert(amount):.2f}"
+
+
+def get_converter(currency, at=None):
+    """Converter into ``currency``; prices stay in the base currency without a rate."""
+    table = get_rate_table()
+    currency = currency or BASE_CURRENCY
+    try:
+        rate = table.rate(currency, at)
+    except LookupError:
+        logger.warning(
+            "No exchange rate for %s; showing %s prices", currency, BASE_CURRENCY
+        )
+        currency, rate = BASE_CURRENCY, 1.0
+    return PriceConverter(currency, rate, table.version)
+
+
+def get_request_converter(request):
+    """Return the converter for the visitor's chosen currency, built once per request."""
+    converter = getattr(request, REQUEST_CONVERTER_ATTR, None)
+    if converter is None:
+        converter = get_converter(request.session.get("currency"))
+        setattr(request, REQUEST_CONVERTER_ATTR, converter)
+    return converter
+
+
+def _parse_effective_from(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid effective date {value!r}")
+        parsed = datetime.combine(day, datetime_time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def load_rates_file(path):
+    """Upsert the rates of a CSV file with ``currency,effective_from,rate`` columns.
+
+    Currencies may be given by ISO code (``USD``) or as stored (``D``).
+    Returns the number of rates written.
+    """
+    rates = {}
+    with open(path, newline="") as file:
+        for line, row in enumerate(csv.DictReader(file), start=2):
+            try:
+                code = row["currency"].strip().upper()
+                currency = CURRENCIES_BY_ISO_CODE.get(code, code)
+                if currency not in ISO_CODES or currency == BASE_CURRENCY:
+                    raise ValueError(f"Unknown currency {code!r}")
+                rate = float(row["rate"])
+                if rate <= 0:
+                    raise ValueError(f"Rate must be positive, not {rate}")
+                effective_from = _parse_effective_from(row["effective_from"].strip())
+            except (KeyError, TypeError, ValueError) as error:
+                raise ValueError(f"{path}, line {line}: {error}") from None
+            # A later line for the same date wins.
+            rates[currency, effective_from] = ExchangeRate(
+                currency=currency, rate=rate, effective_from=effective_from
+            )
+
+    ExchangeRate.objects.bulk_create(
+        list(rates.values()),
+        update_conflicts=True,
+        unique_fields=["currency", "effective_from"],
+        update_fields=["rate", "status", "updated_on"],
+    )
+    # bulk_create sends no signals.
+    invalidate_rate_table()
+    pagecache.bump_version()
+    return len(rates)
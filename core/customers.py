@@ -0,0 +1,77 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, Max, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from core import currency
+from core.models import Order, Payment, User
+
+PAID = Payment.PaymentStatusChoices.completed
+
+
+def empty_order_stats():
+    return {"order_count": 0, "lifetime_spend": 0.0, "last_order_on": None}
+
+
+def base_amount(amount, order_currency, at):
+    """``amount`` of ``order_currency`` in the base currency, at the rate in effect ``at``."""
+    return amount / currency.get_converter(order_currency, at).rate
+
+
+def record_order(user_id, placed_on):
+    """Count a new order in the customer's statistics with a single UPDATE."""
+    User.objects.filter(pk=user_id).update(
+        order_count=F("order_count") + 1,
+        last_order_on=Greatest(
+            Coalesce("last_order_on", Value(placed_on)), Value(placed_on)
+        ),
+    )
+
+
+def update_spend(order_id, sign):
+    """Add (``sign`` 1) or take back (-1) a payment for ``order_id`` from the lifetime spend."""
+    order = (
+        Order.objects.filter(pk=order_id)
+        .values("cart__user_id", "amount", "currency", "created_on")
+        .first()
+    )
+    if order is None:
+        return
+    amount = base_amount(order["amount"], order["currency"], order["created_on"])
+    User.objects.filter(pk=order["cart__user_id"]).update(
+        lifetime_spend=F("lifetime_spend") + round(sign * amount, 2)
+    )
+
+
+def calculate_order_stats(user_ids=None):
+    """Order statistics computed from the orders and payments, by user id."""
+    orders = Order.objects.order_by()
+    payments = Payment.objects.filter(status=PAID)
+    if user_ids is not None:
+        orders = orders.filter(cart__user__in=user_ids)
+        payments = payments.filter(order__cart__user__in=user_ids)
+
+    stats = defaultdict(empty_order_stats)
+    placed = orders.values("cart__user_id").annotate(
+        count=Count("pk"), last=Max("created_on")
+    )
+    for row in placed:
+        stats[row["cart__user_id"]].update(
+            order_count=row["count"], last_order_on=row["last"]
+        )
+    paid = payments.values_list(
+        "order__cart__user_id", "order__amount", "order__currency", "order__created_on"
+    )
+    for user_id, amount, order_currency, placed_on in paid.iterator():
+        stats[user_id]["lifetime_spend"] += base_amount(
+            amount, order_currency, placed_on
+        )
+    for values in stats.values():
+        values["lifetime_spend"] = round(values["lifetime_spend"], 2)
+    return stats
+
+
+def refresh_order_stats(user_id):
+    """Recompute one customer's stored statistics from their orders and payments."""
+    values = calculate_order_stats([user_id]).get(user_id, empty_order_stats())
+    User.objects.filter(pk=user_id).update(**values)
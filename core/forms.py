@@ -1,7 +1,10 @@
 from django import forms
 from django.contrib.auth import forms as auth_forms
 from django.contrib.auth import get_user_model
+from django.template import loader
+from django.utils.functional import cached_property
 
+from core.mail import enqueue_mail
 from core.models import (
     Address,
     Cart,
@@ -22,6 +25,26 @@ class CustomUserCreationForm(auth_forms.UserCreationForm):
         fields = ["username", "email"]
 
 
+class QueuedPasswordResetForm(auth_forms.PasswordResetForm):
+    def send_mail(
+        self,
+        subject_template_name,
+        email_template_name,
+        context,
+        from_email,
+        to_email,
+        html_email_template_name=None,
+    ):
+        subject = loader.render_to_string(subject_template_name, context)
+        # Email subject *must not* contain newlines
+        subject = "".join(subject.splitlines())
+        body = loader.render_to_string(email_template_name, context)
+        html_body = None
+        if html_email_template_name is not None:
+            html_body = loader.render_to_string(html_email_template_name, context)
+        enqueue_mail(subject, body, from_email, [to_email], html_message=html_body)
+
+
 # Profile form
 class ProfileForm(forms.ModelForm):
     class Meta:
@@ -47,6 +70,18 @@ class AddressForm(forms.ModelForm):
             "updated_on",
         )
 
+    def save(self, commit=True):
+        """Return the stored address with these values, reusing an identical one.
+
+        The bound ``instance`` is never edited, since other profiles and
+        orders may point at the same row.
+        """
+        fields = {name: self.cleaned_data[name] for name in Address.ADDRESS_FIELDS}
+        if not commit:
+            return Address(**fields)
+        self.instance = Address.get_or_create_by_fingerprint(**fields)
+        return self.instance
+
 
 class FeedbackForm(forms.ModelForm):
     class Meta:
@@ -59,7 +94,9 @@ class CartItemForm(forms.ModelForm):
         super(CartItemForm, self).__init__(*args, **kwargs)
         instance = getattr(self, "instance", None)
         if instance and instance.id:
-            self.fields["product"].widget = forms.HiddenInput(attrs={})
+            # An item's product never changes, so it isn't posted back and
+            # validated (two product queries per item).
+            del self.fields["product"]
 
     class Meta:
         model = CartItem
@@ -73,8 +110,53 @@ class CartItemForm(forms.ModelForm):
             return self.cleaned_data.get("product", None)
 
 
+class LoadedItemChoiceField(forms.ModelChoiceField):
+    """Resolves a submitted primary key among ``items`` instead of querying."""
+
+    def __init__(self, items, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.items = items
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return self.items[self.queryset.model._meta.pk.to_python(value)]
+        except (KeyError, forms.ValidationError):
+            raise forms.ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+
+
+class BaseCartItemFormSet(forms.BaseModelFormSet):
+    """Item formset whose ids resolve among the items it already loaded."""
+
+    @cached_property
+    def loaded_items(self):
+        return {item.pk: item for item in self.get_queryset()}
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        name = self._pk_field.name
+        field = form.fields[name]
+        form.fields[name] = LoadedItemChoiceField(
+            self.loaded_items,
+            field.queryset,
+            initial=field.initial,
+            required=False,
+            widget=field.widget,
+        )
+
+
 CartItemFormSet = forms.modelformset_factory(
-    CartItem, form=CartItemForm, edit_only=True, extra=0, can_delete=True
+    CartItem,
+    form=CartItemForm,
+    formset=BaseCartItemFormSet,
+    edit_only=True,
+    extra=0,
+    can_delete=True,
 )
 
 AddressFormSet = forms.modelformset_factory(
@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core import pagecache
+from core.currency import PriceConverter
+
+MINI_CART_TEMPLATE = "includes/mini_cart.html"
+PRODUCT_CARD_TEMPLATE = "includes/product_card.html"
+CART_VERSION_KEY = "fragment:cart-version:{user_id}"
+MINI_CART_KEY = "fragment:mini-cart:{user_id}"
+PRODUCT_CARD_KEY = "fragment:product-card:{pk}:{updated_on}:{currency}"
+
+
+def get_cache():
+    return caches[getattr(settings, "FRAGMENT_CACHE_ALIAS", "default")]
+
+
+def get_timeout():
+    return getattr(settings, "FRAGMENT_CACHE_TIMEOUT", 600)
+
+
+# ======================================================== #
+# Header mini-cart                                         #
+# ======================================================== #
+def bump_cart_version(user_id):
+    """Retire the user's cached mini-cart; called whenever their cart changes."""
+    cache = get_cache()
+    try:
+        cache.incr(CART_VERSION_KEY.format(user_id=user_id))
+    except ValueError:
+        # The version was evicted; drop the fragment it guarded as well.
+        cache.delete(MINI_CART_KEY.format(user_id=user_id))
+
+
+def render_mini_cart(cart, converter=None):
+    """Render the header mini-cart for a ``RequestCart`` (``None`` when anonymous).
+
+    The cart version and the fragment are fetched in one ``get_many``; the
+    fragment is only used when it was stored under the current version and
+    in the same currency.
+    """
+    converter = converter or PriceConverter()
+    context = {"cart": cart, "currency": converter}
+    if cart is None:
+        return render_to_string(MINI_CART_TEMPLATE, context)
+
+    cache = get_cache()
+    version_key = CART_VERSION_KEY.format(user_id=cart.user.pk)
+    fragment_key = MINI_CART_KEY.format(user_id=cart.user.pk)
+    cached = cache.get_many([version_key, fragment_key])
+    version = cached.get(version_key)
+    if version is None:
+        version = 1
+        cache.add(version_key, version, None)
+    elif fragment_key in cached and cached[fragment_key][:2] == (
+        version,
+        converter.cache_key,
+    ):
+        return mark_safe(cached[fragment_key][2])
+
+    html = render_to_string(MINI_CART_TEMPLATE, context)
+    cache.set(fragment_key, (version, converter.cache_key, html), get_timeout())
+    return html
+
+
+# ======================================================== #
+# Product cards                                            #
+# ======================================================== #
+def product_card_key(product, converter):
+    updated_on = int(product.updated_on.timestamp() * 1_000_000)
+    return PRODUCT_CARD_KEY.format(
+        pk=product.pk, updated_on=updated_on, currency=converter.cache_key
+    )
+
+
+def render_product_cards(products, csrf_token="", converter=None):
+    """Render a card per product, reading every cached card in one ``get_many``.
+
+    Cards are keyed by ``updated_on`` so an edited product gets a new card,
+    and by currency and rates so each currency has its own. The prices of
+    the missing cards are converted in one pass. Cards are stored with the
+    page cache's CSRF placeholder, which is swapped for ``csrf_token`` on
+    the way out.
+    """
+    products = list(products)
+    if not products:
+        return ""
+
+    converter = converter or PriceConverter()
+    cache = get_cache()
+    keys = [product_card_key(product, converter) for product in products]
+    cached = cache.get_many(keys)
+    pending = [
+        (key, product) for key, product in zip(keys, products) if key not in cached
+    ]
+    prices = converter.convert_many(product.price for _, product in pending)
+    missing = {}
+    for (key, product), price in zip(pending, prices):
+        if key not in missing:
+            missing[key] = render_to_string(
+                PRODUCT_CARD_TEMPLATE,
+                {
+                    "product": product,
+                    "price": price,
+                    "currency": converter,
+                    "csrf_token": pagecache.CSRF_PLACEHOLDER,
+                },
+            )
+    cards = [cached.get(key) or missing[key] for key in keys]
+    if missing:
+        cache.set_many(missing, get_timeout())
+    html = "".join(cards).replace(pagecache.CSRF_PLACEHOLDER, str(csrf_token or ""))
+    return mark_safe(html)
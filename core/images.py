@@ -0,0 +1,161 @@
+import hashlib
+import json
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Widths (in px) of the derivatives generated for every uploaded image.
+DERIVATIVE_WIDTHS = (160, 320, 640)
+DERIVATIVE_ROOT = "derivatives"
+MANIFEST_NAME = "manifest.json"
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+_executor = None
+_executor_lock = threading.Lock()
+# Manifests of images whose derivatives are known to exist. Missing ones
+# are not remembered so templates pick up new variants as soon as they land.
+_manifests = {}
+_MANIFEST_CACHE_SIZE = 4096
+# Images found without a manifest are remembered in the cache, so listings
+# do not look for the same missing file on every render. Cleared when the
+# derivatives are written or the image is saved again.
+MISSING_KEY_PREFIX = "images:missing:"
+
+
+def derivative_dir(name):
+    stem, _ = posixpath.splitext(name)
+    return posixpath.join(DERIVATIVE_ROOT, stem)
+
+
+def manifest_name(name):
+    return posixpath.join(derivative_dir(name), MANIFEST_NAME)
+
+
+def missing_key(name):
+    return MISSING_KEY_PREFIX + hashlib.sha256(name.encode()).hexdigest()
+
+
+def forget_missing(name):
+    """Make the next ``get_manifest`` of ``name`` look in storage again."""
+    cache.delete(missing_key(name))
+
+
+def get_manifest(name, storage=default_storage):
+    """Return the derivative manifest of ``name``, or ``None`` if not generated yet."""
+    manifest = _manifests.get(name)
+    if manifest is not None:
+        return manifest
+    if cache.get(missing_key(name)):
+        return None
+    try:
+        with storage.open(manifest_name(name)) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        timeout = getattr(settings, "IMAGE_MISSING_MANIFEST_TIMEOUT", 300)
+        cache.set(missing_key(name), True, timeout)
+        return None
+    if len(_manifests) >= _MANIFEST_CACHE_SIZE:
+        _manifests.clear()
+    _manifests[name] = manifest
+    return manifest
+
+
+def _flatten(image):
+    """Convert to RGB, painting any transparency onto white."""
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _encode(image, format, **options):
+    buffer = BytesIO()
+    image.save(buffer, format=format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_derivatives(name, storage=default_storage, force=False):
+    """Write resized WebP and JPEG variants of ``name`` plus a manifest.
+
+    Variants are never upscaled; the manifest is written last so a
+    partially processed image is never advertised. Returns the manifest,
+    or ``None`` if the file is missing or not an image.
+    """
+    if not force and storage.exists(manifest_name(name)):
+        return get_manifest(name, storage)
+
+    try:
+        with storage.open(name) as file:
+            original = Image.open(file)
+            original.load()
+    except (OSError, UnidentifiedImageError):
+        logger.warning("Could not read image %s for derivatives", name)
+        return None
+
+    directory = derivative_dir(name)
+    variants = []
+    widths = [width for width in DERIVATIVE_WIDTHS if width < original.width]
+    widths = widths or [original.width]
+    for width in widths:
+        image = _flatten(original)
+        image.thumbnail((width, width * 4), Image.LANCZOS)
+        webp = posixpath.join(directory, f"{width}w.webp")
+        jpeg = posixpath.join(directory, f"{width}w.jpg")
+        for path, content in (
+            (webp, _encode(image, "WEBP", quality=WEBP_QUALITY, method=4)),
+            (jpeg, _encode(image, "JPEG", quality=JPEG_QUALITY, optimize=True)),
+        ):
+            if storage.exists(path):
+                storage.delete(path)
+            storage.save(path, content)
+        variants.append({"width": image.width, "webp": webp, "jpeg": jpeg})
+
+    manifest = {"source": name, "variants": variants}
+    path = manifest_name(name)
+    if storage.exists(path):
+        storage.delete(path)
+    storage.save(path, ContentFile(json.dumps(manifest).encode()))
+    _manifests.pop(name, None)
+    forget_missing(name)
+    return manifest
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "IMAGE_DERIVATIVE_WORKERS", 2),
+                thread_name_prefix="image-derivatives",
+            )
+        return _executor
+
+
+def _generate_safely(name):
+    try:
+        generate_derivatives(name)
+    except Exception:
+        logger.exception("Generating derivatives for %s failed", name)
+
+
+def schedule_derivatives(image):
+    """Queue derivative generation for an ``ImageField`` value off the request thread."""
+    name = getattr(image, "name", image)
+    if not name:
+        return None
+    if not getattr(settings, "IMAGE_DERIVATIVE_WORKERS", 2):
+        return _generate_safely(name)
+    return get_executor().submit(_generate_safely, name)
@@ -0,0 +1,133 @@
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = timedelta(minutes=1)
+
+
+def enqueue_mail(
+    subject, message, from_email=None, recipient_list=(), html_message=None
+):
+    """Queue an email in the outbox; ``send_queued_mail`` delivers it."""
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=message,
+        html_body=html_message or "",
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=",".join(recipient_list),
+    )
+
+
+def enqueue_message(message):
+    """Queue an already built ``EmailMessage``/``EmailMultiAlternatives``."""
+    html_message = None
+    for content, mimetype in getattr(message, "alternatives", []):
+        if mimetype == "text/html":
+            html_message = content
+    return enqueue_mail(
+        message.subject,
+        message.body,
+        message.from_email,
+        message.to,
+        html_message=html_message,
+    )
+
+
+def claim_batch(batch_size):
+    """Mark up to ``batch_size`` due emails as sending and return them.
+
+    Another worker may claim some of the selected rows first; the UPDATE
+    tags only the rows still pending with a fresh token, and only those
+    are returned.
+    """
+    now = timezone.now()
+    token = uuid.uuid4()
+    due = OutboxEmail.objects.filter(
+        state=OutboxEmail.StateChoices.pending, next_attempt_on__lte=now
+    )
+    with transaction.atomic():
+        ids = due.order_by("next_attempt_on", "id").values_list("id", flat=True)
+        ids = list(ids[:batch_size])
+        due.filter(id__in=ids).update(
+            state=OutboxEmail.StateChoices.sending, claim_token=token, updated_on=now
+        )
+    # Only in-flight rows are 'sending', so the state index keeps this cheap.
+    claimed = OutboxEmail.objects.filter(
+        state=OutboxEmail.StateChoices.sending, claim_token=token
+    )
+    return list(claimed.order_by("id"))
+
+
+def build_message(email, connection):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email or None,
+        to=email.get_recipients(),
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, "text/html")
+    return message
+
+
+def mark_failed(email, error, max_attempts=MAX_ATTEMPTS, backoff=RETRY_BACKOFF):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.state = OutboxEmail.StateChoices.dead
+        logger.error("Giving up on outbox email %s: %s", email.pk, error)
+    else:
+        email.state = OutboxEmail.StateChoices.pending
+        email.next_attempt_on = timezone.now() + backoff * 2 ** (email.attempts - 1)
+    email.save(
+        update_fields=[
+            "attempts",
+            "last_error",
+            "state",
+            "next_attempt_on",
+            "updated_on",
+        ]
+    )
+
+
+def send_batch(batch_size=100, max_attempts=MAX_ATTEMPTS, backoff=RETRY_BACKOFF):
+    """Deliver one batch over a single connection; returns ``(sent, failed)``."""
+    emails = claim_batch(batch_size)
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as error:
+        for email in emails:
+            mark_failed(email, error, max_attempts, backoff)
+        return 0, len(emails)
+
+    try:
+        for email in emails:
+            try:
+                build_message(email, connection).send()
+            except Exception as error:
+                mark_failed(email, error, max_attempts, backoff)
+                failed += 1
+                continue
+            email.state = OutboxEmail.StateChoices.sent
+            email.sent_on = timezone.now()
+            email.save(update_fields=["state", "sent_on", "updated_on"])
+            sent += 1
+    finally:
+        connection.close()
+    return sent, failed
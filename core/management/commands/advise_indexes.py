@@ -0,0 +1,194 @@
+import re
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import connection
+
+from core.benchmark import Benchmark, benchmark_database
+from core.middleware import query_shape
+
+_WHERE_COLUMN = re.compile(
+    r'"(?P<table>\w+)"\."(?P<column>\w+)"\s*(?P<op>=|IN\b|>=|<=|>|<|IS\b)'
+)
+_BOOLEAN_COLUMN = re.compile(
+    r'(?:^|AND|\()\s*(?P<negated>NOT\s+)?"(?P<table>\w+)"\."(?P<column>\w+)"\s*(?=AND|\)|$)'
+)
+_SELECT_LIST = re.compile(r"^SELECT .*? FROM ", re.DOTALL)
+_ORDER_BY = re.compile(r"ORDER BY (?P<columns>.+?)(?: LIMIT| OFFSET|$)")
+_ORDER_COLUMN = re.compile(r'"(\w+)"\."(\w+)"(?: (ASC|DESC))?')
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(?P<table>\w+)(?P<rest>.*)$")
+
+
+class QueryCapture:
+    """Execute wrapper keeping one sample of every query shape and its count.
+
+    Only queries run while a request is being handled are kept, so the
+    benchmark's own setup and bookkeeping queries are left out.
+    """
+
+    def __init__(self):
+        self.samples = {}
+        self.counts = Counter()
+        self.in_request = False
+
+    def request_started(self, **kwargs):
+        self.in_request = True
+
+    def request_finished(self, **kwargs):
+        self.in_request = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.in_request and not many:
+            shape = query_shape(sql)
+            self.counts[shape] += 1
+            self.samples.setdefault(shape, (sql, params))
+        return execute(sql, params, many, context)
+
+
+def explain(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(plan):
+    """Return ``(kind, table, detail)`` for full scans and temp B-trees in ``plan``."""
+    problems = []
+    for detail in plan:
+        scan = _SCAN.match(detail)
+        if scan and "USING" not in scan.group("rest"):
+            problems.append(("full scan", scan.group("table"), detail))
+        elif "USE TEMP B-TREE" in detail:
+            problems.append(("temp b-tree", None, detail))
+    return problems
+
+
+def suggest_index(sql, table):
+    """Guess an index for ``table`` from the query's filters and ordering.
+
+    Equality filters come first, then the ORDER BY columns or else a range
+    filter. Boolean filters become the condition of a partial index.
+    Returns ``(columns, conditions)``; only a hint, confirm with ``EXPLAIN``.
+    """
+    where = sql.split(" WHERE ", 1)[1] if " WHERE " in sql else ""
+    where = where.split(" ORDER BY ", 1)[0]
+    equality, ranges = [], []
+    for match in _WHERE_COLUMN.finditer(where):
+        if match.group("table") != table:
+            continue
+        target = equality if match.group("op") in ("=", "IN", "IS") else ranges
+        target.append(match.group("column"))
+    conditions = [
+        f"{'NOT ' if match.group('negated') else ''}{match.group('column')}"
+        for match in _BOOLEAN_COLUMN.finditer(where)
+        if match.group("table") == table
+    ]
+
+    ordering = []
+    order_by = _ORDER_BY.search(sql)
+    if order_by:
+        for match_table, column, direction in _ORDER_COLUMN.findall(
+            order_by.group("columns")
+        ):
+            if match_table == table:
+                ordering.append(f"-{column}" if direction == "DESC" else column)
+
+    if ordering:
+        ordered = {column.lstrip("-") for column in ordering}
+        equality = [column for column in equality if column not in ordered]
+    return list(dict.fromkeys(equality + (ordering or ranges[:1]))), conditions
+
+
+class Command(BaseCommand):
+    help = (
+        "Capture the queries of a benchmark run, EXPLAIN each one and report "
+        "full table scans and temporary B-trees with suggested indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=20000)
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--iterations", type=int, default=5)
+        parser.add_argument(
+            "--min-executions",
+            type=int,
+            default=1,
+            help="Ignore query shapes run fewer times than this.",
+        )
+        parser.add_argument(
+            "--db-name",
+            default="benchmark_db.sqlite3",
+            help="Name of the benchmark database, created next to the real one.",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the seeded benchmark database for the next run.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The index advisor reads SQLite's EXPLAIN QUERY PLAN.")
+
+        capture = QueryCapture()
+        with benchmark_database(
+            options["db_name"],
+            keepdb=options["keepdb"],
+            stdout=self.stdout,
+            products=options["products"],
+            users=options["users"],
+            seed=options["seed"],
+        ):
+            from emart.wsgi import application
+
+            benchmark = Benchmark(
+                application, iterations=options["iterations"], warmup=0
+            )
+            request_started.connect(capture.request_started)
+            request_finished.connect(capture.request_finished)
+            try:
+                with connection.execute_wrapper(capture):
+                    benchmark.run()
+            finally:
+                request_started.disconnect(capture.request_started)
+                request_finished.disconnect(capture.request_finished)
+            findings = self.analyse(capture, options["min_executions"])
+
+        if not findings:
+            self.stdout.write(
+                self.style.SUCCESS("No full scans or temp B-trees found.")
+            )
+            return
+        for count, sql, problems in findings:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"\n{count}x {_SELECT_LIST.sub('SELECT ... FROM ', sql)}"
+                )
+            )
+            for kind, table, detail in problems:
+                line = f"  {kind}: {detail}"
+                if table:
+                    columns, conditions = suggest_index(sql, table)
+                    if columns:
+                        line += f"\n    suggest: Index on {table}({', '.join(columns)})"
+                        if conditions:
+                            line += f" WHERE {' AND '.join(conditions)}"
+                self.stdout.write(line)
+        self.stdout.write(
+            f"\n{len(findings)} of {len(capture.counts)} query shapes need attention."
+        )
+
+    def analyse(self, capture, min_executions):
+        findings = []
+        for shape, count in capture.counts.most_common():
+            if count < min_executions:
+                continue
+            sql, params = capture.samples[shape]
+            if not sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                continue
+            problems = plan_problems(explain(sql, params))
+            if problems:
+                findings.append((count, sql, problems))
+        return findings
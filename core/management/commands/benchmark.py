@@ -0,0 +1,93 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import Benchmark, benchmark_database, compare
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the browse, cart and checkout flows through the WSGI app "
+        "on a generated data set and compare the results with a baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=50000)
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument(
+            "--steps", nargs="+", choices=Benchmark.STEPS, help="Only run these steps."
+        )
+        parser.add_argument(
+            "--output",
+            default="benchmark.json",
+            help="Where to write the JSON results.",
+        )
+        parser.add_argument(
+            "--baseline", help="JSON results of an earlier run to compare against."
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Allowed relative slowdown before a step counts as a regression.",
+        )
+        parser.add_argument(
+            "--db-name",
+            default="benchmark_db.sqlite3",
+            help="Name of the benchmark database, created next to the real one.",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the seeded benchmark database for the next run.",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            baseline = json.loads(Path(options["baseline"]).read_text())
+
+        with benchmark_database(
+            options["db_name"],
+            keepdb=options["keepdb"],
+            stdout=self.stdout,
+            products=options["products"],
+            users=options["users"],
+            seed=options["seed"],
+        ):
+            from emart.wsgi import application
+
+            benchmark = Benchmark(
+                application, iterations=options["iterations"], warmup=options["warmup"]
+            )
+            results = benchmark.run(options["steps"])
+
+        Path(options["output"]).write_text(json.dumps(results, indent=2) + "\n")
+        self.report(results)
+        self.stdout.write(f"Results written to {options['output']}.")
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options["tolerance"])
+            if regressions:
+                raise CommandError(
+                    "Performance regressions:\n  " + "\n  ".join(regressions)
+                )
+            self.stdout.write(
+                self.style.SUCCESS("No regressions against the baseline.")
+            )
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'step':>18} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+            f"{'queries':>8} {'alloc kb':>9} {'errors':>7}"
+        )
+        for name, step in results["steps"].items():
+            self.stdout.write(
+                f"{name:>18} {step['p50_ms']:9.2f} {step['p95_ms']:9.2f} "
+                f"{step['p99_ms']:9.2f} {step['queries'] or 0:8d} "
+                f"{step['alloc_peak_kb'] or 0:9.1f} {step['errors']:7d}"
+            )
@@ -0,0 +1,135 @@
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.views import static
+from PIL import Image
+
+from core import mediafiles
+
+IMAGE_NAME = "large.jpg"
+
+
+def send(response, sink):
+    """Write ``response`` to ``sink`` the way a WSGI server would; return bytes sent.
+
+    Files are sent with ``sendfile()``, as servers with a
+    ``wsgi.file_wrapper`` do; anything else is iterated in Python.
+    """
+    file = getattr(response, "file_to_stream", None)
+    if file is not None and hasattr(file, "fileno"):
+        offset, sent = file.tell(), 0
+        size = os.fstat(file.fileno()).st_size
+        while offset < size:
+            count = os.sendfile(sink.fileno(), file.fileno(), offset, size - offset)
+            if not count:
+                break
+            offset += count
+            sent += count
+        response.close()
+        return sent
+    sent = 0
+    for chunk in response:
+        sent += sink.write(chunk)
+    response.close()
+    return sent
+
+
+def iterate(response, sink):
+    """Send ``response`` through Python without ``sendfile()``."""
+    response.file_to_stream = None
+    return send(response, sink)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure media serving throughput on a large generated JPEG: whole files, "
+        "byte ranges, revalidation and proxy offload, against django.views.static."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--width", type=int, default=6000)
+        parser.add_argument("--height", type=int, default=4000)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument(
+            "--range-size",
+            type=int,
+            default=1024 * 1024,
+            help="Bytes per Range request.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as root:
+            path = Path(root) / IMAGE_NAME
+            self.make_image(path, options["width"], options["height"], options["seed"])
+            size = path.stat().st_size
+            self.stdout.write(f"{IMAGE_NAME}: {size / 1024 / 1024:.1f} MB")
+            # A real file, unlike /dev/null, makes sendfile() copy the data.
+            with override_settings(
+                MEDIA_ROOT=root, MEDIA_OFFLOAD=None
+            ), tempfile.TemporaryFile(dir=root) as sink:
+                for label, run in self.cases(root, size, options).items():
+                    self.report(label, *self.measure(run, sink, options["iterations"]))
+
+    def make_image(self, path, width, height, seed):
+        noise = random.Random(seed).randbytes(width * height * 3)
+        Image.frombytes("RGB", (width, height), noise).save(path, quality=90)
+
+    def cases(self, root, size, options):
+        factory = RequestFactory()
+        picker = random.Random(options["seed"])
+        range_size = options["range_size"]
+        etag = mediafiles.serve(factory.get("/"), IMAGE_NAME)["ETag"]
+
+        def ranged():
+            start = picker.randrange(max(size - range_size, 1))
+            return factory.get(
+                "/", HTTP_RANGE=f"bytes={start}-{start + range_size - 1}"
+            )
+
+        def old(request):
+            return static.serve(request, IMAGE_NAME, document_root=root)
+
+        return {
+            "static.serve, whole file": lambda sink: send(old(factory.get("/")), sink),
+            "static.serve, for a range": lambda sink: send(old(ranged()), sink),
+            "serve, whole file, sendfile": lambda sink: send(
+                mediafiles.serve(factory.get("/"), IMAGE_NAME), sink
+            ),
+            "serve, whole file, Python": lambda sink: iterate(
+                mediafiles.serve(factory.get("/"), IMAGE_NAME), sink
+            ),
+            "serve, range": lambda sink: send(
+                mediafiles.serve(ranged(), IMAGE_NAME), sink
+            ),
+            "serve, revalidation (304)": lambda sink: send(
+                mediafiles.serve(factory.get("/", HTTP_IF_NONE_MATCH=etag), IMAGE_NAME),
+                sink,
+            ),
+            "serve, x-accel-redirect": lambda sink: self.offloaded(factory, sink),
+        }
+
+    def offloaded(self, factory, sink):
+        with override_settings(MEDIA_OFFLOAD="x-accel-redirect"):
+            return send(mediafiles.serve(factory.get("/"), IMAGE_NAME), sink)
+
+    def measure(self, run, sink, iterations):
+        sent = 0
+        started = time.perf_counter()
+        for _ in range(iterations):
+            sink.seek(0)
+            sink.truncate()
+            sent += run(sink)
+        return iterations, sent, time.perf_counter() - started
+
+    def report(self, label, requests, sent, elapsed):
+        self.stdout.write(
+            f"{label:<30}{elapsed / requests * 1000:>9.2f} ms/req"
+            f"{sent / 1024 / 1024 / elapsed:>10.0f} MB/s"
+            f"{sent / requests / 1024:>12.0f} KB/req"
+        )
@@ -0,0 +1,104 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.benchmark import benchmark_database
+
+ENGINES = {
+    "database": "django.contrib.sessions.backends.db",
+    "cached": "core.sessions",
+}
+
+
+def read_currency(request):
+    # What CheckoutView does.
+    request.session.get("currency")
+    return HttpResponse()
+
+
+def rewrite_currency(request):
+    # What CartView.form_valid does on every cart update.
+    request.session["currency"] = request.session.get("currency")
+    return HttpResponse()
+
+
+def change_currency(request):
+    request.session["currency"] = (
+        "USD" if request.session.get("currency") == "INR" else "INR"
+    )
+    return HttpResponse()
+
+
+SCENARIOS = {
+    "read currency": read_currency,
+    "write same currency": rewrite_currency,
+    "change currency": change_currency,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the per-request session overhead of the database engine "
+        "against core.sessions for the currency reads and writes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000)
+        parser.add_argument(
+            "--db-name",
+            default="benchmark_db.sqlite3",
+            help="Name of the benchmark database, created next to the real one.",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the seeded benchmark database for the next run.",
+        )
+
+    def handle(self, *args, **options):
+        with benchmark_database(
+            options["db_name"],
+            keepdb=options["keepdb"],
+            stdout=self.stdout,
+            products=10,
+            users=1,
+        ):
+            self.stdout.write(f"{'':<30}{'us/request':>12}{'queries':>10}")
+            for engine_name, engine in ENGINES.items():
+                with override_settings(SESSION_ENGINE=engine, DEBUG=False):
+                    for scenario, view in SCENARIOS.items():
+                        per_request, queries = self.measure(
+                            engine, view, options["iterations"]
+                        )
+                        self.stdout.write(
+                            f"{engine_name + ', ' + scenario:<30}"
+                            f"{per_request:>12.1f}{queries:>10}"
+                        )
+
+    def measure(self, engine, view, iterations):
+        store = import_module(engine).SessionStore()
+        store["currency"] = "INR"
+        store.save()
+        middleware = SessionMiddleware(view)
+        factory = RequestFactory()
+
+        def request():
+            request = factory.get("/")
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = store.session_key
+            middleware(request)
+
+        request()
+        with CaptureQueriesContext(connection) as queries:
+            request()
+        started = time.perf_counter()
+        for _ in range(iterations):
+            request()
+        elapsed = time.perf_counter() - started
+        return elapsed / iterations * 1_000_000, len(queries)
@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Case, Value, When
+
+from core.models import Address
+
+
+class Command(BaseCommand):
+    help = (
+        "Fingerprint addresses saved before fingerprints existed, pointing every "
+        "reference to a duplicate at the row already holding its fingerprint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of addresses fingerprinted per batch.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        pending = Address.objects.filter(fingerprint="").order_by("pk")
+        fingerprinted = removed = 0
+        while True:
+            batch = list(pending.only("location", *Address.ADDRESS_FIELDS)[:batch_size])
+            if not batch:
+                break
+            kept, duplicates = self.fingerprint(batch)
+            with transaction.atomic():
+                self.collapse(duplicates)
+                Address.objects.bulk_update(
+                    kept, ["fingerprint", *Address.ADDRESS_FIELDS]
+                )
+            fingerprinted += len(kept)
+            removed += len(duplicates)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Fingerprinted {fingerprinted} addresses and removed {removed} duplicates."
+            )
+        )
+
+    def fingerprint(self, batch):
+        """Split ``batch`` into the rows to keep and a map of duplicate pk to kept pk.
+
+        A row is a duplicate when its fingerprint is already stored, or taken
+        by an earlier row of the batch; the fingerprint is unique, so only
+        one row can hold it.
+        """
+        for address in batch:
+            for name in Address.ADDRESS_FIELDS:
+                setattr(address, name, Address.normalize(getattr(address, name)))
+            address.fingerprint = address.get_fingerprint()
+        owners = dict(
+            Address.objects.filter(
+                fingerprint__in={address.fingerprint for address in batch}
+            ).values_list("fingerprint", "pk")
+        )
+        kept, duplicates = [], {}
+        for address in batch:
+            if address.fingerprint in owners:
+                duplicates[address.pk] = owners[address.fingerprint]
+            else:
+                owners[address.fingerprint] = address.pk
+                kept.append(address)
+        return kept, duplicates
+
+    def collapse(self, duplicates):
+        """Point every reference to a duplicate at its kept row and delete it."""
+        if not duplicates:
+            return
+        references = [
+            (relation.related_model, relation.field.attname)
+            for relation in Address._meta.related_objects
+            if isinstance(relation.field, models.ForeignKey)
+        ]
+        for model, attname in references:
+            kept = Case(
+                *(
+                    When(**{attname: pk}, then=Value(keep))
+                    for pk, keep in duplicates.items()
+                )
+            )
+            model.objects.filter(**{f"{attname}__in": duplicates}).update(
+                **{attname: kept}
+            )
+        Address.objects.filter(pk__in=duplicates).delete()
@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import images
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp"}
+
+
+def _generate(name, force):
+    return images.generate_derivatives(name, force=force) is not None
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnails and WebP variants for every image under MEDIA_ROOT."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Number of worker processes (defaults to the CPU count).",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate derivatives that already exist.",
+        )
+
+    def handle(self, *args, **options):
+        media_root = Path(settings.MEDIA_ROOT)
+        derivative_root = media_root / images.DERIVATIVE_ROOT
+        names = [
+            path.relative_to(media_root).as_posix()
+            for path in sorted(media_root.rglob("*"))
+            if path.is_file()
+            and path.suffix.lower() in IMAGE_EXTENSIONS
+            and derivative_root not in path.parents
+        ]
+
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            results = list(
+                executor.map(_generate, names, [options["force"]] * len(names))
+            )
+        elapsed = time.perf_counter() - started
+
+        done = sum(results)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {done} of {len(names)} images in {elapsed:.1f}s "
+                f"({len(names) / elapsed if elapsed else 0:.1f} images/s)."
+            )
+        )
@@ -0,0 +1,477 @@
+import itertools
+import math
+import random
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core import search
+from core.models import (
+    Address,
+    Cart,
+    CartItem,
+    CategoryModel,
+    Order,
+    OrderLine,
+    Payment,
+    ProductModel,
+    Profile,
+    ReviewModel,
+    UnitModel,
+    User,
+    WishlistModel,
+)
+
+WORDS = (
+    "organic fresh premium classic smart compact deluxe eco light heavy mini "
+    "golden silver rustic urban wild crisp soft spicy sweet roasted natural"
+).split()
+NOUNS = (
+    "rice tea coffee soap shampoo lamp chair mug bottle bag shirt shoe watch "
+    "honey oil flour sugar spice bread cheese jam pen notebook towel pillow"
+).split()
+PLACES = "Kochi Chennai Mumbai Pune Delhi Jaipur Kolkata Mysore Goa Indore".split()
+UNITS = (
+    ("Piece", "pc"),
+    ("Kilogram", "kg"),
+    ("Gram", "g"),
+    ("Litre", "l"),
+    ("Millilitre", "ml"),
+    ("Pack", "pk"),
+    ("Dozen", "dz"),
+    ("Metre", "m"),
+)
+# Relative frequency of 1..5 star reviews.
+STAR_WEIGHTS = (6, 5, 12, 32, 45)
+PAYMENT_STATUS_WEIGHTS = (
+    (Payment.PaymentStatusChoices.completed, 90),
+    (Payment.PaymentStatusChoices.failed, 7),
+    (Payment.PaymentStatusChoices.pending, 3),
+)
+
+
+class Skewed:
+    """Pick from ``items`` with Zipf-like weights: rank ``k`` has weight ``1 / k**s``.
+
+    Ranks are shuffled with ``rng`` so popularity does not follow
+    insertion order.
+    """
+
+    def __init__(self, rng, items, exponent):
+        self.rng = rng
+        self.items = list(items)
+        ranks = list(range(1, len(self.items) + 1))
+        rng.shuffle(ranks)
+        self.weights = [1 / rank**exponent for rank in ranks]
+        self.cum_weights = list(itertools.accumulate(self.weights))
+
+    def share(self, index):
+        """Fraction of all picks expected to land on ``items[index]``."""
+        return self.weights[index] / self.cum_weights[-1]
+
+    def pick(self, k=1):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights, k=k)
+
+    def sample(self, k):
+        """Up to ``k`` distinct items, popular ones first more often."""
+        picked = dict.fromkeys(self.pick(k * 3))
+        return list(picked)[:k]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a large, deterministic synthetic catalogue with users, "
+        "reviews, wishlists, carts, orders and payments for benchmarking."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+        parser.add_argument(
+            "--prefix",
+            default="sample",
+            help="Prefix of generated usernames and order/payment ids.",
+        )
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--products", type=int, default=100000)
+        parser.add_argument(
+            "--category-depth", type=int, default=3, help="Levels in the category tree."
+        )
+        parser.add_argument(
+            "--category-fanout", type=int, default=6, help="Children per category."
+        )
+        parser.add_argument(
+            "--reviews-per-product",
+            type=float,
+            default=2.0,
+            help="Mean reviews per product; popular products get more.",
+        )
+        parser.add_argument(
+            "--wishlists-per-user",
+            type=float,
+            default=1.0,
+            help="Mean wishlists per user.",
+        )
+        parser.add_argument(
+            "--orders-per-user", type=float, default=2.0, help="Mean orders per user."
+        )
+        parser.add_argument(
+            "--items-per-cart", type=float, default=4.0, help="Mean items per cart."
+        )
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.1,
+            help="Zipf exponent of product popularity and user activity.",
+        )
+        parser.add_argument(
+            "--password",
+            default="password",
+            help="Password of every generated user.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=2000, help="Rows per bulk insert."
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.prefix = f"{options['prefix']}{options['seed']}"
+        self.timings = []
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError(
+                "The database backend must return ids from bulk inserts."
+            )
+        if User.objects.filter(username__startswith=f"{self.prefix}-").exists():
+            raise CommandError(
+                f"Data with prefix {self.prefix!r} already exists; "
+                "pass another --prefix or --seed."
+            )
+
+        started = time.perf_counter()
+        users = self.create_users()
+        units = self.create_units(users[0])
+        leaves = self.create_categories(users[0])
+        product_picker = self.create_products(users, units, leaves)
+        user_picker = Skewed(self.rng, users, options["skew"])
+        self.create_wishlists(users, product_picker)
+        self.create_carts(users, user_picker, product_picker)
+        if search.is_available():
+            with self.stage("search index") as stage:
+                stage["rows"] = search.rebuild_index()
+
+        elapsed = time.perf_counter() - started
+        rows = sum(rows for _, rows, _ in self.timings)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)."
+            )
+        )
+
+    # ======================================================== #
+    # Helpers                                                  #
+    # ======================================================== #
+    @contextmanager
+    def stage(self, name):
+        """Time a generation step and report its throughput."""
+        stage = {"rows": 0}
+        started = time.perf_counter()
+        with transaction.atomic():
+            yield stage
+        elapsed = time.perf_counter() - started
+        self.timings.append((name, stage["rows"], elapsed))
+        self.stdout.write(
+            f"{name:>16}: {stage['rows']:>8} rows in {elapsed:6.2f}s "
+            f"({stage['rows'] / max(elapsed, 1e-9):.0f} rows/s)"
+        )
+
+    def bulk_create(self, model, objs):
+        return model.objects.bulk_create(objs, batch_size=self.batch_size)
+
+    def count(self, mean):
+        """A non-negative integer with the given mean, exponentially distributed."""
+        if mean <= 0:
+            return 0
+        return int(self.rng.expovariate(1 / mean) + 0.5)
+
+    def poisson_round(self, expected):
+        """Round ``expected`` up or down at random, keeping the mean."""
+        whole = math.floor(expected)
+        return whole + (self.rng.random() < expected - whole)
+
+    def address(self):
+        city = self.rng.choice(PLACES)
+        return Address(
+            building_name=f"{self.rng.randint(1, 999)} {self.rng.choice(NOUNS).title()} House",
+            place=city,
+            street=f"{self.rng.choice(WORDS).title()} Street",
+            city=city,
+            district=city,
+            state="Kerala",
+            country="India",
+            post_office=city,
+            post_code=f"{self.rng.randint(100000, 999999)}",
+        )
+
+    # ======================================================== #
+    # Generation steps                                         #
+    # ======================================================== #
+    def create_users(self):
+        password = make_password(self.options["password"])
+        count = self.options["users"]
+        if count < 1:
+            raise CommandError("--users must be at least 1.")
+
+        with self.stage("users") as stage:
+            users = self.bulk_create(
+                User,
+                [
+                    User(
+                        username=f"{self.prefix}-{index:07d}",
+                        email=f"{self.prefix}-{index:07d}@example.com",
+                        password=password,
+                    )
+                    for index in range(count)
+                ],
+            )
+            addresses = self.bulk_create(Address, [self.address() for _ in users])
+            self.addresses = {
+                user.pk: address for user, address in zip(users, addresses)
+            }
+            self.bulk_create(
+                Profile,
+                [
+                    Profile(
+                        user=user,
+                        address=address,
+                        first_name=self.rng.choice(NOUNS).title(),
+                        last_name=self.rng.choice(WORDS).title(),
+                        gender=self.rng.choice(Profile.GENDER_CHOICES)[0],
+                        is_loyal=self.rng.random() < 0.1,
+                    )
+                    for user, address in zip(users, addresses)
+                ],
+            )
+            stage["rows"] = len(users) * 3
+        return users
+
+    def create_units(self, owner):
+        with self.stage("units") as stage:
+            units = self.bulk_create(
+                UnitModel,
+                [
+                    UnitModel(name=name, symbol=symbol, convertion_rate=1, user=owner)
+                    for name, symbol in UNITS
+                ],
+            )
+            stage["rows"] = len(units)
+        return units
+
+    def create_categories(self, owner):
+        """Build the tree level by level; return the leaf categories."""
+        depth = max(1, self.options["category_depth"])
+        fanout = max(1, self.options["category_fanout"])
+        step = CategoryModel.PATH_STEP
+        with self.stage("categories") as stage:
+            level = [None]
+            for depth_index in range(depth):
+                categories = [
+                    CategoryModel(
+                        name=f"{self.rng.choice(WORDS).title()} {self.rng.choice(NOUNS)}",
+                        parent=parent,
+                        user=owner,
+                    )
+                    for parent in level
+                    for _ in range(fanout)
+                ]
+                categories = self.bulk_create(CategoryModel, categories)
+                for category in categories:
+                    parent_path = category.parent.path if category.parent else ""
+                    category.path = f"{parent_path}{category.pk:0{step}d}/"
+                CategoryModel.objects.bulk_update(
+                    categories, ["path"], batch_size=self.batch_size
+                )
+                stage["rows"] += len(categories)
+                level = categories
+        return level
+
+    def create_products(self, users, units, leaves):
+        """Create products in chunks with their reviews and rating statistics.
+
+        Each product's review count follows its popularity, so ratings are
+        computed here and stored with the product instead of being rebuilt.
+        Returns a ``Skewed`` picker over the product ids.
+        """
+        count = self.options["products"]
+        rng = self.rng
+        sellers = users[: max(1, len(users) // 50)]
+        category_picker = Skewed(rng, leaves, 0.8)
+        popularity = Skewed(rng, range(count), self.options["skew"])
+        total_reviews = count * self.options["reviews_per_product"]
+        reviewers = Skewed(rng, users, self.options["skew"])
+        product_ids = []
+        self.prices = {}
+
+        with self.stage("products") as products_stage:
+            review_rows = 0
+            for start in range(0, count, self.batch_size):
+                products = []
+                ratings = []
+                for index in range(start, min(start + self.batch_size, count)):
+                    reviews = self.poisson_round(
+                        total_reviews * popularity.share(index)
+                    )
+                    stars = rng.choices(ProductModel.STARS, STAR_WEIGHTS, k=reviews)
+                    ratings.append(stars)
+                    product = ProductModel(
+                        name=f"{rng.choice(WORDS).title()} {rng.choice(NOUNS)} {index}",
+                        description=" ".join(rng.choices(WORDS + NOUNS, k=24)),
+                        price=round(rng.lognormvariate(5, 1), 2),
+                        category=category_picker.pick()[0],
+                        unit=rng.choice(units),
+                        user=rng.choice(sellers),
+                        rating_count=len(stars),
+                        rating_avg=sum(stars) / len(stars) if stars else 0,
+                    )
+                    for star in ProductModel.STARS:
+                        setattr(product, f"rating_{star}_count", stars.count(star))
+                    products.append(product)
+                products = self.bulk_create(ProductModel, products)
+
+                reviews = [
+                    ReviewModel(
+                        product=product,
+                        rating=star,
+                        comment=" ".join(rng.choices(WORDS, k=8)),
+                        user=reviewer,
+                    )
+                    for product, stars in zip(products, ratings)
+                    for star, reviewer in zip(stars, reviewers.pick(len(stars)))
+                ]
+                self.bulk_create(ReviewModel, reviews)
+                product_ids.extend(product.pk for product in products)
+                self.prices.update((product.pk, product.price) for product in products)
+                review_rows += len(reviews)
+            products_stage["rows"] = count + review_rows
+
+        popularity.items = product_ids
+        return popularity
+
+    def create_wishlists(self, users, product_picker):
+        through = WishlistModel.products.through
+        with self.stage("wishlists") as stage:
+            wishlists = [
+                WishlistModel(name=f"{self.rng.choice(WORDS).title()} list", user=user)
+                for user in users
+                for _ in range(self.count(self.options["wishlists_per_user"]))
+            ]
+            wishlists = self.bulk_create(WishlistModel, wishlists)
+            links = [
+                through(wishlistmodel_id=wishlist.pk, productmodel_id=product_id)
+                for wishlist in wishlists
+                for product_id in product_picker.sample(1 + self.count(4))
+            ]
+            self.bulk_create(through, links)
+            stage["rows"] = len(wishlists) + len(links)
+
+    def create_carts(self, users, user_picker, product_picker):
+        """Checked-out carts with an order and payment, plus some open carts."""
+        order_total = int(len(users) * self.options["orders_per_user"])
+        buyers = user_picker.pick(order_total)
+        open_cart_users = [user for user in users if self.rng.random() < 0.3]
+        items_per_cart = self.options["items_per_cart"] - 1
+
+        with self.stage("carts") as stage:
+            carts = [Cart(user=user, empty=False, checked_out=True) for user in buyers]
+            carts += [Cart(user=user, empty=False) for user in open_cart_users]
+            items = []
+            for cart in carts:
+                for product_id in product_picker.sample(1 + self.count(items_per_cart)):
+                    quantity = 1 + self.count(1)
+                    cart.subtotal += self.prices[product_id] * quantity
+                    cart.item_count += 1
+                    items.append((cart, product_id, quantity))
+            carts = self.bulk_create(Cart, carts)
+            self.bulk_create(
+                CartItem,
+                [
+                    CartItem(cart=cart, product_id=product_id, quantity=quantity)
+                    for cart, product_id, quantity in items
+                ],
+            )
+            stage["rows"] = len(carts) + len(items)
+
+        lines_by_cart = {}
+        for cart, product_id, quantity in items:
+            lines_by_cart.setdefault(id(cart), []).append((product_id, quantity))
+
+        with self.stage("orders") as stage:
+            orders = []
+            lines = []
+            payments = []
+            statuses, weights = zip(*PAYMENT_STATUS_WEIGHTS)
+            for index, cart in enumerate(carts[:order_total]):
+                address = self.addresses[cart.user_id]
+                delivery_charge = self.rng.choice((0, 0, 40, 50))
+                status = self.rng.choices(statuses, weights)[0]
+                order = Order(
+                    id=f"order_{self.prefix}_{index:08d}",
+                    cart=cart,
+                    amount=round(cart.subtotal + delivery_charge, 2),
+                    subtotal=round(cart.subtotal, 2),
+                    item_count=cart.item_count,
+                    delivery_charge=delivery_charge,
+                    completed=status == Payment.PaymentStatusChoices.completed,
+                    billing_address=address,
+                    shipping_address=address,
+                )
+                orders.append(order)
+                lines += [
+                    OrderLine(
+                        order=order,
+                        product_id=product_id,
+                        quantity=quantity,
+                        unit_price=self.prices[product_id],
+                        line_total=round(self.prices[product_id] * quantity, 2),
+                    )
+                    for product_id, quantity in lines_by_cart.get(id(cart), [])
+                ]
+                payments.append(
+                    Payment(
+                        id=f"pay_{self.prefix}_{index:08d}",
+                        order=order,
+                        status=status,
+                        mode=self.rng.choice(("card", "upi", "netbanking")),
+                    )
+                )
+            self.bulk_create(Order, orders)
+            self.bulk_create(OrderLine, lines)
+            self.bulk_create(Payment, payments)
+            stage["rows"] = len(orders) + len(lines) + len(payments)
+
+        with self.stage("order stats") as stage:
+            # bulk_create sends no signals, so fill in what they would have kept.
+            buyers = {user.pk: user for user in users}
+            for order in orders:
+                buyer = buyers[order.cart.user_id]
+                buyer.order_count += 1
+                if (
+                    buyer.last_order_on is None
+                    or order.created_on > buyer.last_order_on
+                ):
+                    buyer.last_order_on = order.created_on
+            for payment in payments:
+                if payment.status == Payment.PaymentStatusChoices.completed:
+                    buyers[
+                        payment.order.cart.user_id
+                    ].lifetime_spend += payment.order.amount
+            stats_users = [user for user in users if user.order_count]
+            for user in stats_users:
+                user.lifetime_spend = round(user.lifetime_spend, 2)
+            User.objects.bulk_update(
+                stats_users, User.ORDER_STATS_FIELDS, batch_size=self.batch_size
+            )
+            stage["rows"] = len(stats_users)
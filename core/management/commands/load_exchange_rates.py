@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.currency import load_rates_file
+
+
+class Command(BaseCommand):
+    help = (
+        "Load effective-dated exchange rates from a CSV file with "
+        "currency,effective_from,rate columns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            default=settings.EXCHANGE_RATES_FILE,
+            help="CSV file to load; defaults to the EXCHANGE_RATES_FILE setting.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            count = load_rates_file(options["path"])
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(f"Loaded {count} exchange rates."))
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import Cart
+
+# Float prices make exact equality too strict when comparing totals.
+TOLERANCE = 0.005
+
+
+class Command(BaseCommand):
+    help = "Verify and rebuild the denormalized subtotal and item count on carts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report carts whose stored totals are stale; exit non-zero if any are.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of carts updated per query.",
+        )
+
+    def handle(self, *args, **options):
+        check = options["check"]
+        batch_size = options["batch_size"]
+
+        carts = Cart.with_calculated_totals().order_by("pk")
+        stale = []
+        checked = 0
+        for cart in carts.iterator(chunk_size=batch_size):
+            checked += 1
+            if (
+                abs(cart.subtotal - cart.calculated_subtotal) > TOLERANCE
+                or cart.item_count != cart.calculated_item_count
+            ):
+                if check:
+                    self.stdout.write(
+                        f"Cart {cart.pk}: stored {cart.subtotal}/{cart.item_count}, "
+                        f"actual {cart.calculated_subtotal}/{cart.calculated_item_count}"
+                    )
+                cart.subtotal = cart.calculated_subtotal
+                cart.item_count = cart.calculated_item_count
+                stale.append(cart)
+
+        if check:
+            if stale:
+                raise CommandError(
+                    f"{len(stale)} of {checked} carts have stale totals."
+                )
+            self.stdout.write(
+                self.style.SUCCESS(f"All {checked} carts are up to date.")
+            )
+            return
+
+        with transaction.atomic():
+            Cart.objects.bulk_update(
+                stale, ["subtotal", "item_count"], batch_size=batch_size
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt totals for {len(stale)} of {checked} carts.")
+        )
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import customers
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the stored order count, lifetime spend and last order date of users."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of users recomputed and updated per batch.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        fields = User.ORDER_STATS_FIELDS
+
+        users = User.objects.only(*fields).order_by("pk")
+        batch = []
+        updated = 0
+        for user in users.iterator(chunk_size=batch_size):
+            batch.append(user)
+            if len(batch) >= batch_size:
+                updated += self.save_batch(batch, fields)
+                batch = []
+        updated += self.save_batch(batch, fields)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt order statistics for {updated} users.")
+        )
+
+    def save_batch(self, batch, fields):
+        stats = customers.calculate_order_stats([user.pk for user in batch])
+        stale = []
+        for user in batch:
+            stored = [getattr(user, field) for field in fields]
+            values = stats.get(user.pk, customers.empty_order_stats())
+            if stored != [values[field] for field in fields]:
+                for field in fields:
+                    setattr(user, field, values[field])
+                stale.append(user)
+        with transaction.atomic():
+            User.objects.bulk_update(stale, fields)
+        return len(stale)
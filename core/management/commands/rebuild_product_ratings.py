@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import ProductModel
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored rating statistics of products from their reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of products updated per query.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        fields = ProductModel.RATING_FIELDS
+
+        products = ProductModel.with_calculated_ratings().only(*fields).order_by("pk")
+        batch = []
+        updated = 0
+        for product in products.iterator(chunk_size=batch_size):
+            stored = [getattr(product, field) for field in fields]
+            product.copy_calculated_ratings()
+            if stored != [getattr(product, field) for field in fields]:
+                batch.append(product)
+            if len(batch) >= batch_size:
+                updated += self.save_batch(batch, fields)
+                batch = []
+        updated += self.save_batch(batch, fields)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt ratings for {updated} products.")
+        )
+
+    def save_batch(self, batch, fields):
+        with transaction.atomic():
+            ProductModel.objects.bulk_update(batch, fields)
+        return len(batch)
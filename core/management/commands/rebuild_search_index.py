@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text product search index from scratch."
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("Product search needs the SQLite FTS5 backend.")
+        indexed = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} products."))
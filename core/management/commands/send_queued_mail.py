@@ -0,0 +1,75 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import mail
+from core.models import OutboxEmail
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbox emails in batches over one connection per batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=mail.MAX_ATTEMPTS,
+            help="Attempts before an email is dead-lettered.",
+        )
+        parser.add_argument(
+            "--backoff",
+            type=float,
+            default=mail.RETRY_BACKOFF.total_seconds(),
+            help="Seconds before the first retry; doubles on every attempt.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the outbox instead of exiting once it is drained.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Seconds to sleep between polls when the outbox is empty.",
+        )
+        parser.add_argument(
+            "--requeue-stuck",
+            type=int,
+            default=600,
+            help="Return emails left in 'sending' longer than this many seconds.",
+        )
+
+    def handle(self, *args, **options):
+        backoff = timedelta(seconds=options["backoff"])
+        self.requeue_stuck(options["requeue_stuck"])
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = mail.send_batch(
+                options["batch_size"], options["max_attempts"], backoff
+            )
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f"Sent {sent}, failed {failed}.")
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        dead = OutboxEmail.objects.filter(state=OutboxEmail.StateChoices.dead).count()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Outbox drained: {total_sent} sent, {total_failed} failed, {dead} dead."
+            )
+        )
+
+    def requeue_stuck(self, seconds):
+        # A worker that died mid-batch leaves its claimed emails in 'sending'.
+        cutoff = timezone.now() - timedelta(seconds=seconds)
+        OutboxEmail.objects.filter(
+            state=OutboxEmail.StateChoices.sending, updated_on__lt=cutoff
+        ).update(state=OutboxEmail.StateChoices.pending)
@@ -0,0 +1,132 @@
+import mimetypes
+import re
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+BLOCK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def byte_range(header, size):
+    """Return the inclusive ``(start, end)`` asked for by a ``Range`` header.
+
+    ``None`` means the whole file should be sent: no header, a malformed
+    one or several ranges, which are allowed to be ignored. Raises
+    ``RangeNotSatisfiable`` when the range lies past the end of the file.
+    """
+    match = _RANGE.match((header or "").replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if not length or not size:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if start >= size:
+        raise RangeNotSatisfiable
+    end = min(int(last), size - 1) if last else size - 1
+    return (start, end) if start <= end else None
+
+
+def strong_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def range_applies(request, etag, last_modified):
+    """Honour ``If-Range``: serve the range only if the file is unchanged."""
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def read_range(file, start, length):
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(BLOCK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def offload_response(mode, fullpath, path, content_type):
+    """Hand the file to the fronting proxy, which does its own ranges and caching."""
+    response = HttpResponse(content_type=content_type)
+    if mode == "x-accel-redirect":
+        prefix = getattr(settings, "MEDIA_ACCEL_REDIRECT_PREFIX", "/protected-media/")
+        response["X-Accel-Redirect"] = prefix + quote(path)
+    elif mode == "x-sendfile":
+        response["X-Sendfile"] = str(fullpath)
+    else:
+        raise ValueError(f"Unknown MEDIA_OFFLOAD mode {mode!r}")
+    return response
+
+
+@require_safe
+def serve(request, path):
+    """Serve an uploaded file from ``MEDIA_ROOT``.
+
+    Whole files go out as a ``FileResponse``, which WSGI servers with a
+    ``wsgi.file_wrapper`` send with ``sendfile()``. Single byte ranges are
+    answered with 206, conditional requests are validated against a strong
+    ETag built from the modification time and size, and with
+    ``MEDIA_OFFLOAD`` set the proxy is told to send the file instead.
+    """
+    fullpath = Path(safe_join(settings.MEDIA_ROOT, path))
+    if not fullpath.is_file():
+        raise Http404(f"{path} does not exist")
+    content_type = mimetypes.guess_type(fullpath.name)[0] or "application/octet-stream"
+
+    mode = getattr(settings, "MEDIA_OFFLOAD", None)
+    if mode:
+        return offload_response(mode, fullpath, path, content_type)
+
+    stat = fullpath.stat()
+    etag = strong_etag(stat)
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        try:
+            requested = byte_range(request.headers.get("Range"), stat.st_size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{stat.st_size}"
+            return response
+
+        if requested and range_applies(request, etag, last_modified):
+            start, end = requested
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                read_range(fullpath.open("rb"), start, length),
+                status=206,
+                content_type=content_type,
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            response["Content-Length"] = length
+        else:
+            response = FileResponse(fullpath.open("rb"), content_type=content_type)
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Accept-Ranges"] = "bytes"
+    patch_cache_control(
+        response, public=True, max_age=getattr(settings, "MEDIA_CACHE_MAX_AGE", 3600)
+    )
+    return response
@@ -0,0 +1,197 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from core import pagecache
+
+logger = logging.getLogger(__name__)
+
+# Placeholder lists of different lengths are the same query shape.
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+# ======================================================== #
+# Query counting                                           #
+# ======================================================== #
+def query_shape(sql):
+    """Normalise ``sql`` so queries differing only in parameters compare equal."""
+    sql = _PLACEHOLDER_LIST.sub("(%s, ...)", sql)
+    sql = _NUMBER.sub("N", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+class QueryStats:
+    """Queries run while handling one request.
+
+    ``duplicates`` maps every query shape run at least
+    ``duplicate_threshold`` times to its count; a shape repeated once per
+    row of a listing is the usual sign of an N+1 lookup.
+    """
+
+    def __init__(self, view_name=None, budget=None, duplicate_threshold=3):
+        self.view_name = view_name
+        self.budget = budget
+        self.duplicate_threshold = duplicate_threshold
+        self.shapes = Counter()
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.shapes[query_shape(sql)] += 1
+
+    @property
+    def duplicates(self):
+        return {
+            shape: count
+            for shape, count in self.shapes.most_common()
+            if count >= self.duplicate_threshold
+        }
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+    def __str__(self):
+        budget = "-" if self.budget is None else self.budget
+        return (
+            f"{self.view_name}: {self.count} queries in {self.duration * 1000:.1f}ms "
+            f"(budget {budget}, {len(self.duplicates)} repeated)"
+        )
+
+
+def get_query_budget(resolver_match):
+    """Return the ``query_budget`` declared on the class-based view, if any."""
+    if resolver_match is None:
+        return None
+    view_class = getattr(resolver_match.func, "view_class", None)
+    return getattr(view_class, "query_budget", None)
+
+
+class QueryCountMiddleware:
+    """Count the database queries of every request, keyed by URL name.
+
+    Enabled by ``QUERY_COUNT_ENABLED``. The stats are attached to the
+    request and response as ``query_stats``, sent back in ``X-Query-*``
+    headers when ``QUERY_COUNT_HEADERS`` is set and logged through
+    ``core.middleware``; repeated query shapes and exceeded budgets are
+    logged as warnings.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "QUERY_COUNT_ENABLED", False):
+            return self.get_response(request)
+
+        stats = QueryStats(
+            duplicate_threshold=getattr(settings, "QUERY_COUNT_DUPLICATE_THRESHOLD", 3)
+        )
+        request.query_stats = stats
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(stats))
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        stats.view_name = match.view_name if match else request.path
+        stats.budget = get_query_budget(match)
+        response.query_stats = stats
+        self.report(stats, response)
+        return response
+
+    def report(self, stats, response):
+        if getattr(settings, "QUERY_COUNT_HEADERS", False):
+            response["X-Query-Count"] = stats.count
+            response["X-Query-Duration"] = f"{stats.duration * 1000:.1f}ms"
+            response["X-Query-Duplicates"] = len(stats.duplicates)
+            if stats.budget is not None:
+                response["X-Query-Budget"] = stats.budget
+
+        if stats.over_budget or stats.duplicates:
+            logger.warning(str(stats))
+            for shape, count in stats.duplicates.items():
+                logger.warning("  %dx %s", count, shape)
+        else:
+            logger.debug(str(stats))
+
+
+# ======================================================== #
+# Page cache                                               #
+# ======================================================== #
+class PageCacheMiddleware:
+    """Serve whole pages to anonymous visitors from the cache.
+
+    Views opt in with a ``page_cache_timeout`` (seconds). Pages are keyed
+    by ``pagecache.cache_key`` under the current catalogue version, so
+    bumping the version (see ``core.signals``) retires them all at once.
+    The visitor-specific parts are kept out of the cached copy: the CSRF
+    token is rendered as a placeholder and filled in per response, and
+    requests with pending messages are neither served nor stored.
+    Must come after the session, auth and CSRF middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        entry = getattr(request, "page_cache_entry", None)
+        if entry is None or response.streaming:
+            return response
+        cache, key, timeout = entry
+        if response.status_code == 200 and not response.cookies:
+            cache.set(key, (response.content, response["Content-Type"]), timeout)
+            response["X-Page-Cache"] = "miss"
+        response.content = self.fill(request, response.content)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "view_class", None)
+        timeout = getattr(view_class, "page_cache_timeout", None)
+        if (
+            not timeout
+            or not getattr(settings, "PAGE_CACHE_ENABLED", True)
+            or not pagecache.is_cacheable(request)
+        ):
+            return None
+
+        cache = pagecache.get_cache()
+        key = pagecache.cache_key(request, pagecache.get_version(cache))
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(
+                self.fill(request, content), content_type=content_type
+            )
+            response["X-Page-Cache"] = "hit"
+            return response
+
+        # Let the handler run the view as usual (exception middleware,
+        # ATOMIC_REQUESTS, template response rendering); the rendered page
+        # is stored on the way out.
+        request.page_cache_placeholder = True
+        request.page_cache_entry = (cache, key, timeout)
+        return None
+
+    @staticmethod
+    def fill(request, content):
+        placeholder = pagecache.CSRF_PLACEHOLDER.encode()
+        if placeholder not in content:
+            return content
+        return content.replace(placeholder, get_token(request).encode())
@@ -0,0 +1,42 @@
+# Generated by Django 4.1 on 2026-10-18 19:33
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+
+
+def populate_cart_totals(apps, schema_editor):
+    Cart = apps.get_model("core", "Cart")
+    item_filter = Q(cartitem__status=True)
+    carts = Cart.objects.annotate(
+        calculated_subtotal=Sum(
+            F("cartitem__quantity") * F("cartitem__product__price"),
+            filter=item_filter,
+            output_field=models.FloatField(),
+        ),
+        calculated_item_count=Count("cartitem", filter=item_filter),
+    )
+    for cart in carts.iterator():
+        cart.subtotal = cart.calculated_subtotal or 0
+        cart.item_count = cart.calculated_item_count
+        cart.save(update_fields=["subtotal", "item_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_wishlistmodel_user_alter_wishlistmodel_description_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="item_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="cart",
+            name="subtotal",
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(populate_cart_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.1 on 2026-10-18 19:34
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, Q
+
+
+def populate_rating_stats(apps, schema_editor):
+    ProductModel = apps.get_model("core", "ProductModel")
+    star_filters = {
+        1: Q(reviewmodel__rating__lt=1.5),
+        2: Q(reviewmodel__rating__gte=1.5, reviewmodel__rating__lt=2.5),
+        3: Q(reviewmodel__rating__gte=2.5, reviewmodel__rating__lt=3.5),
+        4: Q(reviewmodel__rating__gte=3.5, reviewmodel__rating__lt=4.5),
+        5: Q(reviewmodel__rating__gte=4.5),
+    }
+    products = ProductModel.objects.annotate(
+        calculated_rating_avg=Avg("reviewmodel__rating"),
+        calculated_rating_count=Count("reviewmodel"),
+        **{
+            f"calculated_rating_{star}_count": Count("reviewmodel", filter=star_filter)
+            for star, star_filter in star_filters.items()
+        },
+    ).filter(calculated_rating_count__gt=0)
+    fields = ["rating_avg", "rating_count"] + [
+        f"rating_{star}_count" for star in star_filters
+    ]
+    for product in products.iterator():
+        for field in fields:
+            setattr(product, field, getattr(product, f"calculated_{field}"))
+        product.save(update_fields=fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_cart_subtotal_item_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productmodel",
+            name="rating_1_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="productmodel",
+            name="rating_2_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="productmodel",
+            name="rating_3_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="productmodel",
+            name="rating_4_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="productmodel",
+            name="rating_5_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="productmodel",
+            name="rating_avg",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name="productmodel",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_rating_stats, migrations.RunPython.noop),
+    ]
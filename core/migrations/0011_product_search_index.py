@@ -0,0 +1,36 @@
+from django.db import migrations
+
+SEARCH_TABLE = "core_product_search"
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+        f"USING fts5(name, description, category, tokenize='porter unicode61')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {SEARCH_TABLE}(rowid, name, description, category) "
+        f"SELECT p.id, p.name, p.description, COALESCE(c.name, '') "
+        f"FROM core_productmodel p "
+        f"LEFT JOIN core_categorymodel c ON c.id = p.category_id "
+        f"WHERE p.status"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_productmodel_rating_stats"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.1 on 2026-10-18 19:37
+
+from django.db import migrations, models
+
+PATH_STEP = 8
+
+
+def populate_category_paths(apps, schema_editor):
+    CategoryModel = apps.get_model("core", "CategoryModel")
+    parents = dict(CategoryModel.objects.values_list("id", "parent_id"))
+    paths = {}
+
+    def build_path(category_id, seen=()):
+        if category_id not in paths:
+            parent_id = parents.get(category_id)
+            parent_path = ""
+            # Break parent cycles by treating the repeated category as a root.
+            if parent_id in parents and parent_id not in seen:
+                parent_path = build_path(parent_id, seen + (category_id,))
+            paths[category_id] = f"{parent_path}{category_id:0{PATH_STEP}d}/"
+        return paths[category_id]
+
+    for category_id in parents:
+        CategoryModel.objects.filter(pk=category_id).update(
+            path=build_path(category_id)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_product_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="categorymodel",
+            name="path",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=255
+            ),
+        ),
+        migrations.RunPython(populate_category_paths, migrations.RunPython.noop),
+    ]
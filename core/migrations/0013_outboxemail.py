@@ -0,0 +1,72 @@
+# Generated by Django 4.1 on 2026-10-18 19:41
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_categorymodel_path"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxEmail",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("status", models.BooleanField(default=True)),
+                ("created_on", models.DateTimeField(auto_now_add=True)),
+                ("updated_on", models.DateTimeField(auto_now=True)),
+                ("subject", models.CharField(max_length=255)),
+                ("body", models.TextField()),
+                ("html_body", models.TextField(blank=True, default="")),
+                (
+                    "from_email",
+                    models.CharField(blank=True, default="", max_length=255),
+                ),
+                (
+                    "recipients",
+                    models.TextField(help_text="Comma separated addresses."),
+                ),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("sending", "Sending"),
+                            ("sent", "Sent"),
+                            ("dead", "Dead"),
+                        ],
+                        default="pending",
+                        max_length=16,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                (
+                    "next_attempt_on",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("sent_on", models.DateTimeField(blank=True, null=True)),
+                ("last_error", models.TextField(blank=True, default="")),
+                (
+                    "claim_token",
+                    models.UUIDField(blank=True, editable=False, null=True),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="outboxemail",
+            index=models.Index(
+                fields=["state", "next_attempt_on"], name="core_outbox_state_8666da_idx"
+            ),
+        ),
+    ]
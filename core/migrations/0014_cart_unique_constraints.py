@@ -0,0 +1,62 @@
+# Generated by Django 4.1 on 2026-10-18 19:42
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    Cart = apps.get_model("core", "Cart")
+    CartItem = apps.get_model("core", "CartItem")
+
+    # Keep the oldest open cart of each user; retire the others.
+    open_carts = Cart.objects.filter(status=True, checked_out=False)
+    for row in (
+        open_carts.values("user")
+        .annotate(keep=Min("id"), n=Count("id"))
+        .filter(n__gt=1)
+    ):
+        open_carts.filter(user=row["user"]).exclude(id=row["keep"]).update(status=False)
+
+    # Fold repeated items of the same product into one row.
+    merged_carts = set()
+    for row in (
+        CartItem.objects.values("cart", "product", "status")
+        .annotate(keep=Min("id"), quantity=Sum("quantity"), n=Count("id"))
+        .filter(n__gt=1)
+    ):
+        duplicates = CartItem.objects.filter(
+            cart=row["cart"], product=row["product"], status=row["status"]
+        )
+        duplicates.filter(id=row["keep"]).update(quantity=row["quantity"])
+        duplicates.exclude(id=row["keep"]).delete()
+        merged_carts.add(row["cart"])
+
+    for cart_id in merged_carts:
+        Cart.objects.filter(id=cart_id).update(
+            item_count=CartItem.objects.filter(cart=cart_id, status=True).count()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_outboxemail"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="cart",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("checked_out", False), ("status", True)),
+                fields=("user",),
+                name="unique_open_cart_per_user",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="cartitem",
+            constraint=models.UniqueConstraint(
+                fields=("cart", "product", "status"), name="unique_cart_product_status"
+            ),
+        ),
+    ]
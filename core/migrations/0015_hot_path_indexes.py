@@ -0,0 +1,53 @@
+# Generated by Django 4.1 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0014_cart_unique_constraints"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("completed", False)),
+                fields=["cart", "-id"],
+                name="order_open_cart_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productmodel",
+            index=models.Index(
+                condition=models.Q(("status", True)),
+                fields=["-created_on", "-id"],
+                name="product_active_newest_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productmodel",
+            index=models.Index(
+                condition=models.Q(("status", True)),
+                fields=["price", "id"],
+                name="product_active_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productmodel",
+            index=models.Index(
+                condition=models.Q(("status", True)),
+                fields=["-rating_avg", "-id"],
+                name="product_active_rating_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productmodel",
+            index=models.Index(
+                condition=models.Q(("status", True)),
+                fields=["category", "-created_on", "-id"],
+                name="product_active_category_idx",
+            ),
+        ),
+    ]
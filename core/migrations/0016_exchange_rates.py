@@ -0,0 +1,40 @@
+# Generated by Django 4.1 on 2026-10-18 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_hot_path_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExchangeRate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("status", models.BooleanField(default=True)),
+                ("created_on", models.DateTimeField(auto_now_add=True)),
+                ("updated_on", models.DateTimeField(auto_now=True)),
+                ("currency", models.CharField(max_length=24)),
+                ("rate", models.FloatField()),
+                ("effective_from", models.DateTimeField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="exchangerate",
+            constraint=models.UniqueConstraint(
+                fields=("currency", "effective_from"),
+                name="unique_exchange_rate_per_date",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.1 on 2026-10-18 20:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0016_exchange_rates"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="address",
+            name="fingerprint",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=64
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="address",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("fingerprint", ""), _negated=True),
+                fields=("fingerprint",),
+                name="unique_address_fingerprint",
+            ),
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 4.1 on 2026-10-18 20:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 500
+
+
+def snapshot_existing_orders(apps, schema_editor):
+    """Give existing orders the lines they have been showing, from their carts.
+
+    Earlier orders only had their cart, so this snapshots its active items
+    at today's prices, which is what order pages displayed until now.
+    """
+    Order = apps.get_model("core", "Order")
+    OrderLine = apps.get_model("core", "OrderLine")
+    CartItem = apps.get_model("core", "CartItem")
+    items_by_cart = {}
+    for item in (
+        CartItem.objects.filter(status=True).select_related("product").order_by("pk")
+    ):
+        items_by_cart.setdefault(item.cart_id, []).append(item)
+
+    orders, lines = [], []
+    for order in Order.objects.order_by("pk").iterator(chunk_size=BATCH_SIZE):
+        items = items_by_cart.get(order.cart_id, [])
+        for item in items:
+            price = item.product.price
+            lines.append(
+                OrderLine(
+                    order=order,
+                    product=item.product,
+                    quantity=item.quantity,
+                    unit_price=price,
+                    line_total=round(price * item.quantity, 2),
+                )
+            )
+        order.subtotal = round(
+            sum(item.product.price * item.quantity for item in items), 2
+        )
+        order.item_count = len(items)
+        orders.append(order)
+    Order.objects.bulk_update(orders, ["subtotal", "item_count"], batch_size=BATCH_SIZE)
+    OrderLine.objects.bulk_create(lines, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0017_address_fingerprint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="item_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="subtotal",
+            field=models.FloatField(default=0),
+        ),
+        migrations.CreateModel(
+            name="OrderLine",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("status", models.BooleanField(default=True)),
+                ("created_on", models.DateTimeField(auto_now_add=True)),
+                ("updated_on", models.DateTimeField(auto_now=True)),
+                ("quantity", models.PositiveIntegerField()),
+                ("unit_price", models.FloatField()),
+                ("line_total", models.FloatField()),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lines",
+                        to="core.order",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="core.productmodel",
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.RunPython(snapshot_existing_orders, migrations.RunPython.noop),
+    ]
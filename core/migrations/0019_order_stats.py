@@ -0,0 +1,83 @@
+# Generated by Django 4.1 on 2026-10-18 20:25
+
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+BASE_CURRENCY = "INR"
+
+
+def populate_order_stats(apps, schema_editor):
+    User = apps.get_model("core", "User")
+    Order = apps.get_model("core", "Order")
+    Payment = apps.get_model("core", "Payment")
+    ExchangeRate = apps.get_model("core", "ExchangeRate")
+
+    rates = defaultdict(list)
+    for row in ExchangeRate.objects.filter(status=True).order_by("effective_from"):
+        rates[row.currency].append((row.effective_from, row.rate))
+
+    def base_amount(amount, currency, at):
+        # Orders without a rate in effect were charged in the base currency.
+        effective = rates.get(currency, [])
+        index = bisect_right([date for date, _ in effective], at) - 1
+        if currency == BASE_CURRENCY or index < 0:
+            return amount
+        return amount / effective[index][1]
+
+    stats = defaultdict(
+        lambda: {"order_count": 0, "lifetime_spend": 0.0, "last_order_on": None}
+    )
+    orders = Order.objects.order_by().values("cart__user_id")
+    for row in orders.annotate(count=Count("pk"), last=Max("created_on")):
+        stats[row["cart__user_id"]].update(
+            order_count=row["count"], last_order_on=row["last"]
+        )
+    paid = Payment.objects.filter(status="completed").values_list(
+        "order__cart__user_id", "order__amount", "order__currency", "order__created_on"
+    )
+    for user_id, amount, currency, placed_on in paid.iterator():
+        stats[user_id]["lifetime_spend"] += base_amount(amount, currency, placed_on)
+    for user_id, values in stats.items():
+        values["lifetime_spend"] = round(values["lifetime_spend"], 2)
+        User.objects.filter(pk=user_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0018_order_lines"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="last_order_on",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="lifetime_spend",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="order_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["cart", "-created_on", "-id"], name="order_cart_recent_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["order", "-created_on", "-id"], name="payment_order_recent_idx"
+            ),
+        ),
+        migrations.RunPython(populate_order_stats, migrations.RunPython.noop),
+    ]
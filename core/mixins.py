@@ -0,0 +1,80 @@
+from urllib.parse import urlencode
+
+from core.pagination import InvalidCursor, KeysetPaginator
+
+
+# ================================================ #
+# Product listing mixins                           #
+# ================================================ #
+class ProductSortMixin:
+    """Sort and filter a product ``ListView`` from query string parameters.
+
+    ``?sort=`` picks one of ``sort_orders`` and ``?min_rating=`` keeps
+    products rated at least that much. Both read the rating statistics
+    stored on ``ProductModel``, so no aggregate queries are needed.
+    """
+
+    sort_orders = {
+        "newest": ("-created_on", "-id"),
+        "price": ("price", "id"),
+        "rating": ("-rating_avg", "-id"),
+    }
+    default_sort = "newest"
+
+    def get_sort(self):
+        sort = self.request.GET.get("sort", self.default_sort)
+        if sort not in self.sort_orders:
+            sort = self.default_sort
+        return sort
+
+    def get_min_rating(self):
+        try:
+            return float(self.request.GET.get("min_rating", ""))
+        except ValueError:
+            return None
+
+    def get_ordering(self):
+        return self.sort_orders[self.get_sort()]
+
+    def get_queryset(self):
+        # Only active products are listed, like search; the partial
+        # product indexes cover exactly these rows.
+        qs = super().get_queryset().filter(status=True).select_related("unit")
+        min_rating = self.get_min_rating()
+        if min_rating is not None:
+            qs = qs.filter(rating_avg__gte=min_rating)
+        return qs
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["sort"] = self.get_sort()
+        context["sort_choices"] = list(self.sort_orders)
+        context["min_rating"] = self.get_min_rating()
+        params = {"sort": context["sort"]}
+        if context["min_rating"] is not None:
+            params["min_rating"] = context["min_rating"]
+        context["sort_query"] = urlencode(params)
+        return context
+
+
+class KeysetPaginationMixin:
+    """Paginate a ``ListView`` with ``?cursor=`` tokens instead of ``?page=``.
+
+    The view's ``get_ordering()`` must end in a unique field. The total
+    count is only computed when ``paginate_count`` is set.
+    """
+
+    paginator_class = KeysetPaginator
+    paginate_count = False
+    cursor_kwarg = "cursor"
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.paginator_class(
+            queryset, page_size, self.get_ordering(), count=self.paginate_count
+        )
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        try:
+            page = paginator.page(cursor)
+        except InvalidCursor:
+            page = paginator.page()
+        return (paginator, page, page.object_list, page.has_other_pages())
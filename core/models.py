@@ -1,12 +1,25 @@
+import hashlib
+import math
+
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
-from django.db.models import Sum, F, Q, Avg
+from django.utils import timezone
+from django.db.models import Sum, F, Q, Avg, Count, Case, When, Value
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce, Concat, Substr
 
 
 class User(AbstractUser):
-    pass
+    # Order statistics, kept in step with orders and payments by
+    # ``core.customers`` and rebuilt by ``manage.py rebuild_order_stats``.
+    order_count = models.PositiveIntegerField(default=0)
+    # Paid for completed payments, in the base currency.
+    lifetime_spend = models.FloatField(default=0)
+    last_order_on = models.DateTimeField(null=True, blank=True)
+
+    ORDER_STATS_FIELDS = ("order_count", "lifetime_spend", "last_order_on")
 
 
 # ======================================================== #
@@ -48,10 +61,82 @@ class Address(TimeStamp, models.Model):
     location = models.ForeignKey(
         "Location", on_delete=models.SET_NULL, null=True, blank=True
     )
+    # Hash of the normalized address, shared by identical addresses so they
+    # can reuse one row. Maintained by ``save``; rows saved before it existed
+    # keep "" until ``manage.py deduplicate_addresses`` fingerprints them.
+    fingerprint = models.CharField(
+        max_length=64, db_index=True, editable=False, default=""
+    )
+
+    ADDRESS_FIELDS = (
+        "building_name",
+        "place",
+        "street",
+        "city",
+        "district",
+        "state",
+        "country",
+        "post_office",
+        "post_code",
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["fingerprint"],
+                condition=~Q(fingerprint=""),
+                name="unique_address_fingerprint",
+            )
+        ]
 
     def __str__(self):
         return f"{self.building_name}\n{self.place}\n{self.district}\n{self.state} - {self.post_code}"
 
+    @staticmethod
+    def normalize(value):
+        """Collapse runs of whitespace and trim, as addresses are stored."""
+        return " ".join(str(value).split())
+
+    @classmethod
+    def compute_fingerprint(cls, location_id=None, **fields):
+        """Case-insensitive hash of the normalized ``ADDRESS_FIELDS`` and location."""
+        parts = [
+            cls.normalize(fields.get(name, "")).casefold()
+            for name in cls.ADDRESS_FIELDS
+        ]
+        parts.append(str(location_id or ""))
+        return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+    def get_fingerprint(self):
+        fields = {name: getattr(self, name) for name in self.ADDRESS_FIELDS}
+        return self.compute_fingerprint(location_id=self.location_id, **fields)
+
+    def save(self, *args, **kwargs):
+        for name in self.ADDRESS_FIELDS:
+            setattr(self, name, self.normalize(getattr(self, name)))
+        self.fingerprint = self.get_fingerprint()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "fingerprint"}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def get_or_create_by_fingerprint(cls, location=None, **fields):
+        """The stored address equal to ``fields``, inserting it only when new.
+
+        Addresses are shared between profiles and orders this way, so they
+        must not be edited in place; save the new values under their own
+        row instead. The fingerprint is unique, so when two requests insert
+        the same new address at once, the loser's INSERT fails and
+        ``get_or_create`` returns the winner's row.
+        """
+        location_id = location.pk if location else None
+        fingerprint = cls.compute_fingerprint(location_id=location_id, **fields)
+        address, _ = cls.objects.get_or_create(
+            fingerprint=fingerprint, defaults=dict(fields, location_id=location_id)
+        )
+        return address
+
     @staticmethod
     def get_obj_for_profile(request, **kwargs):
         user = request.user
@@ -79,6 +164,47 @@ class FeedbackReply(TimeStamp, models.Model):
         return f"{self.feedback.subject}"
 
 
+class OutboxEmail(TimeStamp, models.Model):
+    """An email waiting to be delivered by ``manage.py send_queued_mail``."""
+
+    class StateChoices:
+        pending = "pending"
+        sending = "sending"
+        sent = "sent"
+        dead = "dead"
+
+    STATE_CHOICES = (
+        (StateChoices.pending, "Pending"),
+        (StateChoices.sending, "Sending"),
+        (StateChoices.sent, "Sent"),
+        (StateChoices.dead, "Dead"),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True, default="")
+    from_email = models.CharField(max_length=255, blank=True, default="")
+    recipients = models.TextField(help_text="Comma separated addresses.")
+    state = models.CharField(
+        max_length=16, choices=STATE_CHOICES, default=StateChoices.pending
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_on = models.DateTimeField(default=timezone.now)
+    sent_on = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    # Set by ``claim_batch`` so a worker only sends the rows it claimed.
+    claim_token = models.UUIDField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [models.Index(fields=["state", "next_attempt_on"])]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipients} ({self.state})"
+
+    def get_recipients(self):
+        return [address for address in self.recipients.split(",") if address]
+
+
 # ======================================================== #
 # User Related Models                                      #
 # ======================================================== #
@@ -141,6 +267,11 @@ class CategoryModel(TimeStamp, models.Model):
     )
     parent = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, blank=True)
     user = models.ForeignKey(USER, on_delete=models.CASCADE)
+    # Materialized path of zero padded ids from the root down to this
+    # category, e.g. "00000001/00000004/". Maintained by ``save``.
+    path = models.CharField(max_length=255, db_index=True, editable=False, default="")
+
+    PATH_STEP = 8
 
     def __str__(self) -> str:
         return self.name
@@ -148,6 +279,72 @@ class CategoryModel(TimeStamp, models.Model):
     def get_absolute_url(self):
         return reverse("product:category_detail", kwargs={"pk": self.pk})
 
+    @property
+    def depth(self):
+        return len(self.path) // (self.PATH_STEP + 1) - 1
+
+    @property
+    def ancestor_ids(self):
+        return [int(part) for part in self.path.split("/") if part]
+
+    def get_ancestors(self, include_self=True):
+        """Ancestors from the root down, fetched in a single query."""
+        ids = self.ancestor_ids
+        if not include_self:
+            ids = ids[:-1]
+        return CategoryModel.objects.filter(pk__in=ids).order_by("path")
+
+    @staticmethod
+    def subtree_filter(path, prefix=""):
+        """Q matching a category and all its descendants as an index range scan.
+
+        Every path in the subtree starts with ``path``, which ends in "/";
+        "0" is the character right after "/", so swapping it in gives an
+        exclusive upper bound.
+        """
+        return Q(
+            **{
+                f"{prefix}path__gte": path,
+                f"{prefix}path__lt": path[:-1] + "0",
+            }
+        )
+
+    def get_descendants(self, include_self=True):
+        qs = CategoryModel.objects.filter(self.subtree_filter(self.path))
+        if not include_self:
+            qs = qs.exclude(pk=self.pk)
+        return qs.order_by("path")
+
+    def get_parent_path(self):
+        if not self.parent_id:
+            return ""
+        return (
+            CategoryModel.objects.filter(pk=self.parent_id)
+            .values_list("path", flat=True)
+            .get()
+        )
+
+    def save(self, *args, **kwargs):
+        parent_path = self.get_parent_path()
+        if self.path and parent_path.startswith(self.path):
+            raise ValueError(f"{self} cannot be moved below itself.")
+        super().save(*args, **kwargs)
+        path = f"{parent_path}{self.pk:0{self.PATH_STEP}d}/"
+        if path == self.path:
+            return
+        if self.path:
+            CategoryModel.move_subtree(self.path, path)
+        else:
+            CategoryModel.objects.filter(pk=self.pk).update(path=path)
+        self.path = path
+
+    @staticmethod
+    def move_subtree(old_path, new_path):
+        """Re-prefix every descendant of ``old_path`` in a single UPDATE."""
+        CategoryModel.objects.filter(CategoryModel.subtree_filter(old_path)).update(
+            path=Concat(Value(new_path), Substr("path", len(old_path) + 1))
+        )
+
 
 class UnitModel(TimeStamp, models.Model):
     name = models.CharField(max_length=16)
@@ -177,25 +374,147 @@ class ProductModel(TimeStamp, models.Model):
         UnitModel, on_delete=models.SET_NULL, null=True, blank=True
     )
     user = models.ForeignKey(USER, on_delete=models.CASCADE)
+    # Review statistics, kept in step with ReviewModel by
+    # ``update_rating_stats`` and rebuilt by ``manage.py rebuild_product_ratings``.
+    rating_avg = models.FloatField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
 
     # products = ProductManager()
 
+    class Meta:
+        # Partial indexes over active products, one per listing sort of
+        # ``ProductSortMixin`` plus newest-first within a category.
+        indexes = [
+            models.Index(
+                fields=["-created_on", "-id"],
+                condition=Q(status=True),
+                name="product_active_newest_idx",
+            ),
+            models.Index(
+                fields=["price", "id"],
+                condition=Q(status=True),
+                name="product_active_price_idx",
+            ),
+            models.Index(
+                fields=["-rating_avg", "-id"],
+                condition=Q(status=True),
+                name="product_active_rating_idx",
+            ),
+            models.Index(
+                fields=["category", "-created_on", "-id"],
+                condition=Q(status=True),
+                name="product_active_category_idx",
+            ),
+        ]
+
+    STARS = (1, 2, 3, 4, 5)
+    RATING_FIELDS = [
+        "rating_avg",
+        "rating_count",
+        *(f"rating_{star}_count" for star in STARS),
+    ]
+
     def __str__(self) -> str:
         return f"{self.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded price so saves only refresh the totals of
+        # carts holding the product when it changed.
+        instance._loaded_price = instance.__dict__.get("price")
+        return instance
+
     def get_absolute_url(self):
         return reverse("product:product_detail", kwargs={"pk": self.pk})
 
     def get_review(self):
-        reviews = (
-            self.reviewmodel_set.annotate(
-                product_review=F("rating")
-            )
-            .aggregate(Avg("product_review"))
-            .get("product_review__avg")
+        if not self.rating_count:
+            return None
+        return self.rating_avg
+
+    @property
+    def rating_histogram(self):
+        return [(star, getattr(self, f"rating_{star}_count")) for star in self.STARS]
+
+    @staticmethod
+    def rating_star(rating):
+        """Histogram bucket of a rating: rounded half up and clamped to 1-5."""
+        return min(max(math.floor(rating + 0.5), 1), 5)
+
+    def update_rating_stats(self, added=None, removed=None):
+        """Apply one added and/or removed rating to the stored statistics.
+
+        Runs as a single UPDATE so concurrent reviews cannot overwrite each
+        other's changes.
+        """
+        count_change = (added is not None) - (removed is not None)
+        sum_change = (added or 0) - (removed or 0)
+
+        star_changes = {}
+        if added is not None:
+            star = f"rating_{self.rating_star(added)}_count"
+            star_changes[star] = star_changes.get(star, 0) + 1
+        if removed is not None:
+            star = f"rating_{self.rating_star(removed)}_count"
+            star_changes[star] = star_changes.get(star, 0) - 1
+
+        updates = {
+            field: F(field) + change for field, change in star_changes.items() if change
+        }
+        updates["rating_count"] = F("rating_count") + count_change
+        updates["rating_avg"] = Case(
+            When(rating_count__lte=-count_change, then=Value(0.0)),
+            default=(F("rating_avg") * F("rating_count") + sum_change)
+            / (F("rating_count") + count_change),
+            output_field=models.FloatField(),
         )
+        ProductModel.objects.filter(pk=self.pk).update(**updates)
+
+    def refresh_rating_stats(self):
+        """Recompute the stored statistics from the product's reviews."""
+        product = ProductModel.with_calculated_ratings(
+            ProductModel.objects.filter(pk=self.pk)
+        ).first()
+        if product is None:
+            return
+        product.copy_calculated_ratings()
+        product.save(update_fields=ProductModel.RATING_FIELDS)
+
+    def copy_calculated_ratings(self):
+        """Move ``with_calculated_ratings`` annotations onto the stored fields."""
+        for field in ProductModel.RATING_FIELDS:
+            setattr(self, field, getattr(self, f"calculated_{field}"))
 
-        return reviews
+    @staticmethod
+    def with_calculated_ratings(queryset=None):
+        """Annotate products with rating statistics computed from their reviews."""
+        if queryset is None:
+            queryset = ProductModel.objects.all()
+        star_filters = {
+            1: Q(reviewmodel__rating__lt=1.5),
+            2: Q(reviewmodel__rating__gte=1.5, reviewmodel__rating__lt=2.5),
+            3: Q(reviewmodel__rating__gte=2.5, reviewmodel__rating__lt=3.5),
+            4: Q(reviewmodel__rating__gte=3.5, reviewmodel__rating__lt=4.5),
+            5: Q(reviewmodel__rating__gte=4.5),
+        }
+        return queryset.annotate(
+            calculated_rating_avg=Coalesce(
+                Avg("reviewmodel__rating"), 0, output_field=models.FloatField()
+            ),
+            calculated_rating_count=Count("reviewmodel"),
+            **{
+                f"calculated_rating_{star}_count": Count(
+                    "reviewmodel", filter=star_filter
+                )
+                for star, star_filter in star_filters.items()
+            },
+        )
 
 
 class ReviewModel(TimeStamp, models.Model):
@@ -210,6 +529,17 @@ class ReviewModel(TimeStamp, models.Model):
     def get_absolute_url(self):
         return reverse("product:review_detail", kwargs={"pk": self.pk})
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so saves can update the product's
+        # rating statistics by difference.
+        instance._loaded_rating = (
+            instance.__dict__.get("product_id"),
+            instance.__dict__.get("rating"),
+        )
+        return instance
+
 
 class WishlistModel(TimeStamp, models.Model):
     name = models.CharField(max_length=120)
@@ -228,27 +558,86 @@ class Cart(TimeStamp, models.Model):
     user = models.ForeignKey(USER, on_delete=models.CASCADE)
     empty = models.BooleanField(default=True)
     checked_out = models.BooleanField(default=False)
+    # Denormalized totals of open carts, kept in step with the cart items
+    # and prices by ``refresh_totals`` (see ``core.signals``) and rebuilt by
+    # ``manage.py rebuild_cart_totals``.
+    subtotal = models.FloatField(default=0)
+    item_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user"],
+                condition=Q(status=True, checked_out=False),
+                name="unique_open_cart_per_user",
+            )
+        ]
 
     def __str__(self):
         return f"{self.user}"
 
     def total(self):
-        price = (
-            (
-                CartItem.objects.filter(cart=self, status=True).annotate(
-                    item_price=F("quantity") * F("product__price")
-                )
+        return self.subtotal
+
+    @staticmethod
+    def refresh_totals(carts, **fields):
+        """Recompute the stored totals of the ``carts`` queryset in a single UPDATE.
+
+        The totals are summed from the active items at the current product
+        prices, so they stay right whatever happened to the items or prices
+        in between. ``fields`` are updated along with them.
+        """
+        items = CartItem.objects.filter(cart=OuterRef("pk"), status=True).order_by()
+        items = items.values("cart")
+        subtotal = items.annotate(
+            total=Sum(
+                F("quantity") * F("product__price"), output_field=models.FloatField()
             )
-            .aggregate(Sum("item_price"))
-            .get("item_price__sum")
+        ).values("total")
+        item_count = items.annotate(count=Count("pk")).values("count")
+        return carts.update(
+            subtotal=Coalesce(Subquery(subtotal), Value(0.0)),
+            item_count=Coalesce(Subquery(item_count), 0),
+            **fields,
         )
 
-        return price
+    @staticmethod
+    def with_calculated_totals(queryset=None):
+        """Annotate carts with totals computed from their active items."""
+        if queryset is None:
+            queryset = Cart.objects.all()
+        item_filter = Q(cartitem__status=True)
+        return queryset.annotate(
+            calculated_subtotal=Coalesce(
+                Sum(
+                    F("cartitem__quantity") * F("cartitem__product__price"),
+                    filter=item_filter,
+                ),
+                0,
+                output_field=models.FloatField(),
+            ),
+            calculated_item_count=Count("cartitem", filter=item_filter),
+        )
 
     def items(self):
-        cart_items = CartItem.objects.filter(cart__user=self.user, status=True)
+        """Active items of this cart, from ``prefetch_items`` when prefetched."""
+        if hasattr(self, "active_items"):
+            return self.active_items
+        cart_items = self.cartitem_set.filter(status=True).select_related("product")
         return cart_items
 
+    @staticmethod
+    def prefetch_items(lookup="cartitem_set"):
+        """Prefetch active items and their products into ``active_items``.
+
+        ``lookup`` is the path to the cart items from the queried model.
+        """
+        return models.Prefetch(
+            lookup,
+            queryset=CartItem.objects.filter(status=True).select_related("product"),
+            to_attr="active_items",
+        )
+
     @staticmethod
     def get_cart(request, **kwargs):
         user = request.user
@@ -266,6 +655,14 @@ class CartItem(TimeStamp, models.Model):
     product = models.ForeignKey(ProductModel, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cart", "product", "status"],
+                name="unique_cart_product_status",
+            )
+        ]
+
     def __str__(self):
         return f"{self.product} ({self.quantity})"
 
@@ -300,6 +697,9 @@ class Order(TimeStamp, models.Model):
     )
     delivery_charge = models.FloatField(default=0)
     completed = models.BooleanField(default=False)
+    # Totals of the ``OrderLine`` snapshot, in the order currency.
+    subtotal = models.FloatField(default=0)
+    item_count = models.PositiveIntegerField(default=0)
     billing_address = models.ForeignKey(
         Address,
         on_delete=models.SET_NULL,
@@ -315,14 +715,81 @@ class Order(TimeStamp, models.Model):
         related_name="checkout_shipping_address",
     )
 
+    class Meta:
+        indexes = [
+            # Latest open order of a cart (``PaymentView``).
+            models.Index(
+                fields=["cart", "-id"],
+                condition=Q(completed=False),
+                name="order_open_cart_idx",
+            ),
+            # Most recent orders of a cart (``DashboardView``).
+            models.Index(
+                fields=["cart", "-created_on", "-id"],
+                name="order_cart_recent_idx",
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"{self.id or self.cart} {'Completed' if self.completed else 'Not Completed'}"
 
     def total(self):
-        cart_total = self.cart.total
-        cost = cart_total + self.delivery_charge
+        cost = self.subtotal + self.delivery_charge
         return cost
 
+    @staticmethod
+    def prefetch_lines():
+        """Prefetch the order lines and their products into ``lines.all``."""
+        return models.Prefetch(
+            "lines", queryset=OrderLine.objects.select_related("product")
+        )
+
+    @classmethod
+    def create_from_cart(cls, cart, convert=None, **fields):
+        """Create an order with an ``OrderLine`` for each active item of ``cart``.
+
+        ``convert`` turns a list of base-currency prices into the order
+        currency in one pass, e.g. ``PriceConverter.convert_many``.
+        """
+        items = list(cart.items())
+        unit_prices = (convert or list)([item.product.price for item in items])
+        lines = [
+            OrderLine(
+                product=item.product,
+                quantity=item.quantity,
+                unit_price=unit_price,
+                line_total=round(unit_price * item.quantity, 2),
+            )
+            for item, unit_price in zip(items, unit_prices)
+        ]
+        with transaction.atomic():
+            order = cls.objects.create(
+                cart=cart,
+                subtotal=round(sum(line.line_total for line in lines), 2),
+                item_count=len(lines),
+                **fields,
+            )
+            for line in lines:
+                line.order = order
+            OrderLine.objects.bulk_create(lines)
+        return order
+
+
+class OrderLine(TimeStamp, models.Model):
+    """What was bought in an order, at the price paid, unaffected by later changes."""
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="lines")
+    product = models.ForeignKey(
+        ProductModel, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    quantity = models.PositiveIntegerField()
+    # In the order currency.
+    unit_price = models.FloatField()
+    line_total = models.FloatField()
+
+    def __str__(self):
+        return f"{self.product} ({self.quantity})"
+
 
 class Payment(TimeStamp, models.Model):
     class PaymentStatusChoices:
@@ -345,5 +812,47 @@ class Payment(TimeStamp, models.Model):
     )
     mode = models.CharField(max_length=50, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Most recent payments of an order (``DashboardView``).
+            models.Index(
+                fields=["order", "-created_on", "-id"],
+                name="payment_order_recent_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.id} - {self.status}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so saves can update the customer's
+        # lifetime spend by difference.
+        instance._loaded_payment = (
+            instance.__dict__.get("order_id"),
+            instance.__dict__.get("status"),
+        )
+        return instance
+
+
+# ======================================================== #
+# Currency Related Models                                  #
+# ======================================================== #
+class ExchangeRate(TimeStamp, models.Model):
+    """Units of ``currency`` per base currency unit, from ``effective_from`` on."""
+
+    currency = models.CharField(max_length=24)
+    rate = models.FloatField()
+    effective_from = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["currency", "effective_from"],
+                name="unique_exchange_rate_per_date",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.currency} {self.rate} from {self.effective_from:%Y-%m-%d}"
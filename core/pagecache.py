@@ -0,0 +1,51 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+
+VERSION_KEY = "pagecache:version"
+# Stands in for the CSRF token in cached pages; every response gets the
+# visitor's own token swapped in.
+CSRF_PLACEHOLDER = "__page_cache_csrf_token__"
+
+
+def get_cache():
+    return caches[getattr(settings, "PAGE_CACHE_ALIAS", "default")]
+
+
+def get_version(cache=None):
+    """Current catalogue version; bumped whenever catalogue data changes."""
+    cache = cache or get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_version():
+    """Invalidate every cached page by moving to a new version."""
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 2, None)
+
+
+def is_cacheable(request):
+    """Only anonymous GET/HEAD requests without pending messages are cached."""
+    return (
+        request.method in ("GET", "HEAD")
+        and not request.user.is_authenticated
+        and "messages" not in request.COOKIES
+        and "_messages" not in request.session
+    )
+
+
+def cache_key(request, version):
+    """Key on path, sorted query string and the visitor's currency."""
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    currency = request.session.get("currency") or ""
+    digest = hashlib.sha256(f"{request.path}?{query}|{currency}".encode()).hexdigest()
+    return f"pagecache:{version}:{digest}"
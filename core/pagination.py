@@ -0,0 +1,130 @@
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+CURSOR_SALT = "core.pagination.cursor"
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+    """One page of a ``KeysetPaginator``; the template-facing page object."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Cursor pagination on an ordering that ends in a unique field.
+
+    Instead of ``OFFSET`` every page seeks past the last row of the
+    previous one with ``WHERE (key, id) > (last_key, last_id)``, so deep
+    pages cost the same as the first. Cursors are signed and carry the
+    ordering they were made for; ordering fields must not be null.
+    """
+
+    def __init__(self, queryset, per_page, ordering, count=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.with_count = count
+
+    @staticmethod
+    def field_name(order):
+        return order.lstrip("-")
+
+    def encode_cursor(self, obj, direction):
+        model = self.queryset.model
+        values = [
+            model._meta.get_field(self.field_name(order)).value_to_string(obj)
+            for order in self.ordering
+        ]
+        payload = {"o": self.ordering, "v": values, "d": direction}
+        return signing.dumps(payload, salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            raise InvalidCursor(cursor)
+        if (
+            not isinstance(payload, dict)
+            or tuple(payload.get("o", ())) != self.ordering
+            or payload.get("d") not in ("next", "previous")
+            or len(payload.get("v", ())) != len(self.ordering)
+        ):
+            raise InvalidCursor(cursor)
+        model = self.queryset.model
+        try:
+            values = [
+                model._meta.get_field(self.field_name(order)).to_python(value)
+                for order, value in zip(self.ordering, payload["v"])
+            ]
+        except ValidationError:
+            raise InvalidCursor(cursor)
+        return values, payload["d"]
+
+    def seek_filter(self, values, reverse=False):
+        """Q selecting rows that sort after ``values`` (before, if ``reverse``)."""
+        seek = Q()
+        equal = Q()
+        for order, value in zip(self.ordering, values):
+            descending = order.startswith("-") != reverse
+            lookup = "lt" if descending else "gt"
+            name = self.field_name(order)
+            seek |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return seek
+
+    def page(self, cursor=None):
+        """Return the page after (or before) ``cursor``; ``None`` is the first page."""
+        if cursor:
+            values, direction = self.decode_cursor(cursor)
+        else:
+            values, direction = None, "next"
+        backwards = direction == "previous"
+
+        queryset = self.queryset
+        ordering = self.ordering
+        if backwards:
+            ordering = tuple(
+                self.field_name(order) if order.startswith("-") else f"-{order}"
+                for order in ordering
+            )
+        if values is not None:
+            queryset = queryset.filter(self.seek_filter(values, reverse=backwards))
+        rows = list(queryset.order_by(*ordering)[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if backwards:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or backwards:
+                next_cursor = self.encode_cursor(rows[-1], "next")
+            if (has_more and backwards) or (values is not None and not backwards):
+                previous_cursor = self.encode_cursor(rows[0], "previous")
+
+        count = self.queryset.count() if self.with_count else None
+        return KeysetPage(rows, next_cursor, previous_cursor, count)
@@ -1,5 +1,29 @@
+import abc
+import hashlib
+import hmac
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
 import razorpay
+import requests
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from razorpay.errors import (
+    BadRequestError,
+    GatewayError,
+    ServerError,
+    SignatureVerificationError,
+)
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+logger = logging.getLogger(__name__)
 
 RAZORPAY_KEY_ID = settings.RAZORPAY_KEY_ID
 RAZORPAY_KEY_SECRET = settings.RAZORPAY_KEY_SECRET
@@ -29,3 +53,320 @@ def create_order(client, amount, callback_url, receipt=None, currency="INR"):
             "razorpay_callback_url": callback_url,
         }
     return context
+
+
+# ======================================================== #
+# Gateway adapters                                         #
+# ======================================================== #
+class PaymentGatewayError(Exception):
+    """The gateway call failed, timed out or was refused by the breaker."""
+
+
+class GatewayUnavailable(PaymentGatewayError):
+    """The circuit breaker is open; the gateway was not called."""
+
+
+class CircuitBreaker:
+    """Stop calling a failing dependency for ``reset_timeout`` seconds.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    calls fail fast. Once the timeout passes a single trial call is let
+    through: success closes the breaker, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def end_trial(self):
+        with self.lock:
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+
+
+class LatencyMetrics:
+    """Per-operation call counts, failures and recent latency percentiles."""
+
+    def __init__(self, sample_size=1000):
+        self.sample_size = sample_size
+        self.operations = {}
+        self.lock = threading.Lock()
+
+    def record(self, operation, seconds, ok):
+        with self.lock:
+            stats = self.operations.setdefault(
+                operation,
+                {"calls": 0, "failures": 0, "samples": deque(maxlen=self.sample_size)},
+            )
+            stats["calls"] += 1
+            stats["failures"] += 0 if ok else 1
+            stats["samples"].append(seconds)
+
+    @staticmethod
+    def percentile(samples, percent):
+        if not samples:
+            return None
+        index = min(len(samples) - 1, round(percent / 100 * (len(samples) - 1)))
+        return samples[index]
+
+    def snapshot(self):
+        """Return ``{operation: {calls, failures, p50_ms, p95_ms, p99_ms}}``."""
+        with self.lock:
+            operations = {
+                name: (stats["calls"], stats["failures"], sorted(stats["samples"]))
+                for name, stats in self.operations.items()
+            }
+        snapshot = {}
+        for name, (calls, failures, samples) in operations.items():
+            snapshot[name] = {"calls": calls, "failures": failures}
+            for percent in (50, 95, 99):
+                value = self.percentile(samples, percent)
+                snapshot[name][f"p{percent}_ms"] = (
+                    None if value is None else value * 1000
+                )
+        return snapshot
+
+
+class PaymentGateway(abc.ABC):
+    """Base adapter: wraps every gateway call with the breaker, retries and metrics.
+
+    Subclasses must implement the abstract ``_create_order`` and
+    ``_capture_payment`` hooks and may override ``verify_payment_signature``.
+    Only failures raised before the request was sent (connect timeouts,
+    refused connections, DNS errors) are retried, so a non-idempotent call
+    is never repeated after the gateway may have seen it. Any other exception counts as a breaker failure.
+    """
+
+    retryable_errors = (requests.ConnectTimeout,)
+    failure_errors = (requests.RequestException, ServerError, GatewayError)
+
+    def __init__(
+        self,
+        key_id=None,
+        key_secret=None,
+        connect_timeout=3.05,
+        read_timeout=10.0,
+        max_retries=2,
+        backoff=0.2,
+        failure_threshold=5,
+        reset_timeout=30.0,
+    ):
+        self.key_id = key_id if key_id is not None else RAZORPAY_KEY_ID
+        self.key_secret = key_secret if key_secret is not None else RAZORPAY_KEY_SECRET
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.metrics = LatencyMetrics()
+
+    def is_retryable(self, error):
+        """Whether ``error`` was raised before the request reached the gateway."""
+        if isinstance(error, self.retryable_errors):
+            return True
+        if isinstance(error, requests.ConnectionError) and error.args:
+            # requests wraps urllib3's MaxRetryError; a NewConnectionError
+            # reason means no connection was ever established.
+            return isinstance(
+                getattr(error.args[0], "reason", None), NewConnectionError
+            )
+        return False
+
+    def call(self, operation, func, *args, **kwargs):
+        if not self.breaker.allow():
+            self.metrics.record(operation, 0, ok=False)
+            raise GatewayUnavailable(f"Payment gateway unavailable ({operation}).")
+
+        attempt = 0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    result = func(*args, **kwargs)
+                except self.failure_errors as error:
+                    elapsed = time.perf_counter() - started
+                    self.metrics.record(operation, elapsed, ok=False)
+                    if self.is_retryable(error) and attempt < self.max_retries:
+                        attempt += 1
+                        delay = self.backoff * 2 ** (attempt - 1)
+                        time.sleep(delay + random.uniform(0, delay))
+                        continue
+                    self.breaker.record_failure()
+                    logger.warning("Payment gateway %s failed: %s", operation, error)
+                    raise PaymentGatewayError(str(error)) from error
+                except BadRequestError as error:
+                    # The gateway answered; a rejected request is not an outage.
+                    elapsed = time.perf_counter() - started
+                    self.metrics.record(operation, elapsed, ok=False)
+                    self.breaker.record_success()
+                    raise PaymentGatewayError(str(error)) from error
+                except Exception:
+                    elapsed = time.perf_counter() - started
+                    self.metrics.record(operation, elapsed, ok=False)
+                    self.breaker.record_failure()
+                    raise
+                self.metrics.record(operation, time.perf_counter() - started, ok=True)
+                self.breaker.record_success()
+                return result
+        finally:
+            # Never leave a half-open trial marked as running, whatever escaped.
+            self.breaker.end_trial()
+
+    def create_order(self, amount, currency="INR", receipt=None):
+        data = {
+            "amount": amount,
+            "currency": currency,
+            "receipt": receipt,
+            "payment_capture": 0,
+        }
+        return self.call("create_order", self._create_order, data)
+
+    def capture_payment(self, payment_id, amount):
+        return self.call("capture_payment", self._capture_payment, payment_id, amount)
+
+    def verify_payment_signature(self, params):
+        """Return whether the checkout callback was signed with our secret."""
+        message = f"{params['razorpay_order_id']}|{params['razorpay_payment_id']}"
+        expected = hmac.new(
+            self.key_secret.encode(), message.encode(), hashlib.sha256
+        ).hexdigest()
+        return hmac.compare_digest(expected, str(params["razorpay_signature"]))
+
+    @abc.abstractmethod
+    def _create_order(self, data):
+        """Create the gateway order described by ``data`` and return it."""
+
+    @abc.abstractmethod
+    def _capture_payment(self, payment_id, amount):
+        """Capture ``amount`` of an authorized payment and return the result."""
+
+
+class RazorpayGateway(PaymentGateway):
+    """Razorpay over one pooled keep-alive session with per-call timeouts."""
+
+    def __init__(self, pool_size=10, **options):
+        super().__init__(**options)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.client = razorpay.Client(
+            session=self.session, auth=(self.key_id, self.key_secret)
+        )
+
+    def _create_order(self, data):
+        return self.client.order.create(data=data, timeout=self.timeout)
+
+    def _capture_payment(self, payment_id, amount):
+        return self.client.payment.capture(payment_id, amount, timeout=self.timeout)
+
+    def verify_payment_signature(self, params):
+        try:
+            self.client.utility.verify_payment_signature(params)
+        except (SignatureVerificationError, KeyError):
+            return False
+        return True
+
+
+class FakeGateway(PaymentGateway):
+    """In-process stand-in for tests and benchmarks.
+
+    ``latency`` (seconds) is slept on every call and ``failure_rate`` of
+    calls raise ``ServerError``, so the breaker and metrics can be
+    exercised without the network. ``sign`` produces callback signatures
+    that ``verify_payment_signature`` accepts.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=None, **options):
+        options.setdefault("key_secret", "fake-secret")
+        super().__init__(**options)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.orders = {}
+        self.captured = {}
+
+    def _simulate(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            raise ServerError("Simulated gateway failure")
+
+    def _create_order(self, data):
+        self._simulate()
+        order = dict(data, id=f"order_{uuid.uuid4().hex[:14]}", status="created")
+        self.orders[order["id"]] = order
+        return order
+
+    def _capture_payment(self, payment_id, amount):
+        self._simulate()
+        self.captured[payment_id] = amount
+        return {"id": payment_id, "amount": amount, "status": "captured"}
+
+    def sign(self, order_id, payment_id):
+        message = f"{order_id}|{payment_id}"
+        return hmac.new(
+            self.key_secret.encode(), message.encode(), hashlib.sha256
+        ).hexdigest()
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Return the process-wide gateway configured by ``settings.PAYMENT_GATEWAY``."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            config = getattr(settings, "PAYMENT_GATEWAY", {})
+            backend = import_string(
+                config.get("BACKEND", "core.payment.RazorpayGateway")
+            )
+            _gateway = backend(**config.get("OPTIONS", {}))
+        return _gateway
+
+
+@receiver(setting_changed)
+def reset_gateway(setting, **kwargs):
+    global _gateway
+    if setting == "PAYMENT_GATEWAY":
+        _gateway = None
@@ -0,0 +1,127 @@
+import hashlib
+import logging
+import threading
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "recaptcha:verified:"
+
+
+class RecaptchaVerifier:
+    """Verify reCAPTCHA tokens over a pooled session with strict timeouts.
+
+    Successful verifications are cached for ``cache_timeout`` seconds,
+    keyed on the token and the client IP, so a form resubmitted by the
+    same client is not sent to the verifier again but the token cannot be
+    replayed from another address. When the verifier errors or is too
+    slow, ``degrade`` decides the outcome: ``"deny"`` rejects the token,
+    ``"allow"`` lets it through.
+    """
+
+    DENY = "deny"
+    ALLOW = "allow"
+
+    def __init__(
+        self,
+        url=None,
+        secret=None,
+        connect_timeout=1.0,
+        read_timeout=2.0,
+        pool_size=10,
+        cache_alias="default",
+        cache_timeout=30,
+        degrade=DENY,
+    ):
+        self.url = url or settings.GOOGLE_RECAPTCHA_VERIFICATION_URL
+        self.secret = (
+            secret if secret is not None else settings.GOOGLE_RECAPTCHA_SECRET_KEY
+        )
+        self.timeout = (connect_timeout, read_timeout)
+        self.cache = caches[cache_alias]
+        self.cache_timeout = cache_timeout
+        self.degrade = degrade
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def cache_key(self, token, remote_ip):
+        digest = hashlib.sha256(f"{token}\0{remote_ip}".encode()).hexdigest()
+        return CACHE_PREFIX + digest
+
+    def verify(self, token, remote_ip=None):
+        """Return whether ``token`` is a valid reCAPTCHA response.
+
+        Without ``remote_ip`` nothing is cached: the token is always verified.
+        """
+        if not token:
+            return False
+        key = self.cache_key(token, remote_ip) if remote_ip else None
+        if key and self.cache.get(key):
+            return True
+
+        data = {"secret": self.secret, "response": token}
+        if remote_ip:
+            data["remoteip"] = remote_ip
+        try:
+            response = self.request(data)
+        except (requests.RequestException, ValueError) as error:
+            logger.warning(
+                "reCAPTCHA verification failed (%s): %s", self.degrade, error
+            )
+            return self.degrade == self.ALLOW
+
+        verified = bool(response.get("success"))
+        if verified and key:
+            self.cache.set(key, True, self.cache_timeout)
+        return verified
+
+    def request(self, data):
+        response = self.session.post(self.url, data=data, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+
+class StubVerifier(RecaptchaVerifier):
+    """Offline verifier: accepts every token except those in ``reject``."""
+
+    def __init__(self, reject=("invalid",), **options):
+        options.setdefault("url", "http://recaptcha.invalid/")
+        options.setdefault("secret", "")
+        super().__init__(**options)
+        self.reject = set(reject)
+
+    def request(self, data):
+        return {"success": data["response"] not in self.reject}
+
+
+_verifier = None
+_verifier_lock = threading.Lock()
+
+
+def get_verifier():
+    """Return the process-wide verifier configured by ``settings.RECAPTCHA_VERIFIER``."""
+    global _verifier
+    with _verifier_lock:
+        if _verifier is None:
+            config = getattr(settings, "RECAPTCHA_VERIFIER", {})
+            backend = import_string(
+                config.get("BACKEND", "core.recaptcha.RecaptchaVerifier")
+            )
+            _verifier = backend(**config.get("OPTIONS", {}))
+        return _verifier
+
+
+@receiver(setting_changed)
+def reset_verifier(setting, **kwargs):
+    global _verifier
+    if setting in ("RECAPTCHA_VERIFIER", "GOOGLE_RECAPTCHA_VERIFICATION_URL"):
+        _verifier = None
@@ -0,0 +1,160 @@
+import re
+
+from django.db import connection, transaction
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from core.models import CategoryModel, ProductModel
+
+# SQLite FTS5 table holding one row per active product, keyed by product id.
+SEARCH_TABLE = "core_product_search"
+
+# bm25() column weights: name, description, category.
+RANK_WEIGHTS = (10.0, 1.0, 4.0)
+
+# Private-use characters FTS5 wraps around matches; swapped for <mark>
+# only after the snippet text has been escaped.
+HIGHLIGHT_START = "\ue000"
+HIGHLIGHT_END = "\ue001"
+
+
+def is_available():
+    return connection.vendor == "sqlite"
+
+
+def _product_rows_sql(where):
+    product_table = ProductModel._meta.db_table
+    category_table = CategoryModel._meta.db_table
+    return (
+        f"SELECT p.id, p.name, p.description, COALESCE(c.name, '') "
+        f"FROM {product_table} p "
+        f"LEFT JOIN {category_table} c ON c.id = p.category_id "
+        f"WHERE p.status AND ({where})"
+    )
+
+
+def _reindex(where, params):
+    product_table = ProductModel._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN "
+            f"(SELECT p.id FROM {product_table} p WHERE {where})",
+            params,
+        )
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}(rowid, name, description, category) "
+            + _product_rows_sql(where),
+            params,
+        )
+
+
+def index_product(product_id):
+    """Add, refresh or drop (if inactive) a single product's index row."""
+    if is_available():
+        _reindex("p.id = %s", [product_id])
+
+
+def index_category(category_id):
+    """Refresh the index rows of every product in a category."""
+    if is_available():
+        _reindex("p.category_id = %s", [category_id])
+
+
+def index_products(product_ids):
+    """Refresh the index rows of the given products."""
+    product_ids = list(product_ids)
+    if is_available() and product_ids:
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        _reindex(f"p.id IN ({placeholders})", product_ids)
+
+
+def remove_product(product_id):
+    if is_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [product_id])
+
+
+def rebuild_index():
+    """Rebuild the whole index with one INSERT ... SELECT; returns the row count."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}(rowid, name, description, category) "
+            + _product_rows_sql("1"),
+        )
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')"
+        )
+        cursor.execute(f"SELECT count(*) FROM {SEARCH_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    words = re.findall(r"\w+", text or "")
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(HIGHLIGHT_START, "<mark>")
+        .replace(HIGHLIGHT_END, "</mark>")
+    )
+
+
+class SearchResults:
+    """Lazily ranked product search results, sliceable by ``Paginator``.
+
+    Each slice runs one ranked FTS query for the page of ids and one query
+    for the products themselves; ``count()`` is answered from the index.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.match = build_match_query(text)
+
+    def count(self):
+        if not self.match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT count(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s",
+                [self.match],
+            )
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index : index + 1][0]
+        if not self.match:
+            return []
+        offset = index.start or 0
+        limit = (index.stop - offset) if index.stop is not None else -1
+        weights = ", ".join(str(weight) for weight in RANK_WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, "
+                f"snippet({SEARCH_TABLE}, 0, %s, %s, '…', 12), "
+                f"snippet({SEARCH_TABLE}, 1, %s, %s, '…', 24) "
+                f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+                f"ORDER BY bm25({SEARCH_TABLE}, {weights}) LIMIT %s OFFSET %s",
+                [HIGHLIGHT_START, HIGHLIGHT_END] * 2 + [self.match, limit, offset],
+            )
+            rows = cursor.fetchall()
+
+        products = ProductModel.objects.select_related("unit").in_bulk(
+            [row[0] for row in rows]
+        )
+        results = []
+        for product_id, name, description in rows:
+            product = products.get(product_id)
+            if product is None:
+                continue
+            product.name_snippet = highlight(name)
+            product.description_snippet = highlight(description)
+            results.append(product)
+        return results
@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db, db
+from django.utils import timezone
+
+
+class SessionStore(cached_db.SessionStore):
+    """Database sessions read through the ``SESSION_CACHE_ALIAS`` cache.
+
+    Reads come from the cache and only fall back to the database on a
+    miss. Saves that would store exactly what was loaded, such as writing
+    back the same currency on every cart update, are skipped, so such a
+    session keeps the expiry of its last real save; with
+    ``SESSION_SAVE_EVERY_REQUEST`` every save is written and the expiry
+    keeps moving. A flush or logout only deletes the cache entry of the
+    store that ran it, so the cache must be shared by every process
+    serving sessions (never a per-process one such as locmem).
+    """
+
+    cache_key_prefix = "core.sessions"
+
+    def cache_timeout(self, **kwargs):
+        return min(
+            self.get_expiry_age(**kwargs),
+            getattr(settings, "SESSION_CACHE_TIMEOUT", 300),
+        )
+
+    def load(self):
+        try:
+            data = self._cache.get(self.cache_key)
+        except Exception:
+            # Some backends (e.g. memcache) raise on invalid keys.
+            data = None
+        if data is None:
+            session = self._get_session_from_db()
+            if session:
+                data = self.decode(session.session_data)
+                self._cache.set(
+                    self.cache_key, data, self.cache_timeout(expiry=session.expire_date)
+                )
+            else:
+                data = {}
+        self._saved_state = self._state(data)
+        return data
+
+    def _state(self, data):
+        return self.serializer().dumps(data)
+
+    def save(self, must_create=False):
+        if (
+            not must_create
+            and self.session_key is not None
+            and not getattr(settings, "SESSION_SAVE_EVERY_REQUEST", False)
+            and getattr(self, "_saved_state", None) == self._state(self._session)
+        ):
+            return
+        db.SessionStore.save(self, must_create)
+        self._cache.set(self.cache_key, self._session, self.cache_timeout())
+        self._saved_state = self._state(self._session)
+
+    @classmethod
+    def clear_expired(cls, batch_size=None):
+        """Delete expired sessions in batches, each in a short transaction."""
+        batch_size = batch_size or getattr(settings, "SESSION_CLEAR_BATCH_SIZE", 1000)
+        model = cls.get_model_class()
+        expired = model.objects.filter(expire_date__lt=timezone.now()).order_by()
+        while True:
+            keys = list(expired.values_list("pk", flat=True)[:batch_size])
+            if not keys:
+                return
+            model.objects.filter(pk__in=keys).delete()
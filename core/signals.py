@@ -0,0 +1,258 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core import currency, customers, fragments, images, pagecache, search
+from core.models import (
+    Cart,
+    CartItem,
+    CategoryModel,
+    ExchangeRate,
+    Order,
+    Payment,
+    ProductModel,
+    Profile,
+    ReviewModel,
+    UnitModel,
+)
+
+
+# ======================================================== #
+# Product rating statistics                                #
+# ======================================================== #
+@receiver(post_save, sender=ReviewModel)
+def update_rating_stats_on_review_save(sender, instance, created, **kwargs):
+    product = ProductModel(pk=instance.product_id)
+    loaded = getattr(instance, "_loaded_rating", None)
+    if created:
+        product.update_rating_stats(added=instance.rating)
+    elif loaded is None:
+        # Saved without being loaded first; the previous rating is unknown.
+        product.refresh_rating_stats()
+    elif loaded[0] != instance.product_id:
+        ProductModel(pk=loaded[0]).update_rating_stats(removed=loaded[1])
+        product.update_rating_stats(added=instance.rating)
+    elif loaded[1] != instance.rating:
+        product.update_rating_stats(added=instance.rating, removed=loaded[1])
+    instance._loaded_rating = (instance.product_id, instance.rating)
+
+
+@receiver(post_delete, sender=ReviewModel)
+def update_rating_stats_on_review_delete(sender, instance, **kwargs):
+    loaded = getattr(instance, "_loaded_rating", None)
+    rating = loaded[1] if loaded else instance.rating
+    ProductModel(pk=instance.product_id).update_rating_stats(removed=rating)
+
+
+# ======================================================== #
+# Customer order statistics                                #
+# ======================================================== #
+@receiver(post_save, sender=Order)
+def update_order_stats_on_order_save(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        customers.record_order(instance.cart.user_id, instance.created_on)
+
+
+@receiver(post_delete, sender=Order)
+def update_order_stats_on_order_delete(sender, instance, **kwargs):
+    # The last order date cannot be taken back by difference.
+    user_ids = Cart.objects.filter(pk=instance.cart_id).values_list(
+        "user_id", flat=True
+    )
+    user_id = user_ids.first()
+    if user_id is not None:
+        customers.refresh_order_stats(user_id)
+
+
+@receiver(post_save, sender=Payment)
+def update_spend_on_payment_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    paid = instance.status == customers.PAID
+    loaded = getattr(instance, "_loaded_payment", None)
+    if created:
+        if paid:
+            customers.update_spend(instance.order_id, 1)
+    elif loaded is None:
+        # Saved without being loaded first; the previous status is unknown.
+        user_id = (
+            Order.objects.filter(pk=instance.order_id)
+            .values_list("cart__user_id", flat=True)
+            .first()
+        )
+        if user_id is not None:
+            customers.refresh_order_stats(user_id)
+    elif loaded != (instance.order_id, instance.status):
+        if loaded[1] == customers.PAID:
+            customers.update_spend(loaded[0], -1)
+        if paid:
+            customers.update_spend(instance.order_id, 1)
+    instance._loaded_payment = (instance.order_id, instance.status)
+
+
+@receiver(post_delete, sender=Payment)
+def update_spend_on_payment_delete(sender, instance, **kwargs):
+    loaded = getattr(instance, "_loaded_payment", None)
+    order_id, status = loaded or (instance.order_id, instance.status)
+    if status == customers.PAID:
+        customers.update_spend(order_id, -1)
+
+
+# ======================================================== #
+# Product search index                                     #
+# ======================================================== #
+SEARCH_FIELDS = {"name", "description", "category", "status"}
+
+
+@receiver(post_save, sender=ProductModel)
+def index_product_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not SEARCH_FIELDS & set(update_fields)):
+        return
+    search.index_product(instance.pk)
+
+
+@receiver(post_delete, sender=ProductModel)
+def remove_product_from_index(sender, instance, **kwargs):
+    search.remove_product(instance.pk)
+
+
+@receiver(post_save, sender=CategoryModel)
+def index_category_on_save(
+    sender, instance, created, raw=False, update_fields=None, **kwargs
+):
+    if created or raw or (update_fields is not None and "name" not in update_fields):
+        return
+    search.index_category(instance.pk)
+
+
+@receiver(pre_delete, sender=CategoryModel)
+def remember_category_products(sender, instance, **kwargs):
+    # Products are detached with an UPDATE that sends no signals.
+    instance._product_ids = list(instance.productmodel_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=CategoryModel)
+def index_products_on_category_delete(sender, instance, **kwargs):
+    search.index_products(getattr(instance, "_product_ids", ()))
+
+
+# ======================================================== #
+# Category tree                                            #
+# ======================================================== #
+@receiver(post_delete, sender=CategoryModel)
+def reroot_subcategories_on_delete(sender, instance, **kwargs):
+    # Children were detached with SET_NULL; drop the deleted prefix so the
+    # whole subtree hangs from them as new roots.
+    if instance.path:
+        CategoryModel.move_subtree(instance.path, "")
+
+
+# ======================================================== #
+# Image derivatives                                        #
+# ======================================================== #
+@receiver(post_save, sender=ProductModel)
+@receiver(post_save, sender=CategoryModel)
+@receiver(post_save, sender=Profile)
+def schedule_image_derivatives(
+    sender, instance, raw=False, update_fields=None, **kwargs
+):
+    if raw or (update_fields is not None and "image" not in update_fields):
+        return
+    name = instance.image.name
+    images.forget_missing(name)
+    transaction.on_commit(lambda: images.schedule_derivatives(name))
+
+
+# ======================================================== #
+# Anonymous page cache                                     #
+# ======================================================== #
+@receiver(post_save, sender=ProductModel)
+@receiver(post_delete, sender=ProductModel)
+@receiver(post_save, sender=CategoryModel)
+@receiver(post_delete, sender=CategoryModel)
+@receiver(post_save, sender=ReviewModel)
+@receiver(post_delete, sender=ReviewModel)
+@receiver(post_save, sender=UnitModel)
+@receiver(post_delete, sender=UnitModel)
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+def invalidate_page_cache(sender, raw=False, **kwargs):
+    # Bump after commit so a page rendered from the old data in the
+    # meantime is not cached under the new version.
+    if not raw:
+        transaction.on_commit(pagecache.bump_version)
+
+
+# ======================================================== #
+# Mini-cart fragment                                       #
+# ======================================================== #
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def invalidate_mini_cart_on_cart_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        user_id = instance.user_id
+        transaction.on_commit(lambda: fragments.bump_cart_version(user_id))
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def invalidate_mini_cart_on_item_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    try:
+        user_id = instance.cart.user_id
+    except Cart.DoesNotExist:
+        # Deleted along with its cart, which invalidates on its own.
+        return
+    transaction.on_commit(lambda: fragments.bump_cart_version(user_id))
+
+
+# ======================================================== #
+# Cart totals                                              #
+# ======================================================== #
+@receiver(post_save, sender=ProductModel)
+def refresh_cart_totals_on_price_change(
+    sender, instance, created, raw=False, update_fields=None, **kwargs
+):
+    if created or raw or (update_fields is not None and "price" not in update_fields):
+        return
+    if getattr(instance, "_loaded_price", None) == instance.price:
+        return
+    instance._loaded_price = instance.price
+    # Checked out carts keep the totals they were ordered at.
+    carts = Cart.objects.filter(
+        status=True,
+        checked_out=False,
+        cartitem__product=instance,
+        cartitem__status=True,
+    )
+    owners = dict(carts.values_list("pk", "user_id"))
+    if not owners:
+        return
+    Cart.refresh_totals(Cart.objects.filter(pk__in=owners))
+
+    def bump_mini_carts():
+        for user_id in owners.values():
+            fragments.bump_cart_version(user_id)
+
+    transaction.on_commit(bump_mini_carts)
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def refresh_cart_totals_on_item_change(sender, instance, raw=False, **kwargs):
+    # add_to_cart's raw upsert sends no signal and refreshes on its own.
+    if not raw:
+        Cart.refresh_totals(
+            Cart.objects.filter(pk=instance.cart_id, status=True, checked_out=False)
+        )
+
+
+# ======================================================== #
+# Exchange rates                                           #
+# ======================================================== #
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+def invalidate_rate_table(sender, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(currency.invalidate_rate_table)
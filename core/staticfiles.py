@@ -0,0 +1,290 @@
+import functools
+import gzip
+import logging
+import mimetypes
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import (
+    ManifestStaticFilesStorage,
+    staticfiles_storage,
+)
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # Optional; only gzip siblings are written without it.
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".css",
+    ".js",
+    ".map",
+    ".svg",
+    ".html",
+    ".json",
+    ".txt",
+    ".xml",
+    ".ico",
+    ".eot",
+    ".ttf",
+    ".otf",
+}
+# Siblings saving less than this fraction of the original are not kept.
+MIN_COMPRESSION_SAVING = 0.05
+# Preferred first.
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=0, must-revalidate"
+
+_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+_ATTRIBUTE = re.compile(r"\[[^\]]*\]")
+_NEGATION = re.compile(r":not\([^()]*\)")
+_SELECTOR_NAME = re.compile(r"[.#](-?[_a-zA-Z][-\w]*)")
+_CONTENT_TOKEN = re.compile(r"[-\w]+")
+GROUPING_AT_RULES = ("@media", "@supports", "@layer", "@container")
+
+
+# ======================================================== #
+# Unused CSS                                               #
+# ======================================================== #
+def _block_end(css, start):
+    """Index of the brace closing the block opened at ``css[start]``."""
+    depth, quote, index = 0, None, start
+    while index < len(css):
+        char = css[index]
+        if quote:
+            if char == "\\":
+                index += 1
+            elif char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return index
+        index += 1
+    return len(css) - 1
+
+
+def _split_selectors(prelude):
+    selectors, depth, start = [], 0, 0
+    for index, char in enumerate(prelude):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            selectors.append(prelude[start:index])
+            start = index + 1
+    selectors.append(prelude[start:])
+    return selectors
+
+
+def _selector_used(selector, is_used):
+    if "\\" in selector:
+        return True
+    selector = _NEGATION.sub("", _ATTRIBUTE.sub("", selector))
+    return all(is_used(name) for name in _SELECTOR_NAME.findall(selector))
+
+
+def purge_css(css, is_used):
+    """Drop the style rules of ``css`` none of whose selectors can match.
+
+    A selector can match when ``is_used`` accepts every class and id it
+    requires; tag, attribute and ``:not()`` parts are ignored. Grouping
+    at-rules are purged recursively, other at-rules are kept as they are.
+    """
+    css = _COMMENT.sub("", css)
+    kept, position = [], 0
+    while True:
+        brace = css.find("{", position)
+        statement = css.find(";", position)
+        if brace == -1:
+            break
+        if statement != -1 and statement < brace:
+            # @charset, @import and friends.
+            kept.append(css[position : statement + 1].strip())
+            position = statement + 1
+            continue
+        end = _block_end(css, brace)
+        prelude, body = css[position:brace].strip(), css[brace + 1 : end]
+        position = end + 1
+        if prelude.startswith(GROUPING_AT_RULES):
+            body = purge_css(body, is_used)
+            if body:
+                kept.append(f"{prelude}{{\n{body}\n}}")
+        elif prelude.startswith("@") or any(
+            _selector_used(selector, is_used) for selector in _split_selectors(prelude)
+        ):
+            kept.append(f"{prelude}{{{body}}}")
+    return "\n".join(kept)
+
+
+def content_tokens(patterns, base_dir=None):
+    """Every word that could be a class or id in the files matching ``patterns``."""
+    base_dir = Path(base_dir or settings.BASE_DIR)
+    tokens = set()
+    for pattern in patterns:
+        for path in base_dir.glob(pattern):
+            if path.is_file():
+                tokens.update(_CONTENT_TOKEN.findall(path.read_text(errors="ignore")))
+    return tokens
+
+
+# ======================================================== #
+# Storage                                                  #
+# ======================================================== #
+def compress(data):
+    """Return ``{suffix: compressed}`` for every encoding worth keeping."""
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, quality=11)
+    limit = len(data) * (1 - MIN_COMPRESSION_SAVING)
+    return {suffix: body for suffix, body in variants.items() if len(body) < limit}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also purges unused CSS and precompresses assets.
+
+    ``collectstatic`` first drops unused rules from the CSS files listed in
+    ``STATIC_PURGE_CSS``, then hashes every file and writes the
+    ``staticfiles.json`` manifest, then writes ``.gz`` (and, with
+    ``brotli`` installed, ``.br``) siblings next to the compressible files.
+    Until ``collectstatic`` has run the original names are used, so
+    development and tests need no manifest.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        self.purge_unused_css(paths)
+        names = []
+        for name, hashed_name, processed in super().post_process(
+            paths, dry_run, **options
+        ):
+            if not isinstance(processed, Exception):
+                names.extend([name, hashed_name])
+            yield name, hashed_name, processed
+        self.compress_files(dict.fromkeys(names))
+
+    def purge_unused_css(self, paths):
+        safelist = [
+            re.compile(pattern)
+            for pattern in getattr(settings, "STATIC_PURGE_SAFELIST", [])
+        ]
+        for name, patterns in getattr(settings, "STATIC_PURGE_CSS", {}).items():
+            if name not in paths:
+                continue
+            tokens = content_tokens(patterns)
+
+            def is_used(token):
+                return token in tokens or any(
+                    pattern.search(token) for pattern in safelist
+                )
+
+            with self.open(name) as file:
+                css = file.read().decode()
+            self.delete(name)
+            self._save(name, ContentFile(purge_css(css, is_used).encode()))
+            # Hash the purged copy rather than the source file.
+            paths[name] = (self, name)
+
+    def compress_files(self, names):
+        for name in names:
+            if Path(
+                name
+            ).suffix.lower() not in COMPRESSIBLE_EXTENSIONS or not self.exists(name):
+                continue
+            with self.open(name) as file:
+                data = file.read()
+            for suffix, body in compress(data).items():
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(body))
+
+    def url_converter(self, name, hashed_files, template=None):
+        converter = super().url_converter(name, hashed_files, template)
+
+        def convert(matchobj):
+            try:
+                return converter(matchobj)
+            except ValueError:
+                # The theme CSS references a few files it does not ship.
+                logger.warning("%s references a missing file: %s", name, matchobj[0])
+                return matchobj[0]
+
+        return convert
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+
+# ======================================================== #
+# Serving                                                  #
+# ======================================================== #
+@functools.lru_cache(maxsize=None)
+def hashed_names():
+    """Names in the manifest that carry a content hash."""
+    return frozenset(getattr(staticfiles_storage, "hashed_files", {}).values())
+
+
+def accepted_encodings(request):
+    encodings = set()
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        encoding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            encodings.add(encoding.strip().lower())
+    return encodings
+
+
+def serve(request, path):
+    """Serve a collected static file, preferring a precompressed sibling.
+
+    Hashed names never change content and are cached for a year as
+    ``immutable``; other names must be revalidated with Last-Modified.
+    """
+    fullpath = Path(safe_join(settings.STATIC_ROOT, path))
+    if not fullpath.is_file() or fullpath.suffix in (".gz", ".br"):
+        raise Http404(f"{path} does not exist")
+
+    accepted = accepted_encodings(request)
+    selected, encoding, has_variants = fullpath, None, False
+    for name, suffix in ENCODINGS:
+        variant = fullpath.with_name(fullpath.name + suffix)
+        if variant.is_file():
+            has_variants = True
+            if encoding is None and name in accepted:
+                selected, encoding = variant, name
+
+    stat = selected.stat()
+    immutable = path in hashed_names()
+    if not immutable and not was_modified_since(
+        request.headers.get("If-Modified-Since"), stat.st_mtime
+    ):
+        return HttpResponseNotModified()
+
+    content_type, _ = mimetypes.guess_type(fullpath.name)
+    response = FileResponse(
+        selected.open("rb"), content_type=content_type or "application/octet-stream"
+    )
+    response["Cache-Control"] = IMMUTABLE if immutable else REVALIDATE
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    if encoding:
+        response["Content-Encoding"] = encoding
+    if has_variants:
+        patch_vary_headers(response, ["Accept-Encoding"])
+    return response
@@ -0,0 +1,25 @@
+from django import template
+
+from core import currency
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def money(context, amount):
+    """Format a base-currency ``amount`` in the visitor's currency, e.g. ``USD 1.20``."""
+    converter = context.get("currency") or currency.PriceConverter()
+    return converter.format(amount)
+
+
+@register.filter
+def currency_code(value):
+    """ISO code of a stored ``Order.currency``."""
+    return currency.ISO_CODES.get(value, value)
+
+
+@register.simple_tag(takes_context=True)
+def converted(context, amount):
+    """The visitor's-currency value of a base-currency ``amount``, without the code."""
+    converter = context.get("currency") or currency.PriceConverter()
+    return f"{converter.convert(amount):.2f}"
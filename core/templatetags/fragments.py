@@ -0,0 +1,19 @@
+from django import template
+
+from core import fragments
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def mini_cart(context):
+    """Render the header mini-cart from the per-user fragment cache."""
+    return fragments.render_mini_cart(context.get("cart"), context.get("currency"))
+
+
+@register.simple_tag(takes_context=True)
+def product_cards(context, products):
+    """Render the cards of ``products`` from the fragment cache in one round trip."""
+    return fragments.render_product_cards(
+        products, context.get("csrf_token"), context.get("currency")
+    )
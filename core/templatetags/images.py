@@ -0,0 +1,48 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from core import images
+
+register = template.Library()
+
+DEFAULT_SIZES = "(max-width: 576px) 50vw, 320px"
+
+
+@register.simple_tag
+def responsive_image(image, sizes=DEFAULT_SIZES, alt="", css_class=""):
+    """Render ``image`` as a ``<picture>`` with WebP and JPEG ``srcset``.
+
+    Falls back to a plain ``<img>`` of the original until the derivatives
+    have been generated.
+    """
+    manifest = images.get_manifest(image.name)
+    if not manifest:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="lazy" />',
+            image.url,
+            alt,
+            css_class,
+        )
+
+    variants = manifest["variants"]
+    webp_srcset = ", ".join(
+        f"{default_storage.url(variant['webp'])} {variant['width']}w"
+        for variant in variants
+    )
+    jpeg_srcset = ", ".join(
+        f"{default_storage.url(variant['jpeg'])} {variant['width']}w"
+        for variant in variants
+    )
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}" />'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy" />'
+        "</picture>",
+        webp_srcset,
+        sizes,
+        default_storage.url(variants[-1]["jpeg"]),
+        jpeg_srcset,
+        sizes,
+        alt,
+        css_class,
+    )
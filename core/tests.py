@@ -1,2 +1,1735 @@
-from django.test import TestCase
+import io
+import re
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from importlib import import_module
+from pathlib import Path
+from unittest import mock
 
+import requests
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import mail as django_mail
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMultiAlternatives
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, migrations, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import Count
+from django.db.models.query import QuerySet
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import (
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    modify_settings,
+    override_settings,
+)
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from PIL import Image
+from razorpay.errors import ServerError
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from core import (
+    currency,
+    customers,
+    fragments,
+    images,
+    mail,
+    pagecache,
+    search,
+    staticfiles,
+)
+from core import urls as core_urls
+from core.benchmark import Benchmark, compare
+from core.cart import add_to_cart
+from core.context_processors import common_data
+from core.forms import BillingAddressForm
+from core.management.commands.advise_indexes import (
+    explain,
+    plan_problems,
+    suggest_index,
+)
+from core.middleware import query_shape
+from core.mixins import ProductSortMixin
+from core.pagination import InvalidCursor, KeysetPaginator
+from core.payment import (
+    FakeGateway,
+    GatewayUnavailable,
+    PaymentGateway,
+    PaymentGatewayError,
+)
+from core.recaptcha import StubVerifier
+from core.sessions import SessionStore
+from core.views import ShopView
+from core.models import (
+    Address,
+    Cart,
+    CartItem,
+    CategoryModel,
+    ExchangeRate,
+    Order,
+    OrderLine,
+    OutboxEmail,
+    Payment,
+    ProductModel,
+    ReviewModel,
+    UnitModel,
+    User,
+    WishlistModel,
+)
+
+
+def create_catalogue(user, products=2):
+    unit = UnitModel.objects.create(
+        name="Piece", symbol="pc", convertion_rate=1, user=user
+    )
+    category = CategoryModel.objects.create(name="General", user=user)
+    return [
+        ProductModel.objects.create(
+            name=f"Product {index}",
+            description="Description",
+            price=10 + index,
+            category=category,
+            unit=unit,
+            user=user,
+        )
+        for index in range(products)
+    ]
+
+
+class AddToCartTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("shopper", password="password")
+        self.products = create_catalogue(self.user)
+        self.client.force_login(self.user)
+
+    def test_repeated_adds_increment_one_row(self):
+        product = self.products[0]
+        for _ in range(3):
+            self.client.post("/cart/add/", {"product_id": product.id, "quantity": 2})
+
+        item = CartItem.objects.get()
+        self.assertEqual(item.quantity, 6)
+        cart = Cart.objects.get()
+        self.assertEqual(cart.item_count, 1)
+        self.assertEqual(cart.subtotal, product.price * 6)
+
+    def test_json_response(self):
+        response = self.client.post(
+            "/cart/add/",
+            {"product_id": self.products[1].id, "quantity": 1},
+            HTTP_ACCEPT="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "success": True,
+                "cart": {"item_count": 1, "subtotal": self.products[1].price},
+            },
+        )
+
+    def test_json_error_for_unknown_product(self):
+        response = self.client.post(
+            "/cart/add/",
+            {"product_id": 0, "quantity": 1},
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Cart.objects.exists())
+
+
+class CartConstraintTests(TestCase):
+    """One open cart per user, and one item row per product in it."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("shopper", password="password")
+        self.products = create_catalogue(self.user)
+
+    def test_upsert_increments_the_active_row(self):
+        product = self.products[0]
+        cart = add_to_cart(self.user, product, 1)
+        CartItem.objects.filter(cart=cart).update(status=False)
+        self.assertEqual(add_to_cart(self.user, product, 2), cart)
+        add_to_cart(self.user, product, 3)
+
+        rows = CartItem.objects.filter(cart=cart).order_by("status")
+        self.assertEqual(
+            [(i.status, i.quantity) for i in rows], [(False, 1), (True, 5)]
+        )
+        cart.refresh_from_db()
+        self.assertEqual((cart.item_count, cart.subtotal), (1, product.price * 5))
+
+    def test_one_open_cart_per_user(self):
+        Cart.objects.create(user=self.user)
+        Cart.objects.create(user=self.user, checked_out=True)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(user=self.user)
+
+
+class CartMigrationTests(TransactionTestCase):
+    """Migration 0014 merges existing duplicates so its constraints apply."""
+
+    def setUp(self):
+        migration = import_module("core.migrations.0014_cart_unique_constraints")
+        self.merge_duplicates = migration.merge_duplicates
+        self.add_constraints = migration.Migration.operations[1:]
+        # Drop the constraints again to get the schema from before 0014.
+        self.state = MigrationLoader(connection).project_state()
+        self.unconstrained = self.state.clone()
+        with connection.schema_editor() as editor:
+            for operation in self.add_constraints:
+                remove = migrations.RemoveConstraint(
+                    operation.model_name, operation.constraint.name
+                )
+                before = self.unconstrained.clone()
+                remove.state_forwards("core", self.unconstrained)
+                remove.database_forwards("core", editor, before, self.unconstrained)
+        self.migrated = False
+
+    def tearDown(self):
+        if not self.migrated:
+            Cart.objects.all().delete()
+            self.migrate()
+
+    def migrate(self):
+        self.merge_duplicates(self.unconstrained.apps, None)
+        with connection.schema_editor() as editor:
+            for operation in self.add_constraints:
+                operation.database_forwards(
+                    "core", editor, self.unconstrained, self.state
+                )
+        self.migrated = True
+
+    def test_duplicates_are_merged(self):
+        user = User.objects.create_user("shopper", password="password")
+        product, other = create_catalogue(user)
+        kept = Cart.objects.create(user=user)
+        extra = Cart.objects.create(user=user)
+        for quantity in (1, 2, 4):
+            CartItem.objects.create(cart=kept, product=product, quantity=quantity)
+        CartItem.objects.create(cart=kept, product=other, quantity=1)
+        CartItem.objects.create(cart=kept, product=product, quantity=7, status=False)
+
+        self.migrate()
+        self.assertEqual(
+            list(Cart.objects.order_by("pk").values_list("pk", "status")),
+            [(kept.pk, True), (extra.pk, False)],
+        )
+        self.assertEqual(Cart.objects.get(pk=kept.pk).item_count, 2)
+        self.assertEqual(
+            sorted(
+                CartItem.objects.filter(product=product).values_list(
+                    "status", "quantity"
+                )
+            ),
+            [(False, 7), (True, 7)],
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CartItem.objects.create(cart=kept, product=product, quantity=1)
+
+
+class CartTotalsTests(TestCase):
+    """Stored cart totals follow item changes and product price changes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("shopper", password="password")
+        self.products = create_catalogue(self.user)
+        self.client.force_login(self.user)
+        for product in self.products:
+            add_to_cart(self.user, product, 2)
+        self.cart = Cart.objects.get(user=self.user)
+
+    def post_cart(self, **changes):
+        """Submit the cart formset with ``changes`` (product index -> quantity or None)."""
+        items = list(CartItem.objects.filter(cart=self.cart).order_by("pk"))
+        data = {
+            "form-TOTAL_FORMS": len(items),
+            "form-INITIAL_FORMS": len(items),
+            "currency": Order.CurrencyChoices.INR,
+        }
+        for index, item in enumerate(items):
+            quantity = changes.get(
+                f"product_{self.products.index(item.product)}", item.quantity
+            )
+            data[f"form-{index}-id"] = item.pk
+            data[f"form-{index}-product"] = item.product_id
+            data[f"form-{index}-quantity"] = quantity or item.quantity
+            if quantity is None:
+                data[f"form-{index}-DELETE"] = "on"
+        response = self.client.post(reverse("core:cart"), data, HTTP_REFERER="/cart/")
+        self.assertEqual(response.status_code, 302)
+        self.cart.refresh_from_db()
+
+    def assertTotals(self, subtotal, item_count):
+        self.cart.refresh_from_db()
+        self.assertEqual(
+            (self.cart.subtotal, self.cart.item_count), (subtotal, item_count)
+        )
+
+    def test_add_update_and_remove(self):
+        self.assertTotals(42, 2)
+        self.post_cart(product_0=5)
+        self.assertTotals(72, 2)
+        self.post_cart(product_1=None)
+        self.assertTotals(50, 1)
+
+    def test_price_changes_refresh_totals(self):
+        product = ProductModel.objects.get(pk=self.products[0].pk)
+        product.price = 20
+        product.save()
+        self.assertTotals(62, 2)
+
+        ProductModel.objects.filter(pk=product.pk).update(price=30)
+        # Without signals the total is stale, but removing the line cannot
+        # leave a negative subtotal behind.
+        self.post_cart(product_0=None)
+        self.assertTotals(22, 1)
+        self.post_cart(product_1=None)
+        self.assertTotals(0, 0)
+
+    def test_checked_out_carts_keep_their_totals(self):
+        Cart.objects.filter(pk=self.cart.pk).update(checked_out=True)
+        product = ProductModel.objects.get(pk=self.products[0].pk)
+        product.price = 20
+        product.save()
+        self.assertTotals(42, 2)
+
+    def test_item_changes_outside_the_views(self):
+        item = CartItem.objects.get(cart=self.cart, product=self.products[0])
+        item.quantity = 1
+        item.save()
+        self.assertTotals(32, 2)
+        item.delete()
+        self.assertTotals(22, 1)
+
+
+class AddToCartConcurrencyTests(TransactionTestCase):
+    threads = 8
+    adds_per_thread = 10
+
+    def test_parallel_adds_lose_no_increments(self):
+        user = User.objects.create_user("shopper", password="password")
+        products = create_catalogue(user)
+        errors = []
+        barrier = threading.Barrier(self.threads)
+
+        def hammer(index):
+            client = Client()
+            client.force_login(user)
+            product = products[index % len(products)]
+            barrier.wait()
+            try:
+                for _ in range(self.adds_per_thread):
+                    response = client.post(
+                        "/cart/add/",
+                        {"product_id": product.id, "quantity": 1},
+                        HTTP_ACCEPT="application/json",
+                    )
+                    if response.status_code != 200:
+                        errors.append(response.status_code)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=hammer, args=(index,))
+            for index in range(self.threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        cart = Cart.objects.get(user=user, status=True, checked_out=False)
+        items = CartItem.objects.filter(cart=cart)
+        self.assertEqual(items.count(), len(products))
+        adds = self.threads * self.adds_per_thread
+        self.assertEqual(sum(item.quantity for item in items), adds)
+        self.assertEqual(cart.item_count, len(products))
+        expected = sum(
+            item.product.price * item.quantity
+            for item in items.select_related("product")
+        )
+        self.assertAlmostEqual(cart.subtotal, expected)
+
+
+class RatingStatsTests(TestCase):
+    """Reviews keep the product's stored rating statistics up to date."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("shopper", password="password")
+        self.product, self.other = create_catalogue(self.user)
+
+    def review(self, rating, product=None):
+        return ReviewModel.objects.create(
+            product=product or self.product, rating=rating, comment="", user=self.user
+        )
+
+    def assertStats(self, count, average, histogram, product=None):
+        product = ProductModel.objects.get(pk=(product or self.product).pk)
+        self.assertEqual(product.rating_count, count)
+        self.assertAlmostEqual(product.rating_avg, average)
+        self.assertEqual([count for _, count in product.rating_histogram], histogram)
+
+    def test_create_edit_and_delete(self):
+        self.review(4)
+        review = self.review(2)
+        self.assertStats(2, 3, [0, 1, 0, 1, 0])
+
+        review = ReviewModel.objects.get(pk=review.pk)
+        review.rating = 5
+        review.save()
+        self.assertStats(2, 4.5, [0, 0, 0, 1, 1])
+
+        review.product = self.other
+        review.save()
+        self.assertStats(1, 4, [0, 0, 0, 1, 0])
+        self.assertStats(1, 5, [0, 0, 0, 0, 1], product=self.other)
+
+        ReviewModel.objects.filter(product=self.product).get().delete()
+        self.assertStats(0, 0, [0, 0, 0, 0, 0])
+
+    def test_rebuild_command(self):
+        self.review(3)
+        self.review(1)
+        ProductModel.objects.update(rating_count=0, rating_avg=0, rating_3_count=0)
+        out = io.StringIO()
+        call_command("rebuild_product_ratings", stdout=out)
+        self.assertIn("Rebuilt ratings for 1 products", out.getvalue())
+        self.assertStats(2, 2, [1, 0, 1, 0, 0])
+
+
+class CategoryTreeTests(TestCase):
+    """Category paths follow moves and deletes of their ancestors."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("shopper", password="password")
+        self.root = self.category("Root")
+        self.child = self.category("Child", self.root)
+        self.leaf = self.category("Leaf", self.child)
+        self.other = self.category("Other")
+
+    def category(self, name, parent=None):
+        return CategoryModel.objects.create(name=name, parent=parent, user=self.user)
+
+    def path(self, *categories):
+        return "".join(f"{category.pk:08d}/" for category in categories)
+
+    def refresh(self, category):
+        return CategoryModel.objects.get(pk=category.pk)
+
+    def test_subtree_listing(self):
+        self.assertEqual(
+            list(self.root.get_descendants()), [self.root, self.child, self.leaf]
+        )
+        self.assertEqual(
+            list(self.root.get_descendants(include_self=False)), [self.child, self.leaf]
+        )
+        self.assertEqual(
+            list(self.refresh(self.leaf).get_ancestors()),
+            [self.root, self.child, self.leaf],
+        )
+
+    def test_moving_a_subtree_rewrites_descendant_paths(self):
+        self.child.parent = self.other
+        self.child.save()
+        self.assertEqual(
+            self.refresh(self.child).path, self.path(self.other, self.child)
+        )
+        self.assertEqual(
+            self.refresh(self.leaf).path, self.path(self.other, self.child, self.leaf)
+        )
+        self.assertEqual(list(self.root.get_descendants()), [self.root])
+        self.assertEqual(self.refresh(self.leaf).depth, 2)
+
+    def test_move_below_itself_is_rejected(self):
+        root = self.refresh(self.root)
+        root.parent = self.leaf
+        with self.assertRaises(ValueError):
+            root.save()
+        self.assertEqual(self.refresh(self.root).parent_id, None)
+        self.assertEqual(
+            self.refresh(self.leaf).path, self.path(self.root, self.child, self.leaf)
+        )
+
+    def test_delete_reroots_children(self):
+        self.root.delete()
+        self.assertEqual(self.refresh(self.child).path, self.path(self.child))
+        self.assertEqual(self.refresh(self.leaf).path, self.path(self.child, self.leaf))
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages walk the whole ordering in both directions."""
+
+    ordering = ("price", "id")
+
+    def setUp(self):
+        self.user = User.objects.create_user("shopper", password="password")
+        self.products = create_catalogue(self.user, products=7)
+        # Ties on the sort key must be broken by the id.
+        ProductModel.objects.filter(pk__in=[p.pk for p in self.products[1:5]]).update(
+            price=20
+        )
+        self.expected = list(
+            ProductModel.objects.order_by(*self.ordering).values_list("pk", flat=True)
+        )
+
+    def paginator(self, ordering=None):
+        return KeysetPaginator(ProductModel.objects.all(), 3, ordering or self.ordering)
+
+    def ids(self, page):
+        return [product.pk for product in page]
+
+    def test_forward_and_backward_round_trip(self):
+        paginator = self.paginator()
+        pages = [paginator.page()]
+        self.assertFalse(pages[0].has_previous())
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        self.assertEqual(sum(map(self.ids, pages), []), self.expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+
+        page = pages[-1]
+        backwards = [page]
+        while page.has_previous():
+            page = paginator.page(page.previous_cursor)
+            backwards.append(page)
+        self.assertEqual(
+            [self.ids(page) for page in reversed(backwards)],
+            [self.ids(page) for page in pages],
+        )
+        self.assertEqual(
+            self.ids(paginator.page(backwards[1].next_cursor)), self.ids(pages[2])
+        )
+
+    def test_descending_order_with_ties(self):
+        paginator = self.paginator(("-price", "id"))
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        expected = list(
+            ProductModel.objects.order_by("-price", "id").values_list("pk", flat=True)
+        )
+        self.assertEqual(self.ids(first) + self.ids(second), expected[:6])
+
+    def test_invalid_cursors(self):
+        paginator = self.paginator()
+        cursor = paginator.page().next_cursor
+        invalid = [
+            cursor[:-2] + ("A" if cursor[-1] != "A" else "B") + cursor[-1],
+            "garbage",
+            self.paginator(("-price", "id")).page().next_cursor,
+        ]
+        for value in invalid:
+            with self.subTest(cursor=value), self.assertRaises(InvalidCursor):
+                paginator.page(value)
+
+    def test_shop_falls_back_to_the_first_page(self):
+        first = self.client.get(reverse("core:shop"))
+        tampered = self.client.get(reverse("core:shop"), {"cursor": "tampered"})
+        self.assertEqual(tampered.status_code, 200)
+        self.assertEqual(
+            [p.pk for p in tampered.context["products"]],
+            [p.pk for p in first.context["products"]],
+        )
+
+
+class SearchIndexTests(TestCase):
+    """The FTS index follows product and category changes and ranks by bm25."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("shopper", password="password")
+        self.product, self.other = create_catalogue(self.user)
+
+    def search(self, text):
+        return [product.pk for product in search.SearchResults(text)[0:10]]
+
+    def test_product_insert_update_and_delete(self):
+        self.assertEqual(self.search("Product 0"), [self.product.pk])
+
+        self.product.name = "Lantern"
+        self.product.save()
+        self.assertEqual(self.search("lantern"), [self.product.pk])
+        self.assertEqual(self.search("Product 0"), [])
+
+        self.product.status = False
+        self.product.save()
+        self.assertEqual(self.search("lantern"), [])
+
+        self.other.delete()
+        self.assertEqual(self.search("Product"), [])
+
+    def test_category_rename_and_delete(self):
+        category = self.product.category
+        category.name = "Outdoor"
+        category.save()
+        self.assertEqual(
+            sorted(self.search("outdoor")), [self.product.pk, self.other.pk]
+        )
+        self.assertEqual(self.search("general"), [])
+
+        category.delete()
+        self.assertEqual(self.search("outdoor"), [])
+        self.assertEqual(
+            sorted(self.search("product")), [self.product.pk, self.other.pk]
+        )
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.product.description = "A lantern for the garden"
+        self.product.save()
+        self.other.name = "Lantern"
+        self.other.save()
+        results = search.SearchResults("lantern")
+        self.assertEqual(results.count(), 2)
+        self.assertEqual(self.search("lantern"), [self.other.pk, self.product.pk])
+
+
+@override_settings(QUERY_COUNT_ENABLED=True)
+class QueryBudgetTests(TestCase):
+    """Every core view declares a ``query_budget`` and its requests stay within it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("shopper", password="password")
+        cls.products = create_catalogue(cls.user, products=5)
+        for product in cls.products:
+            add_to_cart(cls.user, product, 2)
+        cart = Cart.objects.get(user=cls.user)
+        address = Address.objects.create(
+            building_name="Building",
+            place="Place",
+            street="Street",
+            city="City",
+            district="District",
+            state="State",
+            country="Country",
+            post_office="Post office",
+            post_code="000000",
+        )
+        for index in range(4):
+            order = Order.objects.create(
+                id=f"order_{index}",
+                cart=cart,
+                amount=100,
+                billing_address=address,
+                shipping_address=address,
+            )
+            Payment.objects.create(id=f"pay_{index}", order=order)
+        cls.wishlist = WishlistModel.objects.create(name="Wishlist", user=cls.user)
+        cls.wishlist.products.set(cls.products)
+
+    def setUp(self):
+        # Budgets hold with cold caches.
+        cache.clear()
+        currency.invalidate_rate_table()
+        self.client.force_login(self.user)
+
+    def assertWithinBudget(self, url, data=None, status_code=200, **extra):
+        if data is None:
+            response = self.client.get(url, **extra)
+        else:
+            response = self.client.post(url, data, **extra)
+        self.assertEqual(response.status_code, status_code, url)
+        stats = response.query_stats
+        self.assertIsNotNone(
+            stats.budget, f"{stats.view_name} declares no query_budget"
+        )
+        self.assertLessEqual(stats.count, stats.budget, str(stats))
+        self.assertEqual(stats.duplicates, {}, str(stats))
+
+    def test_every_view_declares_a_budget(self):
+        for pattern in core_urls.urlpatterns:
+            if isinstance(pattern, URLPattern):
+                view_class = pattern.callback.view_class
+                self.assertIsInstance(
+                    getattr(view_class, "query_budget", None), int, view_class.__name__
+                )
+
+    def test_views_within_budget(self):
+        product = self.products[0]
+        urls = [
+            reverse("core:home"),
+            reverse("core:about"),
+            reverse("core:contact"),
+            reverse("core:shop"),
+            reverse("core:dashboard"),
+            reverse("core:profile"),
+            reverse("core:product_detail", args=[product.pk]),
+            reverse("core:search") + "?q=product",
+            reverse("core:category_list"),
+            reverse("core:product_by_category", args=[product.category_id]),
+            reverse("core:wishlist_list"),
+            reverse("core:wishlist_detail", args=[self.wishlist.pk]),
+            reverse("core:cart"),
+            reverse("core:cart_checkout"),
+            reverse("core:order"),
+            reverse("core:order_detail", args=["order_0"]),
+            reverse("core:order_history"),
+            reverse("core:payment_list"),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertWithinBudget(url)
+
+    def test_add_to_cart_within_budget(self):
+        data = {"product_id": self.products[0].pk, "quantity": 1}
+        self.assertWithinBudget(reverse("core:cart_add"), data, status_code=302)
+        self.assertWithinBudget(
+            reverse("core:cart_add"), data, HTTP_X_REQUESTED_WITH="XMLHttpRequest"
+        )
+
+    def test_cart_update_within_budget(self):
+        items = CartItem.objects.filter(cart__user=self.user).order_by("pk")
+        data = {
+            "form-TOTAL_FORMS": len(items),
+            "form-INITIAL_FORMS": len(items),
+            "currency": "INR",
+        }
+        for index, item in enumerate(items):
+            data[f"form-{index}-id"] = item.pk
+            data[f"form-{index}-quantity"] = 3
+        data["form-0-DELETE"] = "on"
+        data["form-1-DELETE"] = "on"
+        url = reverse("core:cart")
+        self.assertWithinBudget(url, data, status_code=302, HTTP_REFERER=url)
+
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(cart.item_count, 3)
+        self.assertEqual(cart.subtotal, cart.total())
+        self.assertEqual(
+            list(cart.cartitem_set.values_list("quantity", flat=True)), [3, 3, 3]
+        )
+
+    @override_settings(PAYMENT_GATEWAY={"BACKEND": "core.payment.FakeGateway"})
+    def test_checkout_within_budget(self):
+        fields = [
+            "building_name",
+            "place",
+            "street",
+            "city",
+            "district",
+            "state",
+            "country",
+            "post_office",
+            "post_code",
+        ]
+        data = {f"billing-{field}": field for field in fields}
+        data["same_as_billing_address"] = "on"
+        self.assertWithinBudget(reverse("core:cart_checkout"), data, status_code=302)
+        self.assertEqual(Order.objects.filter(cart__user=self.user).count(), 5)
+
+    def test_repeated_query_shapes_are_flagged(self):
+        self.assertEqual(
+            query_shape('SELECT * FROM "t" WHERE "id" IN (%s, %s) LIMIT 21'),
+            query_shape('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s)  LIMIT 21'),
+        )
+        url = reverse("core:order")
+        with self.settings(QUERY_COUNT_DUPLICATE_THRESHOLD=1):
+            with self.assertLogs("core.middleware", "WARNING") as logs:
+                response = self.client.get(url)
+        self.assertTrue(response.query_stats.duplicates)
+        self.assertIn("core:order", logs.output[0])
+
+
+class PageCacheTests(TestCase):
+    """Anonymous pages are served from the cache until the catalogue changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("shopper", password="password")
+        cls.products = create_catalogue(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("core:shop")
+
+    def csrf_token(self, response):
+        return re.search(
+            r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()
+        )[1]
+
+    def test_second_anonymous_request_is_a_hit(self):
+        self.assertEqual(self.client.get(self.url)["X-Page-Cache"], "miss")
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertContains(response, "Product 1")
+
+    def test_each_visitor_gets_their_own_csrf_token(self):
+        first = Client(enforce_csrf_checks=True).get(self.url)
+        visitor = Client(enforce_csrf_checks=True)
+        second = visitor.get(self.url)
+        self.assertEqual(second["X-Page-Cache"], "hit")
+        self.assertNotContains(second, pagecache.CSRF_PLACEHOLDER)
+        self.assertNotEqual(self.csrf_token(first), self.csrf_token(second))
+        response = visitor.post(
+            reverse("core:login"),
+            {"csrfmiddlewaretoken": self.csrf_token(second), "username": "shopper"},
+        )
+        self.assertNotEqual(response.status_code, 403)
+
+    def test_catalogue_change_invalidates(self):
+        self.client.get(self.url)
+        product = self.products[0]
+        product.name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "Renamed")
+
+    def test_authenticated_requests_are_not_cached(self):
+        self.client.force_login(self.user)
+        self.client.get(self.url)
+        self.assertNotIn("X-Page-Cache", self.client.get(self.url))
+
+    @modify_settings(MIDDLEWARE={"append": "core.tests.HandleErrorsMiddleware"})
+    def test_misses_run_the_view_through_the_handler(self):
+        with mock.patch.object(ShopView, "get_queryset", side_effect=ValueError):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertNotIn("X-Page-Cache", response)
+        self.assertEqual(self.client.get(self.url)["X-Page-Cache"], "miss")
+
+
+class HandleErrorsMiddleware:
+    """Exception handling middleware placed after the page cache."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        return HttpResponse("Handled", status=503)
+
+
+class CommonDataTests(TestCase):
+    """The shared template context is only built when a template uses it."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("shopper", password="password")
+        create_catalogue(self.user)
+        self.request = RequestFactory().get("/")
+        self.request.user = AnonymousUser()
+
+    def test_nothing_is_built_until_used(self):
+        with mock.patch("core.context_processors.FeedbackForm") as form_class:
+            with self.assertNumQueries(0):
+                context = common_data(self.request)
+            form_class.assert_not_called()
+            context["contact_form"].is_valid()
+            form_class.assert_called_once_with()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(context["products"]), 2)
+        self.assertIn("username", context["login_form"].fields)
+
+    def test_cart_is_read_lazily(self):
+        self.request.user = self.user
+        with self.assertNumQueries(0):
+            context = common_data(self.request)
+        with self.assertNumQueries(1):
+            self.assertEqual((context["cart"].count, context["cart"].total), (0, 0))
+        self.assertFalse(Cart.objects.exists())
+
+
+class FragmentCacheTests(TestCase):
+    """The mini-cart follows its cart version and cards follow ``updated_on``."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("shopper", password="password")
+        cls.products = create_catalogue(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_mini_cart_is_invalidated_by_cart_changes(self):
+        self.client.get(reverse("core:about"))
+        with self.assertNumQueries(1):
+            # The user only; the session and the mini-cart come from caches.
+            self.client.get(reverse("core:about"))
+        with self.captureOnCommitCallbacks(execute=True):
+            add_to_cart(self.user, self.products[0], 3)
+        self.assertContains(self.client.get(reverse("core:about")), "<td>3</td>")
+
+        item = CartItem.objects.get(cart__user=self.user)
+        item.quantity = 7
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        self.assertContains(self.client.get(reverse("core:about")), "<td>7</td>")
+
+    def test_cached_product_cards_are_not_rendered_again(self):
+        product = self.products[0]
+        first = fragments.render_product_cards(self.products, "token")
+        self.assertEqual(first.count('value="token"'), len(self.products))
+
+        with mock.patch.object(fragments, "render_to_string") as render:
+            self.assertEqual(
+                fragments.render_product_cards(self.products, "token"), first
+            )
+        render.assert_not_called()
+
+        product.name = "Renamed"
+        product.save()
+        self.assertIn("Renamed", fragments.render_product_cards(self.products, "token"))
+
+
+class StaticPipelineTests(TestCase):
+    """collectstatic purges, hashes and precompresses; serving picks the smallest copy."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        base = Path(directory.name)
+        (base / "static").mkdir()
+        (base / "templates").mkdir()
+        classes = " ".join(f"used-{index}" for index in range(100))
+        (base / "templates" / "page.html").write_text(f'<div class="box {classes}">')
+        used = "".join(
+            f".used-{index} {{ margin: {index}px; }}\n" for index in range(100)
+        )
+        unused = "".join(f".unused-{index} {{ color: red; }}\n" for index in range(200))
+        self.css = f"{used}.box .unused {{ padding: 0; }}\n{unused}"
+        (base / "static" / "site.css").write_text(self.css)
+
+        settings = override_settings(
+            BASE_DIR=base,
+            STATIC_ROOT=base / "root",
+            STATICFILES_DIRS=[base / "static"],
+            STATICFILES_FINDERS=["django.contrib.staticfiles.finders.FileSystemFinder"],
+            STATIC_PURGE_CSS={"site.css": ["templates/*.html"]},
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        staticfiles.hashed_names.cache_clear()
+        self.addCleanup(staticfiles.hashed_names.cache_clear)
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+    def test_bytes_saved(self):
+        name = staticfiles_storage.stored_name("site.css")
+        self.assertRegex(name, r"^site\.[0-9a-f]{12}\.css$")
+        url = staticfiles_storage.url("site.css")
+
+        plain = self.client.get(url)
+        purged = b"".join(plain.streaming_content)
+        self.assertIn(b".used-99", purged)
+        self.assertNotIn(b"unused", purged)
+        self.assertEqual(plain["Cache-Control"], staticfiles.IMMUTABLE)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        served = len(b"".join(response.streaming_content))
+
+        saved = len(self.css.encode()) - served
+        self.assertGreater(saved / len(self.css.encode()), 0.9, f"{saved} bytes saved")
+
+    def test_unhashed_names_are_revalidated(self):
+        response = self.client.get("/static/site.css")
+        self.assertEqual(response["Cache-Control"], staticfiles.REVALIDATE)
+        response = self.client.get(
+            "/static/site.css", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class ImageDerivativeTests(TestCase):
+    """Uploaded images get resized WebP and JPEG variants and a manifest."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(MEDIA_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        images._manifests.clear()
+        self.addCleanup(images._manifests.clear)
+        cache.clear()
+
+    def save_image(self, name, size, mode="RGBA"):
+        buffer = io.BytesIO()
+        Image.new(mode, size, (200, 10, 10, 128)[: len(mode)]).save(buffer, "PNG")
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def test_variants_are_never_upscaled(self):
+        name = self.save_image("product/large.png", (800, 400))
+        manifest = images.generate_derivatives(name)
+        self.assertEqual([v["width"] for v in manifest["variants"]], [160, 320, 640])
+        for variant in manifest["variants"]:
+            with default_storage.open(variant["webp"]) as file:
+                self.assertEqual(Image.open(file).format, "WEBP")
+            with default_storage.open(variant["jpeg"]) as file:
+                self.assertEqual(
+                    Image.open(file).size, (variant["width"], variant["width"] // 2)
+                )
+        self.assertEqual(images.get_manifest(name), manifest)
+
+        small = self.save_image("product/small.png", (100, 100), mode="RGB")
+        self.assertEqual(
+            [v["width"] for v in images.generate_derivatives(small)["variants"]], [100]
+        )
+
+    def test_unreadable_images_are_skipped(self):
+        name = default_storage.save("product/broken.png", ContentFile(b"not an image"))
+        self.assertIsNone(images.generate_derivatives(name))
+        self.assertIsNone(images.get_manifest(name))
+
+    def test_missing_manifests_are_remembered_until_the_image_is_saved(self):
+        storage = mock.Mock(open=mock.Mock(side_effect=FileNotFoundError))
+        for _ in range(3):
+            self.assertIsNone(images.get_manifest("category/new.png", storage))
+        self.assertEqual(storage.open.call_count, 1)
+
+        user = User.objects.create_user("shopper", password="password")
+        CategoryModel.objects.create(name="New", image="category/new.png", user=user)
+        self.assertIsNone(images.get_manifest("category/new.png", storage))
+        self.assertEqual(storage.open.call_count, 2)
+
+    def test_responsive_image_tag(self):
+        name = self.save_image("product/photo.png", (400, 400))
+        template = Template("{% load images %}{% responsive_image image alt='Photo' %}")
+        context = Context({"image": CategoryModel(image=name).image})
+        self.assertNotIn("<picture>", template.render(context))
+
+        images.generate_derivatives(name)
+        html = template.render(context)
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn("320w.webp 320w", html)
+        self.assertIn('alt="Photo"', html)
+
+
+class MediaServingTests(TestCase):
+    """Media files support byte ranges, strong ETags and proxy offload."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.data = bytes(range(256)) * 40
+        (Path(directory.name) / "photo.jpg").write_bytes(self.data)
+        settings = override_settings(MEDIA_ROOT=directory.name, MEDIA_OFFLOAD=None)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.url = "/media/photo.jpg"
+
+    def test_whole_file_and_revalidation(self):
+        response = self.client.get(self.url)
+        self.assertEqual(b"".join(response.streaming_content), self.data)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertTrue(response["ETag"].startswith('"'))
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=100-199")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 100-199/{len(self.data)}")
+        self.assertEqual(b"".join(response.streaming_content), self.data[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-10")
+        self.assertEqual(b"".join(response.streaming_content), self.data[-10:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.data)}-")
+        self.assertEqual(response.status_code, 416)
+
+        stale = self.client.get(
+            self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(stale.status_code, 200)
+
+    def test_offload(self):
+        with self.settings(MEDIA_OFFLOAD="x-accel-redirect"):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/photo.jpg")
+        self.assertEqual(response.content, b"")
+
+
+class PaymentGatewayTests(SimpleTestCase):
+    """The gateway breaker opens, half-opens and closes; only unsent calls are retried."""
+
+    def setUp(self):
+        self.now = 0.0
+        self.gateway = FakeGateway(
+            failure_threshold=2, reset_timeout=30, max_retries=2, backoff=0
+        )
+        self.gateway.breaker.clock = lambda: self.now
+        patcher = mock.patch("core.payment.logger")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def failing(self, *errors):
+        errors = list(errors)
+        calls = []
+
+        def func():
+            calls.append(1)
+            if errors:
+                raise errors.pop(0)
+            return "ok"
+
+        return func, calls
+
+    @staticmethod
+    def connection_error(reason):
+        return requests.ConnectionError(MaxRetryError(None, "/orders", reason))
+
+    def test_breaker_transitions(self):
+        breaker = self.gateway.breaker
+        for _ in range(2):
+            with self.assertRaises(PaymentGatewayError):
+                self.gateway.call("create_order", self.failing(ServerError("down"))[0])
+        self.assertEqual(breaker.state, breaker.OPEN)
+        func, calls = self.failing()
+        with self.assertRaises(GatewayUnavailable):
+            self.gateway.call("create_order", func)
+        self.assertEqual(calls, [])
+
+        # A failed trial re-opens the breaker for another timeout.
+        self.now += 30
+        self.assertEqual(breaker.state, breaker.HALF_OPEN)
+        with self.assertRaises(PaymentGatewayError):
+            self.gateway.call("create_order", self.failing(ServerError("down"))[0])
+        self.assertEqual(breaker.state, breaker.OPEN)
+
+        # A successful trial closes it.
+        self.now += 30
+        self.assertEqual(self.gateway.create_order(100)["status"], "created")
+        self.assertEqual(breaker.state, breaker.CLOSED)
+        self.assertEqual(self.gateway.metrics.snapshot()["create_order"]["calls"], 5)
+
+    def test_unexpected_error_in_trial_reopens_the_breaker(self):
+        breaker = self.gateway.breaker
+        breaker.opened_at = self.now
+        self.now += 30
+        with self.assertRaises(KeyError):
+            self.gateway.call("create_order", self.failing(KeyError("id"))[0])
+        self.assertFalse(breaker.trial_running)
+        self.assertEqual(breaker.state, breaker.OPEN)
+
+        self.now += 30
+        self.assertEqual(self.gateway.call("create_order", self.failing()[0]), "ok")
+        self.assertEqual(breaker.state, breaker.CLOSED)
+
+    def test_gateways_must_implement_every_hook(self):
+        class PartialGateway(PaymentGateway):
+            def _create_order(self, data):
+                return data
+
+        with self.assertRaises(TypeError):
+            PartialGateway(key_secret="secret")
+
+    def test_only_unsent_requests_are_retried(self):
+        refused = NewConnectionError(None, "Connection refused")
+        cases = [
+            (requests.ConnectTimeout("connect timed out"), 3),
+            (self.connection_error(refused), 3),
+            (self.connection_error(ProtocolError("Connection reset")), 1),
+            (requests.ReadTimeout("read timed out"), 1),
+            (ServerError("down"), 1),
+        ]
+        for error, attempts in cases:
+            with self.subTest(error=type(error).__name__, attempts=attempts):
+                self.gateway.breaker.record_success()
+                func, calls = self.failing(error, error, error)
+                with self.assertRaises(PaymentGatewayError):
+                    self.gateway.call("capture_payment", func)
+                self.assertEqual(len(calls), attempts)
+
+        func, calls = self.failing(requests.ConnectTimeout("connect timed out"))
+        self.assertEqual(self.gateway.call("capture_payment", func), "ok")
+        self.assertEqual(len(calls), 2)
+
+
+class RecaptchaTests(SimpleTestCase):
+    """Verified tokens are only reused by the client that submitted them."""
+
+    class Verifier(StubVerifier):
+        # Like the real service, every token only verifies once.
+        def request(self, data):
+            self.requests.append(data)
+            response = super().request(data)
+            self.reject.add(data["response"])
+            return response
+
+    def setUp(self):
+        cache.clear()
+        self.verifier = self.Verifier()
+        self.verifier.requests = []
+
+    def verify(self, remote_ip):
+        return self.verifier.verify("token", remote_ip)
+
+    def test_resubmission_from_the_same_client(self):
+        self.assertTrue(self.verify("10.0.0.1"))
+        self.assertTrue(self.verify("10.0.0.1"))
+        self.assertEqual(len(self.verifier.requests), 1)
+        self.assertEqual(self.verifier.requests[0]["remoteip"], "10.0.0.1")
+
+    def test_token_replayed_from_another_client(self):
+        self.assertTrue(self.verify("10.0.0.1"))
+        self.assertFalse(self.verify("10.0.0.2"))
+        self.assertEqual(len(self.verifier.requests), 2)
+
+    def test_nothing_cached_without_a_client_ip(self):
+        self.assertTrue(self.verify(None))
+        self.assertFalse(self.verify(None))
+        self.assertFalse(self.verifier.verify("", "10.0.0.1"))
+
+
+class OutboxTests(TestCase):
+    """Queued emails are claimed once, retried with backoff and dead-lettered."""
+
+    def setUp(self):
+        self.emails = [
+            mail.enqueue_mail(
+                f"Subject {index}", "Body", recipient_list=["a@example.com"]
+            )
+            for index in range(3)
+        ]
+
+    def refresh(self, email):
+        return OutboxEmail.objects.get(pk=email.pk)
+
+    def test_concurrent_claims(self):
+        first = self.emails[0]
+        update = QuerySet.update
+
+        def racing_update(queryset, **kwargs):
+            # Another worker claims the first email between our SELECT and UPDATE.
+            rival = OutboxEmail.objects.filter(pk=first.pk)
+            update(
+                rival, state=OutboxEmail.StateChoices.sending, claim_token=uuid.uuid4()
+            )
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(
+            QuerySet, "update", autospec=True, side_effect=racing_update
+        ):
+            claimed = mail.claim_batch(10)
+        self.assertEqual(claimed, self.emails[1:])
+        self.assertEqual(mail.claim_batch(10), [])
+
+    def test_success_is_marked(self):
+        self.assertEqual(mail.send_batch(), (3, 0))
+        self.assertEqual(len(django_mail.outbox), 3)
+        for email in self.emails:
+            email = self.refresh(email)
+            self.assertEqual(email.state, OutboxEmail.StateChoices.sent)
+            self.assertIsNotNone(email.sent_on)
+        self.assertEqual(mail.send_batch(), (0, 0))
+
+    def test_retry_backoff_and_dead_letter(self):
+        OutboxEmail.objects.exclude(pk=self.emails[0].pk).delete()
+        email = self.emails[0]
+        backoff = timedelta(minutes=1)
+        send = mock.patch.object(
+            EmailMultiAlternatives, "send", side_effect=OSError("down")
+        )
+        with send, mock.patch("core.mail.logger"):
+            for attempt in range(1, 3):
+                started = timezone.now()
+                self.assertEqual(
+                    mail.send_batch(max_attempts=3, backoff=backoff), (0, 1)
+                )
+                email = self.refresh(email)
+                self.assertEqual(email.state, OutboxEmail.StateChoices.pending)
+                self.assertEqual(email.attempts, attempt)
+                self.assertEqual(email.last_error, "down")
+                self.assertGreaterEqual(
+                    email.next_attempt_on, started + backoff * 2 ** (attempt - 1)
+                )
+                # Not due yet, so the next batch leaves it alone.
+                self.assertEqual(
+                    mail.send_batch(max_attempts=3, backoff=backoff), (0, 0)
+                )
+                OutboxEmail.objects.update(next_attempt_on=timezone.now())
+
+            self.assertEqual(mail.send_batch(max_attempts=3, backoff=backoff), (0, 1))
+        email = self.refresh(email)
+        self.assertEqual(
+            (email.state, email.attempts), (OutboxEmail.StateChoices.dead, 3)
+        )
+        self.assertEqual(mail.send_batch(), (0, 0))
+
+
+class SessionStoreTests(TestCase):
+    """Sessions are read from the cache and unchanged sessions are not saved."""
+
+    def setUp(self):
+        self.store = SessionStore()
+        self.store["currency"] = "INR"
+        self.store.save()
+
+    def test_reads_and_unchanged_saves_skip_the_database(self):
+        with self.assertNumQueries(0):
+            session = SessionStore(self.store.session_key)
+            self.assertEqual(session["currency"], "INR")
+            session["currency"] = "INR"
+            session.save()
+
+        session["currency"] = "USD"
+        with self.assertNumQueries(3):  # UPDATE inside a savepoint
+            session.save()
+        self.assertEqual(SessionStore(self.store.session_key)["currency"], "USD")
+
+    def store_in_another_worker(self, session_key=None):
+        """A store with its own connection to the sessions cache, like another process."""
+        store = SessionStore(session_key)
+        store._cache = caches.create_connection(settings.SESSION_CACHE_ALIAS)
+        return store
+
+    def test_flushed_sessions_cannot_be_loaded_by_other_workers(self):
+        self.assertNotIsInstance(caches[settings.SESSION_CACHE_ALIAS], LocMemCache)
+        session_key = self.store.session_key
+        warm = self.store_in_another_worker(session_key)
+        self.assertEqual(warm["currency"], "INR")
+
+        self.store.flush()
+        self.assertEqual(self.store_in_another_worker(session_key).load(), {})
+        cold = self.store_in_another_worker(session_key)
+        cold._cache.delete(cold.cache_key)
+        self.assertEqual(cold.load(), {})
+
+    @override_settings(SESSION_SAVE_EVERY_REQUEST=True)
+    def test_unchanged_saves_extend_the_expiry_when_saving_every_request(self):
+        session_key = self.store.session_key
+        soon = timezone.now() + timedelta(minutes=1)
+        Session.objects.filter(pk=session_key).update(expire_date=soon)
+        session = SessionStore(session_key)
+        self.assertEqual(session["currency"], "INR")
+        session.save()
+        self.assertGreater(
+            Session.objects.get(pk=session_key).expire_date,
+            soon + timedelta(days=1),
+        )
+
+    def test_clear_expired_in_batches(self):
+        expired = timezone.now() - timedelta(days=1)
+        for _ in range(5):
+            store = SessionStore()
+            store.set_expiry(expired)
+            store.save()
+        with self.assertNumQueries(7):
+            # A select and a delete for each of three batches, then an empty select.
+            SessionStore.clear_expired(batch_size=2)
+        self.assertEqual(Session.objects.count(), 1)
+
+
+class CurrencyTests(TestCase):
+    """Prices follow the rate in effect, converted once per request and cached per currency."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("shopper", password="password")
+        cls.products = create_catalogue(cls.user)
+        now = timezone.now()
+        ExchangeRate.objects.create(
+            currency=Order.CurrencyChoices.DOLLAR,
+            rate=0.5,
+            effective_from=now - timedelta(days=2),
+        )
+        ExchangeRate.objects.create(
+            currency=Order.CurrencyChoices.DOLLAR,
+            rate=0.25,
+            effective_from=now + timedelta(days=2),
+        )
+
+    def setUp(self):
+        cache.clear()
+        currency.invalidate_rate_table()
+        self.addCleanup(currency.invalidate_rate_table)
+
+    def test_rate_in_effect(self):
+        now = timezone.now()
+        self.assertEqual(currency.get_converter("D").convert(10), 5)
+        self.assertEqual(
+            currency.get_converter("D", now + timedelta(days=3)).convert(10), 2.5
+        )
+        with self.assertLogs("core.currency", "WARNING"):
+            converter = currency.get_converter("D", now - timedelta(days=3))
+        self.assertEqual((converter.code, converter.convert(10)), ("INR", 10))
+
+    def test_load_rates_file(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as file:
+            file.write(
+                "currency,effective_from,rate\nUSD,2020-01-01,0.1\nD,2020-01-01,0.2\n"
+            )
+        self.addCleanup(Path(file.name).unlink)
+        version = currency.get_rate_table().version
+        out = io.StringIO()
+        call_command("load_exchange_rates", file.name, stdout=out)
+        self.assertIn("Loaded 1 exchange rates", out.getvalue())
+        self.assertNotEqual(currency.get_rate_table().version, version)
+        self.assertEqual(ExchangeRate.objects.get(effective_from__year=2020).rate, 0.2)
+
+    def test_cart_totals_are_converted(self):
+        self.client.force_login(self.user)
+        session = self.client.session
+        session["currency"] = Order.CurrencyChoices.DOLLAR
+        session.save()
+        add_to_cart(self.user, self.products[0], 2)
+        response = self.client.get(reverse("core:cart"))
+        self.assertEqual(response.context["totals"], {"subtotal": 10.0, "total": 32.5})
+        self.assertContains(response, "USD 5.00")
+
+    def test_product_cards_are_cached_per_currency(self):
+        rupees = currency.get_converter("INR")
+        dollars = currency.get_converter("D")
+        self.assertNotEqual(
+            fragments.product_card_key(self.products[0], rupees),
+            fragments.product_card_key(self.products[0], dollars),
+        )
+        self.assertIn(
+            "5.0", fragments.render_product_cards(self.products[:1], "t", dollars)
+        )
+        self.assertIn(
+            "10.0", fragments.render_product_cards(self.products[:1], "t", rupees)
+        )
+
+
+class AddressDeduplicationTests(TestCase):
+    """Identical addresses share one row, found through their fingerprint."""
+
+    fields = {
+        "building_name": "Building",
+        "place": "Place",
+        "street": "Street",
+        "city": "City",
+        "district": "District",
+        "state": "State",
+        "country": "Country",
+        "post_office": "Post office",
+        "post_code": "000000",
+    }
+
+    def test_equal_addresses_reuse_one_row(self):
+        first = Address.get_or_create_by_fingerprint(**self.fields)
+        spaced = dict(
+            self.fields, building_name="  building ", post_office="Post   Office"
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(Address.get_or_create_by_fingerprint(**spaced), first)
+        other = Address.get_or_create_by_fingerprint(
+            **dict(self.fields, post_code="111111")
+        )
+        self.assertNotEqual(other, first)
+
+    def test_form_save_never_edits_a_shared_address(self):
+        address = Address.get_or_create_by_fingerprint(**self.fields)
+        data = {f"billing-{name}": value for name, value in self.fields.items()}
+        data["billing-city"] = "Elsewhere"
+        form = BillingAddressForm(data, instance=address)
+        self.assertTrue(form.is_valid(), form.errors)
+        moved = form.save()
+        self.assertNotEqual(moved, address)
+        address.refresh_from_db()
+        self.assertEqual(address.city, "City")
+
+    def test_fingerprints_are_unique(self):
+        Address.get_or_create_by_fingerprint(**self.fields)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Address.objects.create(**self.fields)
+
+    def test_concurrent_inserts_share_one_row(self):
+        get = QuerySet.get
+        winners = []
+
+        def get_after_another_request_inserts(queryset, *args, **kwargs):
+            # The other request's INSERT lands between our SELECT and INSERT.
+            if queryset.model is Address and not winners:
+                winners.append(Address.objects.create(**self.fields))
+                raise Address.DoesNotExist
+            return get(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, "get", get_after_another_request_inserts):
+            address = Address.get_or_create_by_fingerprint(**self.fields)
+        self.assertEqual(address, winners[0])
+        self.assertEqual(Address.objects.count(), 1)
+
+    def test_command_collapses_duplicates(self):
+        user = User.objects.create_user("shopper", password="password")
+        cart = Cart.objects.create(user=user)
+        kept = Address.objects.create(**self.fields)
+        elsewhere = dict(self.fields, city="Elsewhere")
+        # Rows saved before fingerprints existed; bulk_create skips ``save``.
+        Address.objects.bulk_create(
+            [
+                Address(**self.fields),
+                Address(**dict(self.fields, street="  street ")),
+                Address(**elsewhere),
+                Address(**elsewhere),
+            ]
+        )
+        addresses = list(Address.objects.order_by("pk"))
+        for index, address in enumerate(addresses[:3]):
+            Order.objects.create(
+                id=f"order_{index}",
+                cart=cart,
+                amount=100,
+                billing_address=address,
+                shipping_address=addresses[3 + index % 2],
+            )
+
+        out = io.StringIO()
+        call_command("deduplicate_addresses", batch_size=2, stdout=out)
+        self.assertIn(
+            "Fingerprinted 1 addresses and removed 3 duplicates", out.getvalue()
+        )
+        self.assertEqual(
+            set(Order.objects.values_list("billing_address", "shipping_address")),
+            {(kept.pk, addresses[3].pk)},
+        )
+        self.assertEqual(Address.objects.count(), 2)
+        self.assertFalse(Address.objects.filter(fingerprint="").exists())
+
+
+class OrderLineTests(TestCase):
+    """Orders keep what was bought at the price paid, whatever the cart does later."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("shopper", password="password")
+        cls.products = create_catalogue(cls.user)
+        for product in cls.products:
+            add_to_cart(cls.user, product, 2)
+        cart = Cart.objects.get(user=cls.user)
+        cls.order = Order.create_from_cart(
+            cart,
+            lambda prices: [price / 2 for price in prices],
+            id="order_1",
+            amount=21,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_checkout_snapshots_the_cart(self):
+        self.assertEqual((self.order.item_count, self.order.subtotal), (2, 21))
+        lines = self.order.lines.order_by("pk")
+        self.assertEqual(
+            list(lines.values_list("quantity", "unit_price", "line_total")),
+            [(2, 5, 10), (2, 5.5, 11)],
+        )
+
+    def test_order_pages_ignore_later_cart_and_price_changes(self):
+        ProductModel.objects.filter(pk=self.products[0].pk).update(price=1000)
+        CartItem.objects.filter(product=self.products[1]).delete()
+        add_to_cart(self.user, create_catalogue(self.user, products=1)[0], 1)
+
+        response = self.client.get(reverse("core:order_detail", args=[self.order.pk]))
+        lines = response.context["order"].lines.all()
+        self.assertEqual([line.line_total for line in lines], [10, 11])
+        self.assertContains(response, "INR 11.00")
+        response = self.client.get(reverse("core:order"))
+        self.assertContains(response, f"{self.products[1]} (2)")
+        self.assertEqual(OrderLine.objects.count(), 2)
+
+
+class OrderStatsTests(TestCase):
+    """Order and payment changes keep the user's counters; the dashboard pages its lists."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("shopper", password="password")
+        cls.cart = Cart.objects.create(user=cls.user)
+
+    def setUp(self):
+        currency.invalidate_rate_table()
+        self.addCleanup(currency.invalidate_rate_table)
+
+    def place_order(self, index, amount=100, **fields):
+        return Order.objects.create(
+            id=f"order_{index}", cart=self.cart, amount=amount, **fields
+        )
+
+    def assertStats(self, order_count, lifetime_spend, last_order_on):
+        self.user.refresh_from_db()
+        self.assertEqual(
+            (self.user.order_count, self.user.lifetime_spend, self.user.last_order_on),
+            (order_count, lifetime_spend, last_order_on),
+        )
+
+    def test_counters_follow_orders_and_payments(self):
+        first = self.place_order(1)
+        ExchangeRate.objects.create(
+            currency=Order.CurrencyChoices.DOLLAR,
+            rate=0.5,
+            effective_from=first.created_on,
+        )
+        second = self.place_order(2, amount=10, currency=Order.CurrencyChoices.DOLLAR)
+        self.assertStats(2, 0, second.created_on)
+
+        paid = Payment.PaymentStatusChoices.completed
+        Payment.objects.create(id="pay_1", order=first, status=paid)
+        payment = Payment.objects.create(id="pay_2", order=second)
+        self.assertStats(2, 100, second.created_on)
+
+        payment = Payment.objects.get(pk=payment.pk)
+        payment.status = paid
+        payment.save()
+        self.assertStats(2, 120, second.created_on)
+
+        second.delete()
+        self.assertStats(1, 100, first.created_on)
+        Payment.objects.get(pk="pay_1").delete()
+        self.assertStats(1, 0, first.created_on)
+
+        User.objects.filter(pk=self.user.pk).update(order_count=0, last_order_on=None)
+        out = io.StringIO()
+        call_command("rebuild_order_stats", stdout=out)
+        self.assertIn("Rebuilt order statistics for 1 users", out.getvalue())
+        self.assertStats(1, 0, first.created_on)
+
+    def test_dashboard_loads_more_with_cursors(self):
+        for index in range(7):
+            Payment.objects.create(id=f"pay_{index}", order=self.place_order(index))
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("core:dashboard"))
+        self.assertEqual(len(response.context["orders"]), 5)
+        self.assertEqual(response.context["user"].order_count, 7)
+
+        url = reverse("core:dashboard")
+        response = self.client.get(f"{url}?{response.context['more_orders_query']}")
+        self.assertEqual(len(response.context["orders"]), 2)
+        self.assertEqual(len(response.context["payments"]), 5)
+        self.assertIsNone(response.context["more_orders_query"])
+
+
+class IndexAdvisorTests(TestCase):
+    """The advisor flags unindexed queries; the hot lookups use their indexes."""
+
+    def problems(self, queryset):
+        return plan_problems(explain(*queryset.query.sql_with_params()))
+
+    def test_hot_queries_use_indexes(self):
+        products = ProductModel.objects.filter(status=True)
+        querysets = [
+            products.order_by(*ordering)[:6]
+            for ordering in ProductSortMixin.sort_orders.values()
+        ]
+        querysets += [
+            products.filter(category=1).order_by("-created_on", "-id")[:6],
+            Order.objects.filter(cart=1, completed=False).order_by("-id")[:1],
+        ]
+        for queryset in querysets:
+            with self.subTest(sql=str(queryset.query)):
+                self.assertEqual(self.problems(queryset), [])
+
+    def test_unindexed_query_gets_a_suggestion(self):
+        queryset = OutboxEmail.objects.filter(
+            subject="Hello", sent_on__gte=timezone.now(), attempts__in=[1, 2]
+        ).order_by("-from_email")
+        sql, _ = queryset.query.sql_with_params()
+        kinds = {(kind, table) for kind, table, _ in self.problems(queryset)}
+        self.assertEqual(
+            kinds, {("full scan", "core_outboxemail"), ("temp b-tree", None)}
+        )
+        self.assertEqual(
+            suggest_index(sql, "core_outboxemail"),
+            (["attempts", "subject", "-from_email"], []),
+        )
+
+    def test_boolean_filters_become_the_index_condition(self):
+        queryset = Order.objects.filter(completed=False, currency="USD").order_by(
+            "created_on"
+        )
+        sql, _ = queryset.query.sql_with_params()
+        self.assertEqual(
+            suggest_index(sql, "core_order"),
+            (["currency", "created_on"], ["NOT completed"]),
+        )
+
+
+class SampleDataTests(TestCase):
+    """Generated data has the shape asked for and consistent stored statistics."""
+
+    def generate(self, **options):
+        defaults = dict(
+            seed=7, users=4, products=30, category_depth=2, category_fanout=2
+        )
+        call_command(
+            "generate_sample_data", stdout=io.StringIO(), **{**defaults, **options}
+        )
+
+    def test_generated_data_is_consistent(self):
+        self.generate()
+        self.assertEqual(
+            User.objects.filter(username__startswith="sample7-").count(), 4
+        )
+        self.assertEqual(ProductModel.objects.count(), 30)
+
+        categories = CategoryModel.objects.select_related("parent")
+        self.assertEqual(len(categories), 6)
+        for category in categories:
+            parent_path = category.parent.path if category.parent else ""
+            self.assertEqual(category.path, f"{parent_path}{category.pk:08d}/")
+
+        for product in ProductModel.objects.annotate(reviews=Count("reviewmodel")):
+            self.assertEqual(product.rating_count, product.reviews)
+        for cart in Cart.objects.all():
+            items = cart.cartitem_set.select_related("product")
+            self.assertEqual(cart.item_count, len(items))
+            self.assertAlmostEqual(
+                cart.subtotal, sum(item.product.price * item.quantity for item in items)
+            )
+        for order in Order.objects.all():
+            self.assertEqual(order.lines.count(), order.item_count)
+
+        stats = customers.calculate_order_stats()
+        for user in User.objects.filter(order_count__gt=0):
+            self.assertEqual(user.order_count, stats[user.pk]["order_count"])
+            self.assertAlmostEqual(
+                user.lifetime_spend, stats[user.pk]["lifetime_spend"]
+            )
+
+        product = ProductModel.objects.first()
+        self.assertIn(product, search.SearchResults(product.name)[0:30])
+
+    def test_existing_prefix_is_refused(self):
+        self.generate(products=1)
+        with self.assertRaises(CommandError):
+            self.generate(products=1)
+        self.generate(products=1, prefix="other")
+
+
+class BenchmarkTests(TransactionTestCase):
+    """Run every benchmark step once on a small data set."""
+
+    def test_steps_succeed_and_regressions_are_reported(self):
+        call_command(
+            "generate_sample_data", products=200, users=5, stdout=io.StringIO()
+        )
+        from emart.wsgi import application
+
+        results = Benchmark(application, iterations=2, warmup=0, pages=3).run()
+
+        self.assertEqual(list(results["steps"]), list(Benchmark.STEPS))
+        for name, step in results["steps"].items():
+            self.assertEqual(step["errors"], 0, name)
+            self.assertEqual(step["requests"], 2, name)
+            self.assertGreater(step["queries"], 0, name)
+        self.assertEqual(compare(results, results), [])
+
+        baseline = {"steps": {"home": dict(results["steps"]["home"])}}
+        baseline["steps"]["home"]["queries"] -= 1
+        self.assertEqual(len(compare(results, baseline)), 1)
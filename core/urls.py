@@ -29,6 +29,7 @@ urlpatterns = [
     path("user/password_change/done/", views.PasswordChangeDoneView.as_view(), name="password_change_done"),
     # Product
     path("product/<int:pk>/detail/", views.ProductDetailView.as_view(), name="product_detail"),
+    path("product/search/", views.SearchView.as_view(), name="search"),
     path("product/category/", views.CategoryListView.as_view(), name="category_list"),
     path("product/category/<int:pk>/product/", views.ProductListByCategory.as_view(), name="product_by_category"),
     # Product Review
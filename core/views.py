@@ -1,19 +1,32 @@
 import json
+from urllib.parse import urlencode
 
-import requests
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import forms as auth_forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth import mixins as auth_mixins
 from django.contrib.auth import views as auth_views
-from django.core.mail import send_mail
-from django.db.models import F, Q
-from django.shortcuts import redirect, render
+from django.db import transaction
+from django.db.models import F, Prefetch, Q
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from django.views import generic as views
 
+import core.currency as currency
 import core.payment as payment
+import core.recaptcha as recaptcha
+import core.search as search
+from core.cart import (
+    add_to_cart,
+    get_request_cart,
+    open_cart_items,
+    save_cart_items,
+)
+from core.mail import enqueue_mail
+from core.mixins import KeysetPaginationMixin, ProductSortMixin
+from core.pagination import InvalidCursor, KeysetPaginator
 from core.forms import (
     AddressForm,
     AddToWishlistForm,
@@ -25,6 +38,7 @@ from core.forms import (
     FeedbackForm,
     ProductReviewForm,
     ProfileForm,
+    QueuedPasswordResetForm,
     ShippingAddressForm,
     WishlistForm,
 )
@@ -45,7 +59,6 @@ from core.models import (
 # Global Variables                                 #
 # ================================================ #
 USER = get_user_model()
-RAZORPAY_CLIENT = payment.get_client()
 
 
 # ================================================ #
@@ -56,17 +69,22 @@ RAZORPAY_CLIENT = payment.get_client()
 # Home view
 class HomeView(views.TemplateView):
     template_name = "core/home.html"
+    query_budget = 4
+    page_cache_timeout = 300
 
 
 # About view
 class AboutView(views.TemplateView):
     template_name = "core/about.html"
+    query_budget = 4
+    page_cache_timeout = 3600
 
 
 # Contact view
 class ContactView(views.View):
     template_name = "core/contact.html"
     form_class = FeedbackForm
+    query_budget = 6
 
     def get(self, request):
         context = {
@@ -88,8 +106,9 @@ class ContactView(views.View):
         to_email = data.get("email")
         message = data.get("message")
         from_email = settings.EMAIL_HOST_USER
-        try:
-            send_mail(
+        with transaction.atomic():
+            form.save()
+            enqueue_mail(
                 subject=subject,
                 message=message,
                 from_email=from_email,
@@ -97,11 +116,7 @@ class ContactView(views.View):
                     to_email,
                 ],
             )
-            form.save()
-            messages.success(self.request, "Thanks for your valuable feedback!")
-
-        except:
-            messages.error(self.request, "Can not send feedback! Please try again!")
+        messages.success(self.request, "Thanks for your valuable feedback!")
         return redirect(reverse_lazy("core:contact"))
 
     def form_invalid(self, form):
@@ -111,14 +126,18 @@ class ContactView(views.View):
 # News view
 class NewsView(views.TemplateView):
     template_name = "core/news.html"
+    query_budget = 4
+    page_cache_timeout = 3600
 
 
 # Shop view
-class ShopView(views.ListView):
+class ShopView(KeysetPaginationMixin, ProductSortMixin, views.ListView):
     template_name = "core/shop.html"
     model = ProductModel
     paginate_by = 5
     context_object_name = "products"
+    query_budget = 5
+    page_cache_timeout = 300
 
 
 # ================================================ #
@@ -131,6 +150,7 @@ class ProfileView(auth_mixins.LoginRequiredMixin, views.View):
     address_model = Address
     profile_form_class = ProfileForm
     address_form_class = AddressForm
+    query_budget = 8
 
     def get(self, request):
 
@@ -167,8 +187,8 @@ class ProfileView(auth_mixins.LoginRequiredMixin, views.View):
         if not hasattr(profile, "user"):
             profile_form.instance.user = user
 
-        if not hasattr(profile, "address"):
-            profile_form.instance.address = address
+        # Edits resolve to a different shared row rather than changing this one.
+        profile_form.instance.address = address
 
         profile_form.save()
         messages.success(self.request, "Profile updated successfully!")
@@ -182,7 +202,17 @@ class ProfileView(auth_mixins.LoginRequiredMixin, views.View):
 
 # Dashboard view
 class DashboardView(auth_mixins.LoginRequiredMixin, views.View):
+    """Stored order statistics of the user with their latest orders and payments.
+
+    The counters are columns of the already loaded user; orders and
+    payments come a page at a time, newest first, behind "load more"
+    cursors.
+    """
+
     template_name = "core/dashboard.html"
+    paginate_by = 5
+    ordering = ("-created_on", "-id")
+    query_budget = 6
 
     def get(self, request):
         context = self.get_context_data()
@@ -190,22 +220,43 @@ class DashboardView(auth_mixins.LoginRequiredMixin, views.View):
 
     def get_context_data(self, **kwargs):
         user = self.request.user
-        cart = Cart.get_cart(self.request)
-        orders = Order.objects.filter(cart__user=user)
-        payments = Payment.objects.filter(order__cart__user=user)
+        cart = get_request_cart(self.request)
+        orders = self.paginate(Order.objects.filter(cart__user=user), "orders_cursor")
+        payments = self.paginate(
+            Payment.objects.filter(order__cart__user=user).select_related("order"),
+            "payments_cursor",
+        )
 
         context = {
             "cart": cart,
             "orders": orders,
             "payments": payments,
+            "more_orders_query": self.more_query(orders, "orders_cursor"),
+            "more_payments_query": self.more_query(payments, "payments_cursor"),
         }
         context.update(kwargs)
         return context
 
+    def paginate(self, queryset, cursor_kwarg):
+        paginator = KeysetPaginator(queryset, self.paginate_by, self.ordering)
+        try:
+            return paginator.page(self.request.GET.get(cursor_kwarg))
+        except InvalidCursor:
+            return paginator.page()
+
+    def more_query(self, page, cursor_kwarg):
+        """Query string for the page after ``page``, keeping the other list's cursor."""
+        if not page.has_next():
+            return None
+        params = self.request.GET.copy()
+        params[cursor_kwarg] = page.next_cursor
+        return params.urlencode()
+
 
 # settings view
 class SettingsView(auth_mixins.LoginRequiredMixin, views.View):
     template_name = "core/settings.html"
+    query_budget = 4
 
     def get(self, request):
         context = self.get_context_data()
@@ -227,20 +278,16 @@ class LoginView(auth_views.LoginView):
     template_name = "registration/login.html"
     redirect_authenticated_user = True
     enable_recaptcha = True
+    query_budget = 8
 
     def form_valid(self, form):
         verified = True
         if self.enable_recaptcha:
             g_recaptcha_response = self.request.POST.get("g-recaptcha-response")
-            url = settings.GOOGLE_RECAPTCHA_VERIFICATION_URL
-            data = {
-                "secret": settings.GOOGLE_RECAPTCHA_SECRET_KEY,
-                "response": g_recaptcha_response,
-            }
             # Getting response from recaptcha server
-            response = requests.post(url, data=data).json()
-            if not response.get("success"):
-                verified = False
+            verified = recaptcha.get_verifier().verify(
+                g_recaptcha_response, self.request.META.get("REMOTE_ADDR")
+            )
         if verified:
             return super().form_valid(form)
         return super().form_invalid(form)
@@ -249,6 +296,7 @@ class LoginView(auth_views.LoginView):
 # Logout view
 class LogoutView(auth_views.LogoutView):
     template_name = "registration/logged_out.html"
+    query_budget = 4
 
 
 # Signup view
@@ -257,6 +305,7 @@ class SignupView(views.CreateView):
     model = USER
     form_class = CustomUserCreationForm
     success_url = reverse_lazy("core:home")
+    query_budget = 6
 
     def form_valid(self, form):
         return super().form_valid(form)
@@ -266,24 +315,29 @@ class SignupView(views.CreateView):
 # Password Reset views                             #
 # ================================================ #
 class PasswordResetView(auth_views.PasswordResetView):
+    form_class = QueuedPasswordResetForm
     email_template_name = "registration/password_reset_email.html"
     from_email = None
     subject_template_name = "registration/password_reset_subject.txt"
     success_url = reverse_lazy("core:password_reset_done")
     template_name = "registration/password_reset_form.html"
+    query_budget = 6
 
 
 class PasswordResetDoneView(auth_views.PasswordResetDoneView):
     template_name = "registration/password_reset_done.html"
+    query_budget = 4
 
 
 class PasswordResetCompleteView(auth_views.PasswordResetCompleteView):
     template_name = "registration/password_reset_complete.html"
+    query_budget = 4
 
 
 class PasswordResetConfirmView(auth_views.PasswordResetConfirmView):
     success_url = reverse_lazy("core:password_reset_complete")
     template_name = "registration/password_reset_confirm.html"
+    query_budget = 6
 
 
 # ================================================ #
@@ -292,10 +346,12 @@ class PasswordResetConfirmView(auth_views.PasswordResetConfirmView):
 class PasswordChangeView(auth_mixins.LoginRequiredMixin, auth_views.PasswordChangeView):
     success_url = reverse_lazy("core:password_change_done")
     template_name = "registration/password_change_form.html"
+    query_budget = 6
 
 
 class PasswordChangeDoneView(auth_views.PasswordChangeDoneView):
     template_name = "registration/password_change_done.html"
+    query_budget = 4
 
 
 # ================================================ #
@@ -307,35 +363,70 @@ class CategoryListView(views.ListView):
     model = CategoryModel
     paginate_by = 20
     context_object_name = "categories"
+    # Ordering by materialized path yields the tree depth first.
+    ordering = ("path",)
+    query_budget = 6
+    page_cache_timeout = 300
 
 
 # Product by category
-class ProductListByCategory(views.ListView):
+class ProductListByCategory(KeysetPaginationMixin, ProductSortMixin, views.ListView):
     template_name = "core/shop.html"
     model = ProductModel
     paginate_by = 5
     context_object_name = "products"
+    query_budget = 7
+
+    def get_category(self):
+        if not hasattr(self, "category"):
+            self.category = get_object_or_404(CategoryModel, pk=self.kwargs.get("pk"))
+        return self.category
 
     def get_queryset(self):
         qs = super().get_queryset()
-        pk = int(self.kwargs.get("pk"))
-        qs = qs.filter(category__id=pk)
+        category = self.get_category()
+        qs = qs.filter(CategoryModel.subtree_filter(category.path, "category__"))
         return qs
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["category"] = self.get_category()
+        context["breadcrumbs"] = self.get_category().get_ancestors()
+        return context
+
+
+# Product search view
+class SearchView(views.ListView):
+    template_name = "core/search.html"
+    paginate_by = 10
+    context_object_name = "products"
+    query_budget = 7
+
+    def get_query(self):
+        return self.request.GET.get("q", "").strip()
+
+    def get_queryset(self):
+        return search.SearchResults(self.get_query())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["query"] = self.get_query()
+        context["search_query"] = urlencode({"q": context["query"]})
+        return context
+
 
 # Product Detail view
 class ProductDetailView(views.DetailView):
     template_name = "core/product_detail.html"
     model = ProductModel
     context_object_name = "product"
+    query_budget = 5
+    page_cache_timeout = 300
 
     def get_queryset(self):
         qs = super().get_queryset()
-        product = qs.first()
-        print(product.get_review())
-
+        qs = qs.select_related("category")
         return qs
-    
 
 
 # Product add Review view
@@ -343,6 +434,7 @@ class ProductReviewAddView(auth_mixins.LoginRequiredMixin, views.View):
     template_name = "core/product_review_add.html"
     form_class = ProductReviewForm
     success_url = reverse_lazy("core:shop")
+    query_budget = 8
 
     def get(self, request, **kwargs):
         product_id = kwargs.get("pk")
@@ -382,6 +474,7 @@ class WishlistCreateView(auth_mixins.LoginRequiredMixin, views.CreateView):
     model = WishlistModel
     form_class = WishlistForm
     success_url = reverse_lazy("core:wishlist_list")
+    query_budget = 5
 
     def form_valid(self, form):
         user = self.request.user
@@ -394,6 +487,7 @@ class WishlistListView(auth_mixins.LoginRequiredMixin, views.ListView):
     template_name = "core/whishlist_list.html"
     context_object_name = "wishlists"
     model = WishlistModel
+    query_budget = 5
 
     def get_queryset(self):
         user = self.request.user
@@ -407,17 +501,27 @@ class WishlistDetailView(auth_mixins.LoginRequiredMixin, views.DetailView):
     template_name = "core/whishlist_detail.html"
     context_object_name = "wishlist"
     model = WishlistModel
+    query_budget = 6
     extra_context = {
         "wishlist_action": "remove from",
         "wishlist_action_link": "remove_from_wishlist",
     }
 
+    def get_queryset(self):
+        user = self.request.user
+        qs = super().get_queryset()
+        qs = qs.filter(status=True, user=user).prefetch_related(
+            Prefetch("products", queryset=ProductModel.objects.select_related("unit"))
+        )
+        return qs
+
 
 class AddToWishlist(auth_mixins.LoginRequiredMixin, views.View):
     template_name = "core/whishlist_add.html"
     wishlist_model = WishlistModel
     product_model = ProductModel
     add_to_wishlist_form = AddToWishlistFormSet
+    query_budget = 8
 
     def get(self, request, **kwargs):
         user = request.user
@@ -461,6 +565,8 @@ class AddToWishlist(auth_mixins.LoginRequiredMixin, views.View):
 
 # Remove product from wishlist
 class RemoveFromWishlistView(auth_mixins.LoginRequiredMixin, views.View):
+    query_budget = 6
+
     def post(self, request, **kwargs):
         product_id = kwargs.get("product_id", None)
         wishlist_id = request.POST.get("wishlist_id", None)
@@ -482,45 +588,45 @@ class RemoveFromWishlistView(auth_mixins.LoginRequiredMixin, views.View):
 # ================================================ #
 # add item to cart
 class AddToCartView(auth_mixins.LoginRequiredMixin, views.View):
+    query_budget = 12
+
     def post(self, request):
         user = request.user
-        product_id = request.POST.get("product_id")
-        quantity = int(request.POST.get("quantity"))
-
         try:
-            product = ProductModel.objects.filter(
-                id=product_id,
-                status=True,
-            ).first()
-
-            cart, cart_created = Cart.objects.get_or_create(
-                user=user,
-                status=True,
-                checked_out=False,
-            )
-
-            if cart_created:
-                cart.empty = False
-                cart.save()
-
-            cart_item, cart_item_created = CartItem.objects.get_or_create(
-                cart=cart,
-                status=True,
-                product=product,
-            )
+            product_id = int(request.POST.get("product_id"))
+            quantity = int(request.POST.get("quantity", 1))
+        except (TypeError, ValueError):
+            return self.respond(error="Something is went wrong!")
+
+        product = (
+            ProductModel.objects.filter(id=product_id, status=True)
+            .only("id", "price")
+            .first()
+        )
+        if product is None or quantity < 1:
+            return self.respond(error="Something is went wrong!")
 
-            if cart_item_created:
-                cart_item.quantity = quantity
-            else:
-                cart_item.quantity += quantity
+        cart = add_to_cart(user, product, quantity)
+        return self.respond(cart=cart)
 
-            cart_item.save()
-            messages.success(request, "Added successfully!")
+    def wants_json(self):
+        headers = self.request.headers
+        return headers.get("x-requested-with") == "XMLHttpRequest" or (
+            "application/json" in headers.get("accept", "")
+        )
 
-        except:
-            messages.error(request, "Something is went wrong!")
+    def respond(self, cart=None, error=None):
+        if self.wants_json():
+            if error:
+                return JsonResponse({"success": False, "error": error}, status=400)
+            totals = Cart.objects.values("item_count", "subtotal").get(pk=cart.pk)
+            return JsonResponse({"success": True, "cart": totals})
 
-        url = request.META.get("HTTP_REFERER")
+        if error:
+            messages.error(self.request, error)
+        else:
+            messages.success(self.request, "Added successfully!")
+        url = self.request.META.get("HTTP_REFERER") or reverse_lazy("core:cart")
         return redirect(url)
 
 
@@ -530,21 +636,32 @@ class CartView(auth_mixins.LoginRequiredMixin, views.View):
     form_class = CartItemFormSet
     model = CartItem
     currency_form = CurrencyForm
+    # Shown on top of the subtotal in the cart summary.
+    other_charges = 45
+    query_budget = 12
 
     def get(self, request):
-        cart = Cart.get_cart(request)
-        cart_items = cart.items()
+        cart_items = open_cart_items(request.user)
         form = self.form_class(queryset=cart_items)
         context = {
             "form": form,
-            "currency_form": self.currency_form(),
+            "currency_form": self.currency_form(
+                initial={"currency": request.session.get("currency")}
+            ),
+            "totals": self.get_totals(),
         }
         return render(request, self.template_name, context)
 
+    def get_totals(self):
+        """Cart summary in the visitor's currency, converted in one pass."""
+        subtotal = get_request_cart(self.request).total
+        converter = currency.get_request_converter(self.request)
+        amounts = converter.convert_many([subtotal, subtotal + self.other_charges])
+        return dict(zip(("subtotal", "total"), amounts))
+
     def post(self, request):
-        cart = Cart.get_cart(request)
-        cart_items = cart.items()
-        form = self.form_class(request.POST, initial=cart_items)
+        cart_items = open_cart_items(request.user)
+        form = self.form_class(request.POST, queryset=cart_items)
 
         if form.is_valid():
             return self.form_valid(form)
@@ -553,13 +670,14 @@ class CartView(auth_mixins.LoginRequiredMixin, views.View):
 
     def form_valid(self, form):
 
+        chosen_currency = None
         currency_form = self.currency_form(self.request.POST)
         if currency_form.is_valid():
-            currency = currency_form.cleaned_data.get("currency")
+            chosen_currency = currency_form.cleaned_data.get("currency")
 
-        self.request.session["currency"] = currency or None
+        self.request.session["currency"] = chosen_currency or None
 
-        form.save()
+        save_cart_items(self.request.user, form)
 
         messages.success(self.request, "Cart updated successfully!")
 
@@ -567,7 +685,7 @@ class CartView(auth_mixins.LoginRequiredMixin, views.View):
         return redirect(url)
 
     def form_invalid(self, form):
-        context = {"formset": form}
+        context = {"formset": form, "totals": self.get_totals()}
         messages.error(self.request, "Cart updation failed!")
         return render(self.request, self.template_name, context)
 
@@ -579,6 +697,10 @@ class CheckoutView(auth_mixins.LoginRequiredMixin, views.View):
     template_name = "core/checkout.html"
     billing_address_form = BillingAddressForm
     shipping_address_form = ShippingAddressForm
+    # Shown in the order summary.
+    display_delivery_charge = 50
+    # Placing an order writes the addresses, the order and its lines.
+    query_budget = 13
 
     def get(self, request):
         address = None
@@ -588,10 +710,19 @@ class CheckoutView(auth_mixins.LoginRequiredMixin, views.View):
         context = {
             "billing_form": self.billing_address_form(instance=address),
             "shipping_form": self.shipping_address_form(),
+            "totals": self.get_totals(),
         }
 
         return render(request, self.template_name, context)
 
+    def get_totals(self):
+        """Order summary in the visitor's currency, converted in one pass."""
+        subtotal = get_request_cart(self.request).total
+        delivery = self.display_delivery_charge
+        converter = currency.get_request_converter(self.request)
+        amounts = converter.convert_many([subtotal, delivery, subtotal + delivery])
+        return dict(zip(("subtotal", "delivery", "total"), amounts))
+
     def post(self, request):
         same_as_billing_address = request.POST.get("same_as_billing_address", None)
         billing_form = shipping_form = self.billing_address_form(request.POST)
@@ -613,37 +744,50 @@ class CheckoutView(auth_mixins.LoginRequiredMixin, views.View):
         return cost
 
     def form_valid(self, billing_form, shipping_form):
-        currency = self.request.session.get("currency")
+        converter = currency.get_request_converter(self.request)
         cart = Cart.get_cart(self.request)
         billing_address = billing_form.save()
-        shipping_address = shipping_form.save()
+        if shipping_form is billing_form:
+            # "Same as billing address"
+            shipping_address = billing_address
+        else:
+            shipping_address = shipping_form.save()
         delivery_charge = self.get_delivery_charge(shipping_address)
-        amount = self.apply_other_charges(cart.total() + delivery_charge)
+        amount = converter.convert(
+            self.apply_other_charges(cart.total() + delivery_charge)
+        )
 
         # create order
-        data = {
-            "amount": amount,
-            "currency": currency,
-            "payment_capture": 0,
-        }
-        razorpay_order = RAZORPAY_CLIENT.order.create(data=data)
+        try:
+            razorpay_order = payment.get_gateway().create_order(
+                amount=amount,
+                currency=converter.code,
+            )
+        except payment.PaymentGatewayError:
+            messages.error(
+                self.request, "Payment service is unavailable! Please try again!"
+            )
+            return self.form_invalid(billing_form, shipping_form)
         id = razorpay_order.get("id", None)
 
-        Order.objects.create(
+        Order.create_from_cart(
+            cart,
+            converter.convert_many,
             id=id,
-            cart=cart,
             amount=amount,
+            currency=converter.currency,
             delivery_charge=delivery_charge,
             billing_address=billing_address,
             shipping_address=shipping_address,
         )
 
-        return redirect(reverse_lazy("core:payment_handler"))
+        return redirect(reverse_lazy("core:cart_payment"))
 
     def form_invalid(self, billing_form, shipping_form):
         context = {
             "billing_form": billing_form,
             "shipping_form": shipping_form,
+            "totals": self.get_totals(),
         }
         return render(self.request, self.template_name, context)
 
@@ -652,11 +796,13 @@ class OrderView(auth_mixins.LoginRequiredMixin, views.ListView):
     template_name = "core/order.html"
     model = Order
     context_object_name = "orders"
+    query_budget = 6
 
     def get_queryset(self):
         user = self.request.user
         qs = super().get_queryset()
         qs = qs.filter(cart__user=user)
+        qs = qs.prefetch_related(Order.prefetch_lines())
         return qs
 
 
@@ -665,11 +811,18 @@ class OrderDetailView(auth_mixins.LoginRequiredMixin, views.DetailView):
     template_name = "core/order_detail.html"
     model = Order
     context_object_name = "order"
+    query_budget = 7
 
     def get_queryset(self):
         user = self.request.user
         qs = super().get_queryset()
-        qs = qs.filter(cart__user=user)
+        qs = qs.filter(cart__user=user).select_related(
+            "billing_address", "shipping_address"
+        )
+        qs = qs.prefetch_related(
+            Order.prefetch_lines(),
+            "payment_set",
+        )
         return qs
 
 
@@ -677,6 +830,7 @@ class OrderDetailView(auth_mixins.LoginRequiredMixin, views.DetailView):
 class OrderHistoryView(auth_mixins.LoginRequiredMixin, views.View):
     template_name = "core/order_history.html"
     model = Order
+    query_budget = 6
 
     def get(self, request):
         context = self.get_context_data()
@@ -684,7 +838,7 @@ class OrderHistoryView(auth_mixins.LoginRequiredMixin, views.View):
 
     def get_context_data(self, **kwargs):
         user = self.request.user
-        orders = Order.objects.filter(cart__user=user)
+        orders = Order.objects.filter(cart__user=user).prefetch_related("payment_set")
         context = {"orders": orders}
         context.update(kwargs)
         return context
@@ -696,6 +850,7 @@ class OrderHistoryView(auth_mixins.LoginRequiredMixin, views.View):
 # Payment view
 class PaymentView(auth_mixins.LoginRequiredMixin, views.View):
     template_name = "core/pay.html"
+    query_budget = 8
 
     def get(self, request):
         cart = Cart.get_cart(self.request)
@@ -707,8 +862,8 @@ class PaymentView(auth_mixins.LoginRequiredMixin, views.View):
             "razorpay_order_id": order.id,
             "razorpay_merchant_key": settings.RAZORPAY_KEY_ID,
             "razorpay_amount": order.amount,
-            "razorpay_currency": order.currency,
-            "razorpay_callback_url": reverse_lazy("core:payment_handler"),
+            "razorpay_currency": currency.ISO_CODES.get(order.currency, order.currency),
+            "razorpay_callback_url": reverse_lazy("core:cart_payment"),
         }
         return render(request, self.template_name, context)
 
@@ -726,14 +881,15 @@ class PaymentView(auth_mixins.LoginRequiredMixin, views.View):
 
             order = Order.objects.filter(id=razorpay_order_id).last()
 
+            gateway = payment.get_gateway()
+
             # verify the payment signature.
-            result = RAZORPAY_CLIENT.utility.verify_payment_signature(params_dict)
-            if result is not None:
+            if gateway.verify_payment_signature(params_dict):
                 amount = order.amount
                 try:
 
                     # capture the payemt
-                    RAZORPAY_CLIENT.payment.capture(payment_id, amount)
+                    gateway.capture_payment(payment_id, amount)
 
                     Payment.objects.create(
                         id=payment_id,
@@ -755,7 +911,7 @@ class PaymentView(auth_mixins.LoginRequiredMixin, views.View):
         except:
 
             # if we don't find the required parameters in POST data
-            return redirect(reverse_lazy("core:payment_handler"))
+            return redirect(reverse_lazy("core:cart_payment"))
 
 
 # Payment List view
@@ -763,9 +919,10 @@ class PaymentListView(auth_mixins.LoginRequiredMixin, views.ListView):
     template_name = "core/payment_list.html"
     model = Payment
     context_object_name = "payments"
+    query_budget = 5
 
     def get_queryset(self):
         user = self.request.user
         qs = super().get_queryset()
-        qs = qs.filter(order__cart__user=user)
+        qs = qs.filter(order__cart__user=user).select_related("order")
         return qs
@@ -61,16 +61,32 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "core.middleware.QueryCountMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
+    "core.middleware.PageCacheMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
 ROOT_URLCONF = "emart.urls"
 
+# Per-request query counting; views declare a ``query_budget``
+QUERY_COUNT_ENABLED = DEBUG
+# Send X-Query-Count/-Duration/-Duplicates/-Budget response headers
+QUERY_COUNT_HEADERS = DEBUG
+# Query shapes repeated this often in one request are logged as N+1
+QUERY_COUNT_DUPLICATE_THRESHOLD = 3
+
+# Full-page cache for anonymous visitors; views declare ``page_cache_timeout``
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_ALIAS = "default"
+# Cached header mini-cart and product cards (core.fragments)
+FRAGMENT_CACHE_ALIAS = "default"
+FRAGMENT_CACHE_TIMEOUT = 600
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -98,9 +114,47 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # A file-backed test database lets the concurrency tests use real
+        # SQLite locking instead of the shared-cache in-memory database.
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
+# Caches
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    # Kept apart so clearing the page and fragment caches keeps sessions.
+    # Shared by every worker on the host, so a flush or logout in one is
+    # seen by all; any cache shared between processes will do.
+    "sessions": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache" / "sessions",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+
+# Sessions
+# https://docs.djangoproject.com/en/4.1/topics/http/sessions/
+
+# Database sessions read through a cache, skipping saves that change nothing
+SESSION_ENGINE = "core.sessions"
+SESSION_CACHE_ALIAS = "sessions"
+# Longest a cached session may go unchecked against the database
+SESSION_CACHE_TIMEOUT = 300
+# Expired sessions deleted per statement by ``manage.py clearsessions``
+SESSION_CLEAR_BATCH_SIZE = 1000
+
+
+# Currencies
+
+# Longest a process keeps its exchange rate table before reloading it
+EXCHANGE_RATE_CACHE_TIMEOUT = 300
+# CSV of ``currency,effective_from,rate`` read by ``manage.py load_exchange_rates``
+EXCHANGE_RATES_FILE = BASE_DIR / "exchange_rates.csv"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -147,10 +201,41 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATIC_ROOT = "static_root"
 STATICFILES_DIRS = [BASE_DIR / "static"]
+# Hashed names, staticfiles.json manifest, purged CSS and .gz/.br siblings
+STATICFILES_STORAGE = "core.staticfiles.CompressedManifestStaticFilesStorage"
+# Storefront templates and scripts; CSS classes found in none are unused
+STOREFRONT_CONTENT = [
+    "templates/**/*.html",
+    "static/js/*.js",
+    "static/bootstrap/js/bootstrap.bundle.js",
+    "static/theme/assets/js/*.js",
+]
+# CSS files purged by collectstatic, each with the files that may use it
+STATIC_PURGE_CSS = {
+    "bootstrap/css/bootstrap.css": STOREFRONT_CONTENT,
+    "fontawesome/css/all.css": STOREFRONT_CONTENT,
+}
+# Classes only put together at runtime (message tags, social brands, currency icons)
+STATIC_PURGE_SAFELIST = [
+    r"^alert-",
+    r"^fa-(facebook|google|twitter|github)$",
+    r"^fa-(inr|dollar-sign)$",
+]
 
 # Media files
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# Browser cache lifetime of media files, revalidated with strong ETags
+MEDIA_CACHE_MAX_AGE = 3600
+# Let the fronting proxy send media files: None, "x-accel-redirect" (nginx)
+# or "x-sendfile" (Apache, lighttpd)
+MEDIA_OFFLOAD = env("MEDIA_OFFLOAD", default=None)
+# nginx ``internal`` location aliased to MEDIA_ROOT, for x-accel-redirect
+MEDIA_ACCEL_REDIRECT_PREFIX = "/protected-media/"
+# Thumbnail/WebP generation threads; 0 generates inline on save
+IMAGE_DERIVATIVE_WORKERS = 2
+# Seconds an image without derivatives is remembered before storage is checked again
+IMAGE_MISSING_MANIFEST_TIMEOUT = 300
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
@@ -193,10 +278,35 @@ MESSAGE_TAGS = {
 RAZORPAY_KEY_ID = env("RAZORPAY_KEY_ID")
 RAZORPAY_KEY_SECRET = env("RAZORPAY_KEY_SECRET")
 
+# Payment gateway adapter; use "core.payment.FakeGateway" to run offline
+PAYMENT_GATEWAY = {
+    "BACKEND": "core.payment.RazorpayGateway",
+    "OPTIONS": {
+        "pool_size": 10,
+        "connect_timeout": 3.05,
+        "read_timeout": 10,
+        "max_retries": 2,
+        "backoff": 0.2,
+        "failure_threshold": 5,
+        "reset_timeout": 30,
+    },
+}
+
 # Google reCaptcha Integration
 GOOGLE_RECAPTCHA_SITE_KEY = env("GOOGLE_RECAPTCHA_SITE_KEY")
 GOOGLE_RECAPTCHA_SECRET_KEY = env("GOOGLE_RECAPTCHA_SECRET_KEY")
 GOOGLE_RECAPTCHA_VERIFICATION_URL = "https://www.google.com/recaptcha/api/siteverify"
+# reCAPTCHA verifier; use "core.recaptcha.StubVerifier" to run offline
+# "degrade" decides logins when the verifier is down or slow: deny/allow
+RECAPTCHA_VERIFIER = {
+    "BACKEND": "core.recaptcha.RecaptchaVerifier",
+    "OPTIONS": {
+        "connect_timeout": 1.0,
+        "read_timeout": 2.0,
+        "cache_timeout": 30,
+        "degrade": "deny",
+    },
+}
 GOOGLE_API_KEY = env("GOOGLE_API_KEY")
 
 # Social Media Integration
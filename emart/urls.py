@@ -14,9 +14,10 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core import mediafiles, staticfiles
 
 urlpatterns = [
     path("", include("core.urls", namespace="core")),
@@ -24,5 +25,7 @@ urlpatterns = [
     path("admin/", admin.site.urls),
 ]
 
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+urlpatterns += [
+    re_path(rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.*)$", mediafiles.serve),
+    re_path(rf"^{settings.STATIC_URL.lstrip('/')}(?P<path>.*)$", staticfiles.serve),
+]